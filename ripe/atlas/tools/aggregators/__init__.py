@@ -1,7 +1,15 @@
-from .base import RangeKeyAggregator, ValueKeyAggregator, aggregate
+from .base import (
+    Bucket,
+    RangeKeyAggregator,
+    ValueKeyAggregator,
+    aggregate,
+    aggregate_stream
+)
 
 __all__ = [
     "aggregate",
+    "aggregate_stream",
+    "Bucket",
     "RangeKeyAggregator",
     "ValueKeyAggregator",
 ]
@@ -17,6 +17,13 @@ class ValueKeyAggregator(object):
             attribute = getattr(attribute, key)
         return attribute
 
+    @property
+    def needs_probes(self):
+        """
+        Whether the key is one of the attributes of a result's probe.
+        """
+        return self.aggregation_keys[0] == "probe"
+
     def get_bucket(self, entity):
         """
         Returns the bucket the specific entity belongs to based on the give
@@ -91,3 +98,48 @@ def aggregate(entities, aggregators):
             entities[k] = aggregate(entities[k], aggregators[:])
 
     return entities
+
+
+class Bucket(list):
+    """
+    The entities at the bottom of a streamed aggregation: only the first
+    `size` of them are kept, but all of them are counted in `total`.
+    """
+
+    def __init__(self, size=None):
+        list.__init__(self)
+        self.size = size
+        self.total = 0
+
+    def add(self, entity):
+        self.total += 1
+        if self.size is None or len(self) < self.size:
+            self.append(entity)
+
+
+def aggregate_stream(entities, aggregators, max_per_bucket=None):
+    """
+    Does the same job as aggregate(), and returns the same nested structure,
+    but in a single pass over `entities`, which may be any iterable.  Only
+    the first `max_per_bucket` entities of each bucket are kept, so memory
+    is bounded by the number of buckets rather than the number of entities.
+    Unlike aggregate(), `aggregators` is left alone.
+    """
+
+    if not aggregators:
+        r = Bucket(max_per_bucket)
+        for entity in entities:
+            r.add(entity)
+        return r
+
+    r = {}
+    for entity in entities:
+        node = r
+        for aggregator in aggregators[:-1]:
+            node = node.setdefault(aggregator.get_bucket(entity), {})
+        bucket = aggregators[-1].get_bucket(entity)
+        if bucket not in node:
+            node[bucket] = Bucket(max_per_bucket)
+        node[bucket].add(entity)
+
+    return r
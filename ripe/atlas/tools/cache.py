@@ -3,78 +3,624 @@ try:
 except ImportError:
     import pickle
 
-import datetime
-import dbm
+import atexit
 import functools
+import hashlib
 import os
+import sqlite3
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+
+from .settings import conf
+
+
+def synchronised(method):
+    """
+    Runs `method` while holding the cache's lock, so that one cache can be
+    shared by several threads.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class MemoryCache(object):
+    """
+    A bounded, in-process store of already-deserialised values that sits in
+    front of the cache file.  When it's full, the least recently used entry
+    is dropped to make room.  Entries are kept as (expires, value) pairs so
+    that expiry works the same way it does on disk.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """
+        Returns the (expires, value) pair for `key`, or None if it's not here.
+        """
+        try:
+            item = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data[key] = item  # Now the most recently used
+        self.hits += 1
+        return item
+
+    def set(self, key, expires, value):
+        self._data.pop(key, None)
+        if self.size <= 0:
+            return
+        self._data[key] = (expires, value)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def clear(self, namespace=None):
+        if namespace is None:
+            self._data.clear()
+            return
+        for key in list(self._data.keys()):
+            if LocalCache.get_namespace(key) == namespace:
+                del self._data[key]
+
+    def expire(self, now):
+        for key, (expires, _) in list(self._data.items()):
+            if expires and expires <= now:
+                del self._data[key]
 
 
 class LocalCache(object):
     """
-    Simple caching engine, making use of the built-in dbm support.  This will
-    create a file called cache.db in ripe-atlas-tools config directory and dump
-    stuff in there for use later.
+    Simple caching engine, making use of the built-in SQLite support.  This
+    will create a file called cache.db in ripe-atlas-tools config directory and
+    dump stuff in there for use later.
+
+    Every key is filed under a namespace: the part of the key before the first
+    colon, so "probe:1234" lives in the "probe" namespace.  Both the namespace
+    and the expiry time are indexed, so expiring the cache or scanning a single
+    namespace never requires us to look at every value in there.
+
+    Recently used values are also kept in a MemoryCache, so reading the same
+    key over and over again doesn't mean a trip to the file and another
+    unpickling every time.  Writes go to both.
+
+    The file is kept from growing forever by a cap on the number of entries
+    and/or the total size of the values in it (cache.max-entries and
+    cache.max-bytes, where 0 means no limit).  Every so often, we throw out
+    whatever has expired and then, if we're still over the cap, whatever was
+    least recently used.  Reading a value only notes that it was used in
+    memory: those notes are written to the file all at once, along with the
+    next write, before we shrink, or when we close, so that reading from the
+    cache never means writing to it.
+
+    What's in KEPT_NAMESPACES (like an imported gazetteer) is left out of all
+    that: it doesn't count towards the cap, is never evicted, and clearing the
+    whole cache leaves it alone.  Only clearing its namespace by name removes
+    it.
+
+    Nothing is opened until the cache is first used, so importing this module
+    costs next to nothing.
+
+    It's safe to use from more than one thread: everything that touches the
+    file or the memory tier does so while holding a lock.
     """
 
-    def __init__(self):
-        self._now = datetime.datetime.now()
-        self._db = dbm.open(self._get_or_create_db_path(), "c")
+    # SQLite won't take more than 999 parameters in a single statement
+    QUERY_CHUNK_SIZE = 500
+
+    # How many writes we allow between checks on the size of the cache
+    SHRINK_INTERVAL = 1000
+
+    # Namespaces of things we can't simply fetch again, so that we keep them
+    # until we're told otherwise
+    KEPT_NAMESPACES = ("Gazetteer",)
+
+    # How long we wait on another process that has the file locked (seconds)
+    TIMEOUT = 10
+
+    # What every SQLite database file starts with
+    SQLITE_HEADER = b"SQLite format 3\x00"
+
+    class NewerSchema(Exception):
+        pass
 
+    # Bump this whenever SCHEMA changes.  Older caches are simply thrown away,
+    # but newer ones are left alone.
+    SCHEMA_VERSION = 2
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache ("
+        "  key TEXT PRIMARY KEY,"
+        "  namespace TEXT NOT NULL,"
+        "  expires REAL,"
+        "  used REAL NOT NULL,"
+        "  size INTEGER NOT NULL,"
+        "  value BLOB NOT NULL"
+        ")",
+        "CREATE INDEX IF NOT EXISTS cache_namespace ON cache (namespace)",
+        "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+        "CREATE INDEX IF NOT EXISTS cache_used ON cache (used)",
+    )
+
+    def __init__(self, path=None, memory_size=None, max_entries=None,
+                 max_bytes=None):
+        self._now = time.time()
+        self._path = path
+        self._memory_size = memory_size
+        self._connection = None
+        self._memory = None
+        self._writes = 0
+        self._used = {}  # key -> when it was read, not yet in the file
+        self._lock = threading.RLock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @property
+    def _db(self):
+        if self._connection is None:
+            if not self._path:
+                self._path = self._get_or_create_db_path()
+            self._connection = self._connect()
+            if self.max_entries is None:
+                self.max_entries = conf["cache"]["max-entries"]
+            if self.max_bytes is None:
+                self.max_bytes = conf["cache"]["max-bytes"]
+        return self._connection
+
+    @property
+    def memory(self):
+        if self._memory is None:
+            size = self._memory_size
+            if size is None:
+                size = conf["cache"]["memory-entries"]
+            self._memory = MemoryCache(size)
+        return self._memory
+
+    @synchronised
     def __contains__(self, key):
-        return key in self._db
+        if self.memory.get(key):
+            return True
+        return self._db.execute(
+            "SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone() is not None
 
     def __getitem__(self, key):
         return self.get(key)
 
+    @synchronised
     def __setitem__(self, key, value, expires=None):
-        self._db[key] = pickle.dumps((expires, value))
+        self.memory.set(key, expires, value)
+        with self._db:
+            self._save_used()
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache "
+                "(key, namespace, expires, used, size, value) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._get_row(key, value, expires)
+            )
+        self._wrote(1)
 
     def __delitem__(self, key):
-        if key not in self._db:
+        if key not in self:
             raise KeyError
-        del self._db[key]
+        self.clear(key)
 
-    def keys(self):
-        return self._db.keys()
+    @synchronised
+    def keys(self, namespace=None):
+        if namespace is None:
+            cursor = self._db.execute("SELECT key FROM cache")
+        else:
+            cursor = self._db.execute(
+                "SELECT key FROM cache WHERE namespace = ?", (namespace,))
+        return [row[0] for row in cursor]
 
-    def items(self):
-        for key in self.keys():
-            yield key, self._db[key]
+    def items(self, namespace=None):
+        """
+        Yields (key, value) pairs for every unexpired entry in the cache, or
+        only those in `namespace` if you specify one.
+        """
+        query = "SELECT key, value FROM cache WHERE " \
+                "(expires IS NULL OR expires > ?)"
+        params = (self._now,)
+        if namespace is not None:
+            query += " AND namespace = ?"
+            params += (namespace,)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        for key, value in rows:
+            yield key, self._load(value)
 
+    @synchronised
     def get(self, key, default=None):
-        if key in self._db:
-            expires, value = pickle.loads(self._db[key])
-            if not expires or expires > self._now:
-                return value
-            else:
-                del(self._db[key])
+
+        item = self.memory.get(key)
+        if item is None:
+            row = self._db.execute(
+                "SELECT expires, value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return default
+            item = row[0], self._load(row[1])
+            self.memory.set(key, *item)
+            self._touch([key])
+
+        expires, value = item
+        if not expires or expires > self._now:
+            return value
+
+        self.clear(key)
         return default
 
+    @synchronised
+    def get_many(self, keys):
+        """
+        Returns a dictionary of key -> value for every one of `keys` that's in
+        the cache and hasn't expired.  Whatever isn't already in memory is read
+        with one query per few hundred keys rather than one per key, and
+        anything we find to have expired is deleted in one go.
+        """
+
+        r = {}
+        expired = []
+        wanted = []
+
+        for key in set(keys):
+            item = self.memory.get(key)
+            if item is None:
+                wanted.append(key)
+            elif item[0] and item[0] <= self._now:
+                expired.append(key)
+            else:
+                r[key] = item[1]
+
+        found = []
+        for chunk in self._get_chunks(wanted):
+            rows = self._db.execute(
+                "SELECT key, expires, value FROM cache WHERE key IN ({})".format(
+                    ", ".join("?" * len(chunk))),
+                chunk
+            ).fetchall()
+            for key, expires, value in rows:
+                if expires and expires <= self._now:
+                    expired.append(key)
+                    continue
+                r[key] = self._load(value)
+                self.memory.set(key, expires, r[key])
+                found.append(key)
+
+        self._touch(found)
+        self._delete(expired)
+
+        return r
+
     def set(self, key, value, expires=None):
-        return self.__setitem__(
-            key, value, self._now + datetime.timedelta(seconds=expires))
+        if expires is not None:
+            expires = self._now + expires
+        return self.__setitem__(key, value, expires)
 
-    def clear(self, key=None):
+    @synchronised
+    def set_many(self, mapping, expires=None):
         """
-        Removes a specific key from the cache manually, or will wipe the entire
-        cache if you don't specify `key`.  Note that this shouldn't be necessary
-        unless you've cached something with an inappropriately long expire time.
+        Like `.set()`, but for a whole dictionary of key -> value, all written
+        in a single transaction.
         """
-        if key:
-            if key in self._db:
-                del(self._db[key])
-        else:
-            for key in self.keys():
-                del(self._db[key])
 
+        if expires is not None:
+            expires = self._now + expires
+
+        rows = []
+        for key, value in mapping.items():
+            self.memory.set(key, expires, value)
+            rows.append(self._get_row(key, value, expires))
+
+        with self._db:
+            self._save_used()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cache "
+                "(key, namespace, expires, used, size, value) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self._wrote(len(rows))
+
+    @synchronised
+    def clear(self, key=None, namespace=None):
+        """
+        Removes a specific key from the cache manually, every key in a
+        namespace, or will wipe the entire cache (but for KEPT_NAMESPACES) if
+        you don't specify either.  Note that this shouldn't be necessary
+        unless you've cached something with an inappropriately long expire
+        time.
+        """
+        with self._db:
+            if key:
+                self.memory.discard(key)
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            elif namespace is not None:
+                self.memory.clear(namespace)
+                self._db.execute(
+                    "DELETE FROM cache WHERE namespace = ?", (namespace,))
+            else:
+                self.memory.clear()
+                self._db.execute(
+                    "DELETE FROM cache WHERE namespace NOT IN ({})".format(
+                        self._kept),
+                    self.KEPT_NAMESPACES
+                )
+
+    @synchronised
     def expire(self):
         """
-        Clears out should-be-expired values from the cache.  Note that this
-        happens automatically whenever you call `.get()` so you should never
-        really need to run this.
+        Clears out should-be-expired values from the cache and returns how many
+        there were.  Note that this happens automatically whenever you call
+        `.get()` and every so often when you write to the cache, so you should
+        never really need to run this.
         """
-        for key in self.keys():
-            self.get(key)
+        self.memory.expire(self._now)
+        with self._db:
+            return self._db.execute(
+                "DELETE FROM cache WHERE expires <= ?", (self._now,)
+            ).rowcount
+
+    @synchronised
+    def shrink(self):
+        """
+        Expires what's expired and then evicts the least recently used entries
+        until we're within both max_entries and max_bytes (which don't count
+        what's in KEPT_NAMESPACES).  Returns the number of entries removed.
+        """
+
+        removed = self.expire()
+
+        with self._db:
+            self._save_used()
+
+        entries, size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache "
+            "WHERE namespace NOT IN ({})".format(self._kept),
+            self.KEPT_NAMESPACES
+        ).fetchone()
+
+        excess_entries = 0
+        if self.max_entries and entries > self.max_entries:
+            excess_entries = entries - self.max_entries
+
+        excess_bytes = 0
+        if self.max_bytes and size > self.max_bytes:
+            excess_bytes = size - self.max_bytes
+
+        if not excess_entries and not excess_bytes:
+            return removed
+
+        evict = []
+        cursor = self._db.execute(
+            "SELECT key, size FROM cache WHERE namespace NOT IN ({}) "
+            "ORDER BY used".format(self._kept),
+            self.KEPT_NAMESPACES
+        )
+        for key, size in cursor:
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            evict.append(key)
+            excess_entries -= 1
+            excess_bytes -= size
+        cursor.close()
+
+        self._delete(evict)
+
+        return removed + len(evict)
+
+    @synchronised
+    def close(self):
+        """
+        Writes down which values we've used and closes the file.  The cache
+        can still be used afterwards: the file is simply opened again.
+        """
+        if self._connection is None:
+            return
+        with self._connection:
+            self._save_used()
+        self._connection.close()
+        self._connection = None
+
+    @synchronised
+    def compact(self):
+        """
+        SQLite doesn't give space back to the file system when you delete
+        things, so after a big clear out, this will shrink the file itself.
+        """
+        self._db.execute("VACUUM")
+
+    @synchronised
+    def get_stats(self):
+        """
+        Returns a dictionary describing what's in the cache, overall and per
+        namespace.
+        """
+
+        r = {
+            "path": self._path or self._get_or_create_db_path(),
+            "file-size": 0,
+            "entries": 0,
+            "bytes": 0,
+            "expired": 0,
+            "max-entries": None,
+            "max-bytes": None,
+            "namespaces": {},
+        }
+
+        query = "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0), " \
+                "COALESCE(SUM(expires <= ?), 0) FROM cache GROUP BY namespace"
+        for namespace, entries, size, expired in self._db.execute(
+                query, (self._now,)):
+            r["namespaces"][namespace] = {
+                "entries": entries,
+                "bytes": size,
+                "expired": expired,
+            }
+            r["entries"] += entries
+            r["bytes"] += size
+            r["expired"] += expired
+
+        r["max-entries"] = self.max_entries
+        r["max-bytes"] = self.max_bytes
+        if os.path.exists(r["path"]):
+            r["file-size"] = os.path.getsize(r["path"])
+
+        return r
+
+    @staticmethod
+    def get_namespace(key):
+        """
+        "probe:1234" -> "probe".  Keys without a colon live in the "" namespace.
+        """
+        if ":" in key:
+            return key.split(":", 1)[0]
+        return ""
+
+    @property
+    def _kept(self):
+        """
+        Placeholders for KEPT_NAMESPACES in a NOT IN (...) clause.
+        """
+        return ", ".join("?" * len(self.KEPT_NAMESPACES))
+
+    def _get_row(self, key, value, expires):
+        value = self._dump(value)
+        return (
+            key, self.get_namespace(key), expires, time.time(), len(value),
+            value
+        )
+
+    def _touch(self, keys):
+        """
+        Remember that `keys` were just used, so they're the last to be evicted.
+        This only happens in memory, until _save_used() is called.
+        """
+        now = time.time()
+        for key in keys:
+            self._used[key] = now
+
+    def _save_used(self):
+        """
+        Writes down when the values we've read were last used, in whatever
+        transaction the caller has open.
+        """
+        if not self._used:
+            return
+        self._db.executemany(
+            "UPDATE cache SET used = ? WHERE key = ?",
+            [(used, key) for key, used in self._used.items()]
+        )
+        self._used = {}
+
+    def _delete(self, keys):
+        if not keys:
+            return
+        with self._db:
+            for chunk in self._get_chunks(keys):
+                for key in chunk:
+                    self.memory.discard(key)
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN ({})".format(
+                        ", ".join("?" * len(chunk))),
+                    chunk
+                )
+
+    def _wrote(self, count):
+        """
+        Keep count of our writes, and every SHRINK_INTERVAL of them, make sure
+        the cache hasn't outgrown its limits.
+        """
+        self._writes += count
+        if self._writes >= self.SHRINK_INTERVAL:
+            self._writes = 0
+            self.shrink()
+
+    @classmethod
+    def _get_chunks(cls, keys):
+        for i in range(0, len(keys), cls.QUERY_CHUNK_SIZE):
+            yield list(keys[i:i + cls.QUERY_CHUNK_SIZE])
+
+    @staticmethod
+    def _dump(value):
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _load(value):
+        return pickle.loads(bytes(value))
+
+    def _connect(self):
+        """
+        Older versions of this cache were dbm files living at the same path.
+        It's just a cache, so if we find one of those (or anything else that
+        isn't an SQLite database), we throw it away and start over.
+
+        We never throw away a file just because we can't use it right now
+        though: if it's locked by another process for longer than TIMEOUT,
+        can't be opened, or was written by a newer version of this cache, we
+        say so and make do with a cache in memory for the rest of the run.
+        """
+
+        try:
+            if not self._is_database(self._path):
+                os.remove(self._path)
+            return self._initialise(self._open(self._path))
+        except (sqlite3.OperationalError, self.NewerSchema) as e:
+            sys.stderr.write(
+                "The cache at {} can't be used right now ({}), so we're "
+                "going without it.\n".format(self._path, e))
+            return self._initialise(self._open(":memory:"))
+
+    @classmethod
+    def _is_database(cls, path):
+        """
+        Whether the file at `path` is an SQLite database, or doesn't exist
+        yet (or is empty), so that SQLite can make one of it.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(len(cls.SQLITE_HEADER))
+        except (IOError, OSError):
+            return True
+        return not header or header == cls.SQLITE_HEADER
+
+    def _open(self, path):
+        """
+        The connection may be used by whichever thread holds our lock, not
+        only the one that opened it.
+        """
+        return sqlite3.connect(
+            path, timeout=self.TIMEOUT, check_same_thread=False)
+
+    def _initialise(self, db):
+        db.execute("PRAGMA synchronous = NORMAL")
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version > self.SCHEMA_VERSION:
+            db.close()
+            raise self.NewerSchema(
+                "it's from a newer version, {}".format(version))
+        with db:
+            if version < self.SCHEMA_VERSION:
+                db.execute("DROP TABLE IF EXISTS cache")
+                db.execute(
+                    "PRAGMA user_version = {:d}".format(self.SCHEMA_VERSION))
+            for statement in self.SCHEMA:
+                db.execute(statement)
+        return db
 
     @staticmethod
     def _get_or_create_db_path():
@@ -91,7 +637,9 @@ class LocalCache(object):
 
         return db_path
 
+
 cache = LocalCache()
+atexit.register(cache.close)
 
 
 class Memoiser(object):
@@ -105,7 +653,12 @@ class Memoiser(object):
 
     def __call__(self, *args, **kwargs):
 
-        key = pickle.dumps([args, kwargs])
+        key = "memoised:{}".format(hashlib.sha1(pickle.dumps([
+            self._function.__module__,
+            self._function.__name__,
+            args,
+            kwargs
+        ])).hexdigest())
         value = cache[key]
 
         if value:
@@ -0,0 +1,164 @@
+from __future__ import print_function, absolute_import
+
+from ..cache import cache
+from ..exceptions import RipeAtlasToolsException
+from ..helpers.colours import colourise
+from ..helpers.validators import ArgumentType
+from .base import Command as BaseCommand
+
+
+class Command(BaseCommand):
+
+    NAME = "cache"
+
+    DESCRIPTION = "Inspect and maintain the local cache of probes and IP " \
+                  "details.\n\nExamples:\n" \
+                  "  ripe-atlas cache stats\n" \
+                  "  ripe-atlas cache clear --namespace IPDetails\n" \
+                  "  ripe-atlas cache warm --probes 1,2,3\n" \
+                  "  ripe-atlas cache gazetteer --file cities1000.txt\n"
+
+    ACTIONS = ("stats", "expire", "compact", "clear", "warm", "gazetteer")
+
+    # The number of probes we write to the cache at once while warming it
+    WARM_BATCH_SIZE = 500
+
+    def add_arguments(self):
+        self.parser.add_argument(
+            "action",
+            choices=self.ACTIONS,
+            help="stats: show what's in the cache.  "
+                 "expire: remove everything that has expired, and anything "
+                 "over the configured size limits.  "
+                 "compact: give the space freed up by removed entries back to "
+                 "the file system.  "
+                 "clear: remove everything but the gazetteer, or only what's "
+                 "in --namespace.  "
+                 "warm: fetch every probe (or only --probes) into the cache "
+                 "ahead of time.  "
+                 "gazetteer: load the places in --file into the cache, so "
+                 "`probes --location` can find them without asking Google.  "
+                 "They're kept until you clear the Gazetteer namespace."
+        )
+        self.parser.add_argument(
+            "--namespace",
+            type=str,
+            help='The part of the key before the first colon, like "probe" '
+                 'or "IPDetails".  Only used with clear.'
+        )
+        self.parser.add_argument(
+            "--probes",
+            type=ArgumentType.comma_separated_integers(minimum=1),
+            help="A comma-separated list of probe ids.  Only used with warm."
+        )
+        self.parser.add_argument(
+            "--file",
+            type=ArgumentType.path,
+            help="A gazetteer: either a CSV file of location,lat,lng or a "
+                 "GeoNames dump like cities1000.txt.  Only used with "
+                 "gazetteer."
+        )
+
+    def run(self):
+        getattr(self, "run_{}".format(self.arguments.action))()
+
+    def run_stats(self):
+
+        stats = cache.get_stats()
+
+        print(colourise("\nCache: {}\n".format(stats["path"]), "bold"))
+        print("  File size:      {}".format(
+            self._get_size(stats["file-size"])))
+        print("  Entries:        {} (limit: {})".format(
+            stats["entries"], stats["max-entries"] or "none"))
+        print("  Values:         {} (limit: {})".format(
+            self._get_size(stats["bytes"]),
+            self._get_size(stats["max-bytes"]) if stats["max-bytes"] else "none"
+        ))
+        print("  Expired:        {}".format(stats["expired"]))
+
+        if not stats["namespaces"]:
+            return print("")
+
+        line = u"  {!s:<20} {!s:>10} {!s:>10} {!s:>10}"
+        print(colourise("\n" + line.format(
+            "Namespace", "Entries", "Size", "Expired"), "bold"))
+        for namespace in sorted(stats["namespaces"]):
+            detail = stats["namespaces"][namespace]
+            print(line.format(
+                namespace or '""',
+                detail["entries"],
+                self._get_size(detail["bytes"]),
+                detail["expired"]
+            ))
+        print("")
+
+    def run_expire(self):
+        self.ok("Removed {} entries from the cache".format(cache.shrink()))
+
+    def run_compact(self):
+        before = cache.get_stats()["file-size"]
+        cache.compact()
+        after = cache.get_stats()["file-size"]
+        self.ok("The cache file is now {} (was {})".format(
+            self._get_size(after), self._get_size(before)))
+
+    def run_clear(self):
+        cache.clear(namespace=self.arguments.namespace)
+        if self.arguments.namespace is None:
+            return self.ok(
+                "The cache has been cleared, except for anything imported "
+                "with gazetteer.  To remove that too, clear the {} "
+                "namespace.".format(
+                    " and ".join('"{}"'.format(namespace)
+                                 for namespace in cache.KEPT_NAMESPACES)))
+        self.ok('The "{}" namespace has been cleared'.format(
+            self.arguments.namespace))
+
+    def run_warm(self):
+
+        from ripe.atlas.cousteau import APIResponseError, ProbeRequest
+        from ..probes import Probe, ProbeRecord
+
+        kwargs = {}
+        if self.arguments.probes:
+            kwargs["id__in"] = ",".join(
+                [str(pk) for pk in self.arguments.probes])
+
+        count = 0
+        batch = []
+        try:
+            for probe in ProbeRequest(return_objects=True, **kwargs):
+                batch.append(ProbeRecord.from_probe(probe))
+                if len(batch) >= self.WARM_BATCH_SIZE:
+                    Probe.cache_many(batch)
+                    count += len(batch)
+                    batch = []
+        except APIResponseError as e:
+            raise RipeAtlasToolsException(
+                "The probes could not be fetched: {}".format(e))
+        finally:
+            if batch:
+                Probe.cache_many(batch)
+                count += len(batch)
+
+        self.ok("Cached {} probes".format(count))
+
+    def run_gazetteer(self):
+
+        from ..geocoding import Geocoder
+
+        if not self.arguments.file:
+            raise RipeAtlasToolsException(
+                "You need to specify a gazetteer with --file.")
+
+        self.ok("Imported {} places into the cache".format(
+            Geocoder.import_gazetteer(self.arguments.file)))
+
+    @staticmethod
+    def _get_size(size):
+        for unit in ("B", "KiB", "MiB"):
+            if size < 1024:
+                return "{:.0f} {}".format(size, unit)
+            size /= 1024.0
+        return "{:.1f} GiB".format(size)
@@ -0,0 +1,61 @@
+from __future__ import print_function, absolute_import
+
+import os
+
+from ..exceptions import RipeAtlasToolsException
+from ..helpers.validators import ArgumentType
+from ..ipdb import PrefixDatabase
+from .base import Command as BaseCommand
+
+
+class Command(BaseCommand):
+
+    NAME = "ipdb"
+
+    DESCRIPTION = "Manage a local prefix-to-ASN table, used to look up the " \
+                  "ASN of IP addresses\nwithout asking RIPEstat.  Both CAIDA " \
+                  "pfx2as files and `bgpdump -m` RIB dumps\nare understood, " \
+                  "optionally compressed with gzip or bzip2.\n\nExample:\n" \
+                  "  ripe-atlas ipdb import routeviews-rv2-20151015-1200.pfx2as.gz\n"
+
+    def add_arguments(self):
+        self.parser.add_argument(
+            "action",
+            choices=("import", "clear"),
+            help="Import a table, replacing the current one, or remove the "
+                 "current table altogether."
+        )
+        self.parser.add_argument(
+            "file",
+            type=ArgumentType.path,
+            nargs="?",
+            help='The table to import.  Use "-" for standard in.'
+        )
+
+    def run(self):
+
+        if self.arguments.action == "clear":
+            if PrefixDatabase.exists():
+                os.remove(PrefixDatabase.PATH)
+            return self.ok("The prefix table has been removed")
+
+        if not self.arguments.file:
+            raise RipeAtlasToolsException(
+                "You must specify the file you want to import")
+
+        source = PrefixDatabase.open_source(self.arguments.file)
+        try:
+            count = PrefixDatabase.build(PrefixDatabase.parse(source))
+        except (IOError, EOFError) as e:
+            raise RipeAtlasToolsException(
+                "The table could not be read: {}".format(e))
+        finally:
+            if self.arguments.file != "-":
+                source.close()
+
+        if not count:
+            raise RipeAtlasToolsException(
+                "No prefixes could be found in that file")
+
+        self.ok("Imported {} prefixes into {}".format(
+            count, PrefixDatabase.PATH))
@@ -4,15 +4,11 @@ import re
 
 from collections import OrderedDict
 
-from ripe.atlas.cousteau import (
-    Ping, Traceroute, Dns, Sslcert, Http, Ntp, AtlasSource, AtlasCreateRequest)
-
 from ...exceptions import RipeAtlasToolsException
 from ...helpers.colours import colourise
 from ...helpers.validators import ArgumentType
 from ...renderers import Renderer
 from ...settings import conf
-from ...streaming import Stream, CaptureLimitExceeded
 from ..base import Command as BaseCommand
 
 
@@ -22,13 +18,16 @@ class Command(BaseCommand):
 
     DESCRIPTION = "Create a measurement and optionally wait for the results"
 
+    # The names of the Cousteau classes used to create each kind of
+    # measurement.  Cousteau (and Requests with it) is only imported once we
+    # actually create something, so `aping --help` doesn't have to wait for it.
     CREATION_CLASSES = OrderedDict((
-        ("ping", Ping),
-        ("traceroute", Traceroute),
-        ("dns", Dns),
-        ("sslcert", Sslcert),
-        ("http", Http),
-        ("ntp", Ntp)
+        ("ping", "Ping"),
+        ("traceroute", "Traceroute"),
+        ("dns", "Dns"),
+        ("sslcert", "Sslcert"),
+        ("http", "Http"),
+        ("ntp", "Ntp")
     ))
 
     def __init__(self, *args, **kwargs):
@@ -38,6 +37,13 @@ class Command(BaseCommand):
 
         BaseCommand.__init__(self, *args, **kwargs)
 
+    def init_args(self, args=None):
+
+        BaseCommand.init_args(self, args)
+
+        if self.arguments.from_radius and not self.arguments.from_center:
+            self.parser.error("--from-radius only works with --from-center")
+
     def _modify_parser_args(self, args):
 
         kinds = self.CREATION_CLASSES.keys()
@@ -154,6 +160,15 @@ class Command(BaseCommand):
             help="A comma-separated list of probe-ids you want to use in your "
                  "measurement. Example: --from-probes=1,2,34,157,10006"
         )
+        origins.add_argument(
+            "--from-center",
+            type=ArgumentType.coordinates,
+            metavar="LAT,LNG",
+            help="Use the connected probes nearest to this point, as many as "
+                 "--probes asks for.  They're picked from the local copy of "
+                 "the probes, made with `ripe-atlas probes sync`. "
+                 "Example: --from-center=52.37,4.89"
+        )
         origins.add_argument(
             "--from-measurement",
             type=ArgumentType.integer_range(minimum=1),
@@ -169,6 +184,13 @@ class Command(BaseCommand):
             default=conf["specification"]["source"]["requested"],
             help="The number of probes you want to use"
         )
+        self.parser.add_argument(
+            "--from-radius",
+            type=ArgumentType.integer_range(minimum=1),
+            metavar="KM",
+            help="Only use probes within this many km of --from-center, "
+                 "which it needs."
+        )
         self.parser.add_argument(
             "--include-tag",
             type=ArgumentType.regex(r"^[a-z_\-]+$"),
@@ -228,17 +250,23 @@ class Command(BaseCommand):
             print(colourise("{:<25} {}".format(param, val), "cyan"))
 
     def create(self):
-        creation_class = self.CREATION_CLASSES[self._type]
 
-        return AtlasCreateRequest(
+        from ripe.atlas import cousteau
+
+        creation_class = getattr(cousteau, self.CREATION_CLASSES[self._type])
+
+        return cousteau.AtlasCreateRequest(
             server=conf["ripe-ncc"]["endpoint"].replace("https://", ""),
             key=self.arguments.auth,
             measurements=[creation_class(**self._get_measurement_kwargs())],
-            sources=[AtlasSource(**self._get_source_kwargs())],
+            sources=[cousteau.AtlasSource(**self._get_source_kwargs())],
             is_oneoff=self._is_oneoff
         ).create()
 
     def stream(self, pk, url):
+
+        from ...streaming import Stream, CaptureLimitExceeded
+
         self.ok("Connecting to stream...")
         try:
             Stream(capture_limit=self.arguments.probes, timeout=300).stream(
@@ -317,6 +345,11 @@ class Command(BaseCommand):
         elif self.arguments.from_measurement:
             r["type"] = "msm"
             r["value"] = self.arguments.from_measurement
+        elif self.arguments.from_center:
+            probes = self._get_nearest_probes()
+            r["requested"] = len(probes)
+            r["type"] = "probes"
+            r["value"] = ",".join([str(_) for _ in probes])
 
         r["tags"] = {
             "include": self.arguments.include_tag or [],
@@ -334,6 +367,40 @@ class Command(BaseCommand):
 
         return r
 
+    def _get_nearest_probes(self):
+        """
+        The ids of the connected probes nearest to --from-center, planned
+        locally from the probe catalogue rather than by asking the API.
+        """
+
+        from ...probes.catalogue import ProbeCatalogue
+
+        # A stale copy would have us pick probes that may well have gone
+        # away since, and the measurement would be created against them.
+        catalogue = ProbeCatalogue.get_fresh()
+        if catalogue is None or not len(catalogue):
+            raise RipeAtlasToolsException(
+                "Selecting probes with --from-center needs a local copy of the "
+                "probes, synced within the last {} hours.  Run `ripe-atlas "
+                "probes sync` first.".format(ProbeCatalogue.MAX_AGE // 3600)
+            )
+
+        lat, lng = self.arguments.from_center
+        probes = catalogue.get_index().nearest(
+            lat,
+            lng,
+            self.arguments.probes,
+            radius=self.arguments.from_radius,
+            accept=lambda probe: probe.status == "Connected"
+        )
+
+        if not len(probes):
+            raise RipeAtlasToolsException(
+                "There are no connected probes near enough to {},{}.".format(
+                    lat, lng))
+
+        return [probe.id for probe in probes]
+
     def _get_af(self):
         """
         Returns the specified af, or a guessed one, or the configured one.  In
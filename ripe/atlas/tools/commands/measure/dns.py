@@ -1,7 +1,5 @@
 from __future__ import print_function, absolute_import
 
-from ripe.atlas.sagan.dns import Message
-
 from ...exceptions import RipeAtlasToolsException
 from ...helpers.validators import ArgumentType
 from ...settings import conf
@@ -13,6 +11,8 @@ class DnsMeasureCommand(Command):
 
     def add_arguments(self):
 
+        from ripe.atlas.sagan.dns import Message
+
         Command.add_arguments(self)
 
         specific = self.parser.add_argument_group("DNS-specific Options")
@@ -6,6 +6,7 @@ from ripe.atlas.cousteau import MeasurementRequest
 
 from .base import Command as BaseCommand, TabularFieldsMixin
 from ..helpers.colours import colourise
+from ..helpers.prefetching import Prefetcher
 from ..helpers.validators import ArgumentType
 
 
@@ -114,7 +115,10 @@ class Command(TabularFieldsMixin, BaseCommand):
             self.arguments.field = ("id", "type", "description", "status")
 
         filters = self._get_filters()
-        measurements = MeasurementRequest(return_objects=True, **filters)
+        measurements = Prefetcher(
+            MeasurementRequest(return_objects=True, **filters),
+            limit=self.arguments.limit
+        )
         truncated_measurements = itertools.islice(
             measurements, self.arguments.limit)
 
@@ -2,14 +2,17 @@ from __future__ import print_function, absolute_import
 
 import itertools
 import six
-import requests
 
-from ripe.atlas.cousteau import ProbeRequest
-from ripe.atlas.tools.aggregators import ValueKeyAggregator, aggregate
+from ripe.atlas.cousteau import APIResponseError, ProbeRequest
+from ripe.atlas.tools.aggregators import ValueKeyAggregator, aggregate_stream
 
 from .base import Command as BaseCommand, TabularFieldsMixin
 from ..exceptions import RipeAtlasToolsException
+from ..geocoding import Geocoder
 from ..helpers.colours import colourise
+from ..helpers.prefetching import Prefetcher
+from ..probes.catalogue import ProbeCatalogue
+from ..probes.index import ProbeIndex
 
 
 class Command(TabularFieldsMixin, BaseCommand):
@@ -18,7 +21,9 @@ class Command(TabularFieldsMixin, BaseCommand):
 
     DESCRIPTION = (
         "Fetches and prints probes fulfilling specified criteria based on "
-        "given filters."
+        "given filters.\n\nUse `ripe-atlas probes sync` to keep a local "
+        "copy of every probe, which\nis used instead of the API while it's "
+        "fresh."
     )
 
     # Column name: (alignment, width)
@@ -42,6 +47,13 @@ class Command(TabularFieldsMixin, BaseCommand):
         BaseCommand.__init__(self, *args, **kwargs)
         self.aggregators = []
         self.first_line_padding = False
+        self.is_sync = False
+
+    def _modify_parser_args(self, args):
+        if args and args[0] == "sync":
+            self.is_sync = True
+            args = args[1:]
+        return BaseCommand._modify_parser_args(self, args)
 
     def add_arguments(self):
         """Adds all commands line arguments for this command."""
@@ -101,6 +113,14 @@ class Command(TabularFieldsMixin, BaseCommand):
             type=int,
             help="Radius in km from specified center/point."
         )
+        area.add_argument(
+            "--nearest",
+            type=int,
+            metavar="N",
+            help="Only the N probes nearest to the specified center/point, "
+                 "nearest first.  This needs a local copy of the probes, "
+                 "made with `ripe-atlas probes sync`."
+        )
 
         self.parser.add_argument(
             "--limit",
@@ -142,6 +162,19 @@ class Command(TabularFieldsMixin, BaseCommand):
             type=int,
             help="Maximum number of probes per aggregated bucket."
         )
+        self.parser.add_argument(
+            "--offline",
+            action="store_true",
+            help="Query the local copy of the probes made with "
+                 "`ripe-atlas probes sync` rather than the API, even if it's "
+                 "out of date."
+        )
+        self.parser.add_argument(
+            "--full",
+            action="store_true",
+            help="With sync, download every probe again rather than only "
+                 "the ones that have changed."
+        )
         self.parser.add_argument(
             "--ids-only",
             action='store_true',
@@ -153,6 +186,9 @@ class Command(TabularFieldsMixin, BaseCommand):
 
     def run(self):
 
+        if self.is_sync:
+            return self.sync()
+
         if not self.arguments.field:
             self.arguments.field = (
                 "id", "asn_v4", "asn_v6", "country", "status")
@@ -164,12 +200,14 @@ class Command(TabularFieldsMixin, BaseCommand):
                 "Typically you'd want to run this with some arguments to "
                 "filter the probe \nlist, as fetching all of the probes can "
                 "take a Very Long Time.  However, if you \ndon't care about "
-                "the wait, you can use --all and go get yourself a coffee.",
+                "the wait, you can use --all and go get yourself a coffee.\n"
+                "If you do that a lot, `ripe-atlas probes sync` will keep a "
+                "local copy of \nevery probe for you.",
                 "blue"
             ))
 
         self.set_aggregators()
-        probes = ProbeRequest(return_objects=True, **filters)
+        probes = self.get_probes(filters)
         truncated_probes = itertools.islice(
             probes, self.arguments.limit)
 
@@ -186,7 +224,11 @@ class Command(TabularFieldsMixin, BaseCommand):
 
         if self.arguments.aggregate_by:
 
-            buckets = aggregate(list(truncated_probes), self.aggregators)
+            buckets = aggregate_stream(
+                truncated_probes,
+                self.aggregators,
+                self.arguments.max_per_aggregation
+            )
             self.render_aggregation(buckets)
 
         else:
@@ -204,6 +246,90 @@ class Command(TabularFieldsMixin, BaseCommand):
             )
         ))
 
+    def sync(self):
+
+        catalogue = ProbeCatalogue()
+        try:
+            fetched, is_full = catalogue.sync(full=self.arguments.full)
+        except APIResponseError as e:
+            raise RipeAtlasToolsException(
+                "The probes could not be fetched: {}".format(e))
+
+        self.ok("{} sync complete: {} probes downloaded, {} in the "
+                "catalogue".format(
+                    "Full" if is_full else "Incremental",
+                    fetched,
+                    len(catalogue)
+                ))
+
+    def get_probes(self, filters):
+        """
+        If there's a fresh catalogue, or we've been asked to work offline, we
+        answer the query from the catalogue's indexes.  Otherwise, everything
+        comes from the API.
+        """
+
+        if self.arguments.offline:
+            catalogue = ProbeCatalogue()
+            if not len(catalogue):
+                raise RipeAtlasToolsException(
+                    "There's no local copy of the probes to query yet.  "
+                    "Run `ripe-atlas probes sync` first."
+                )
+        else:
+            catalogue = ProbeCatalogue.get_fresh()
+
+        if self.arguments.nearest:
+            if not catalogue:
+                raise RipeAtlasToolsException(
+                    "Finding the nearest probes needs a recent local copy of "
+                    "the probes.  Run `ripe-atlas probes sync` first."
+                )
+            return self._get_nearest(catalogue.get_index(), filters)
+
+        if catalogue and not filters:
+            return catalogue
+
+        if self.arguments.offline or \
+                catalogue and ProbeIndex.can_filter(filters):
+            return catalogue.get_index().filter(**filters)
+
+        return Prefetcher(
+            ProbeRequest(return_objects=True, **filters),
+            limit=self.arguments.limit
+        )
+
+    def _get_nearest(self, index, filters):
+        """
+        The --nearest probes to the point in `filters`, within its radius if
+        it has one.
+        """
+
+        filters = dict(filters)
+        radius = None
+        if "radius" in filters:
+            point, radius = filters.pop("radius").split(":")
+            lat, lng = point.split(",")
+        elif "latitude" in filters and "longitude" in filters:
+            lat, lng = filters.pop("latitude"), filters.pop("longitude")
+        else:
+            raise RipeAtlasToolsException(
+                "--nearest needs a --center or a --location to be near to.")
+
+        try:
+            lat, lng = float(lat), float(lng)
+        except ValueError:
+            raise RipeAtlasToolsException(
+                "Point argument should be in <lat,lng> format.")
+
+        return index.nearest(
+            lat,
+            lng,
+            self.arguments.nearest,
+            radius=float(radius) if radius else None,
+            **filters
+        )
+
     def render_aggregation(self, aggregation_data, indent=0):
         """
         Recursively traverses through aggregation data and print them indented.
@@ -224,12 +350,9 @@ class Command(TabularFieldsMixin, BaseCommand):
 
         elif isinstance(aggregation_data, list):
 
-            for index, probe in enumerate(aggregation_data):
-                print(" ", end="")
+            # Buckets only hold up to --max-per-aggregation probes already
+            for probe in aggregation_data:
                 print(self._get_line(probe))
-                if self.arguments.max_per_aggregation:
-                    if index >= self.arguments.max_per_aggregation - 1:
-                        break
 
     def build_request_args(self):
         """
@@ -329,34 +452,11 @@ class Command(TabularFieldsMixin, BaseCommand):
         return location_args
 
     def location2degrees(self):
-        """Fetches degrees based on the given location."""
-        error_log = (
-            "Following error occured while trying to fetch lat/lon"
-            "for location <{}>:\n{}"
-        )
-        goole_api_url = "http://maps.googleapis.com/maps/api/geocode/json"
-        try:
-            result = requests.get(goole_api_url, params={
-                "sensor": "false",
-                "address": self.arguments.location
-            })
-        except (
-            requests.ConnectionError,
-            requests.HTTPError,
-            requests.Timeout,
-        ) as e:
-            error_log = error_log.format(self.arguments.location, e)
-            raise RipeAtlasToolsException(error_log)
-
-        result = result.json()
-
-        try:
-            lat = result["results"][0]["geometry"]["location"]["lat"]
-            lng = result["results"][0]["geometry"]["location"]["lng"]
-        except (KeyError, IndexError) as e:
-            error = error_log.format(self.arguments.location, e)
-            raise RipeAtlasToolsException(error)
-
+        """
+        Fetches degrees based on the given location, from the geocoding cache
+        if we've seen it before.
+        """
+        lat, lng = Geocoder.resolve(self.arguments.location)
         return str(lat), str(lng)
 
     def _clean_center(self):
@@ -1,18 +1,18 @@
 from __future__ import print_function
 
+import calendar
 import sys
 
 import itertools
 
-try:
-    import ujson as json
-except ImportError:
-    import json
-
 from ripe.atlas.sagan import Result
 
 from ..aggregators import RangeKeyAggregator, ValueKeyAggregator, aggregate
+from ..exceptions import RipeAtlasToolsException
+from ..helpers.output import Output
 from ..helpers.rendering import SaganSet, Rendering
+from ..helpers.streaming import (
+    JSONArrayStream, MappedLines, open_input, read_chunks)
 from ..helpers.validators import ArgumentType
 from ..renderers import Renderer
 from .base import Command as BaseCommand
@@ -39,6 +39,9 @@ class Command(BaseCommand):
         "prefix_v6": ["probe.prefix_v6", ValueKeyAggregator],
     }
 
+    # How much of a JSON list we read at once
+    READ_SIZE = 1024 * 1024
+
     def __init__(self, *args, **kwargs):
         BaseCommand.__init__(self, *args, **kwargs)
         self.file = None
@@ -59,12 +62,39 @@ class Command(BaseCommand):
             help="A comma-separated list of probe ids you want to see "
                  "exclusively."
         )
+        self.parser.add_argument(
+            "--start-time",
+            type=ArgumentType.datetime,
+            help="Only render results created at or after this time."
+        )
+        self.parser.add_argument(
+            "--stop-time",
+            type=ArgumentType.datetime,
+            help="Only render results created at or before this time."
+        )
         self.parser.add_argument(
             "--from-file",
             type=ArgumentType.path,
             default="-",
             help='The source of the data to be rendered.  If nothing is '
-                 'specified, we assume "-" or, standard in (the default).'
+                 'specified, we assume "-" or, standard in (the default).  '
+                 'Files compressed with gzip, bzip2, xz or zstd are '
+                 'decompressed as they are read.'
+        )
+        self.parser.add_argument(
+            "--to-file",
+            type=str,
+            help="Write what's rendered to this file rather than standard "
+                 "out.  If its name ends with .gz, .bz2, .xz or .zst, it's "
+                 "compressed accordingly."
+        )
+        self.parser.add_argument(
+            "--jobs",
+            type=ArgumentType.integer_range(minimum=1),
+            default=1,
+            help="The number of processes used to parse the results.  On a "
+                 "large file, setting this to the number of cores you have "
+                 "can speed things up considerably."
         )
         self.parser.add_argument(
             "--aggregate-by",
@@ -83,14 +113,35 @@ class Command(BaseCommand):
 
         sample, source = self._get_sample_result_and_source(using_regular_file)
 
-        results = SaganSet(iterable=source, probes=self.arguments.probes)
-        if self.arguments.aggregate_by:
-            results = aggregate(results, self.get_aggregators())
-
         renderer = Renderer.get_renderer(
             self.arguments.renderer, Result.get(sample).type)()
 
-        Rendering(renderer=renderer, payload=results).render()
+        aggregators = []
+        if self.arguments.aggregate_by:
+            aggregators = self.get_aggregators()
+
+        results = SaganSet(
+            iterable=source,
+            probes=self.arguments.probes,
+            jobs=self.arguments.jobs,
+            start=self._get_timestamp(self.arguments.start_time),
+            stop=self._get_timestamp(self.arguments.stop_time),
+            attach_probes=renderer.NEEDS_PROBES or any(
+                a.needs_probes for a in aggregators),
+            parse=renderer.NEEDS_PARSING or bool(aggregators)
+        )
+        if aggregators:
+            results = aggregate(results, aggregators)
+
+        output = Output()
+        if self.arguments.to_file:
+            output = Output.open(self.arguments.to_file)
+
+        try:
+            Rendering(
+                renderer=renderer, payload=results, output=output).render()
+        finally:
+            output.close()
 
         if using_regular_file:
             self.file.close()
@@ -117,29 +168,49 @@ class Command(BaseCommand):
 
         return aggregation_keys
 
+    @staticmethod
+    def _get_timestamp(time):
+        """
+        Times without a timezone are in UTC.
+        """
+        if time is None:
+            return None
+        return calendar.timegm(time.utctimetuple())
+
     def _get_sample_result_and_source(self, using_regular_file):
         """
         We need to get the first result from the source in order to detect the
         type.  Additionally, if the source is actually one great big JSON list,
-        then we need to parse it so we iterate over the results since there's no
-        newline characters.
+        then we decode it one result at a time, since there's no newline
+        characters to split it on.
         """
 
         self.file = sys.stdin
         if using_regular_file:
-            self.file = open(self.arguments.from_file)
-
-        # Pop the first line off the source stack.  This may very well be a Very
-        # Large String and cause a memory explosion, but we like to let our
-        # users shoot themselves in the foot.
-        sample = self.file.next()
-
-        # Re-attach the line back onto the iterable so we don't lose anything
-        source = itertools.chain([sample], self.file)
-
-        # In the case of the Very Large String, we parse out the JSON here
-        if sample.startswith("["):
-            source = json.loads("".join(source))
-            sample = source[0]  # Reassign sample to an actual result
-
-        return sample, source
+            self.file = open_input(self.arguments.from_file, self.READ_SIZE)
+
+        # Pop the first line off the source stack.  In the case of a JSON list,
+        # this may very well be a Very Large String, so we only read a chunk of
+        # it and leave the rest for later.
+        sample = self.file.readline(self.READ_SIZE)
+
+        if not sample.lstrip().startswith("["):
+            if not sample.endswith("\n"):
+                sample += self.file.readline()  # The rest of a long line
+            # With more than one job, a regular file is read through mmap, from
+            # the start again, so the workers can each read their own part.
+            path = self.arguments.from_file
+            if using_regular_file and self.arguments.jobs > 1 and \
+                    MappedLines.can_map(path):
+                return sample, MappedLines(path)
+            # Re-attach the line back onto the iterable so we don't lose anything
+            return sample, itertools.chain([sample], self.file)
+
+        source = iter(JSONArrayStream(
+            itertools.chain([sample], read_chunks(self.file, self.READ_SIZE))))
+        try:
+            sample = next(source)  # Reassign sample to an actual result
+        except StopIteration:
+            raise RipeAtlasToolsException("There are no results to render.")
+
+        return sample, itertools.chain([sample], source)
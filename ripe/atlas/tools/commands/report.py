@@ -103,9 +103,19 @@ class Command(BaseCommand):
             raise RipeAtlasToolsException(
                 "There aren't any results available for that measurement")
 
-        results = SaganSet(iterable=results, probes=self.arguments.probes)
+        aggregators = []
         if self.arguments.aggregate_by:
-            results = aggregate(results, self.get_aggregators())
+            aggregators = self.get_aggregators()
+
+        results = SaganSet(
+            iterable=results,
+            probes=self.arguments.probes,
+            attach_probes=renderer.NEEDS_PROBES or any(
+                a.needs_probes for a in aggregators),
+            parse=renderer.NEEDS_PARSING or bool(aggregators)
+        )
+        if aggregators:
+            results = aggregate(results, aggregators)
 
         Rendering(
             renderer=renderer,
@@ -0,0 +1,172 @@
+import csv
+import io
+import re
+
+import requests
+import six
+
+from .cache import cache
+from .exceptions import RipeAtlasToolsException
+
+
+class Geocoder(object):
+    """
+    Turns a free-form location like "Amsterdam" into a (lat, lng) pair.
+
+    Answers are kept in the local cache, keyed by the normalised location, so
+    asking about the same place again (in any case or spacing) doesn't need
+    the network.  Places imported from a gazetteer go in a namespace of their
+    own, which the cache never expires, evicts or clears unless asked to by
+    name, so common locations can be resolved without ever asking Google at
+    all.
+    """
+
+    URL = "http://maps.googleapis.com/maps/api/geocode/json"
+
+    # Places don't move much
+    CACHE_EXPIRATION_TIME = 60 * 60 * 24 * 365
+
+    # The number of gazetteer entries we write to the cache at once
+    IMPORT_BATCH_SIZE = 500
+
+    # GeoNames dumps (like cities1000.txt) are tab-separated with the name,
+    # ASCII name, latitude, longitude and population in these columns.
+    GEONAMES_NAME, GEONAMES_ASCII_NAME = 1, 2
+    GEONAMES_LAT, GEONAMES_LNG = 4, 5
+    GEONAMES_POPULATION = 14
+
+    ERROR_MESSAGE = (
+        "Following error occured while trying to fetch lat/lon"
+        "for location <{}>:\n{}"
+    )
+
+    @staticmethod
+    def normalise(location):
+        """
+        "  New   York, " and "new york" are the same place.
+        """
+        if isinstance(location, bytes):
+            location = location.decode("utf-8")
+        return re.sub(r"\s+", " ", location).strip(" ,").lower()
+
+    @classmethod
+    def get_cache_key(cls, location):
+        return u"Geocoding:{}".format(cls.normalise(location))
+
+    @classmethod
+    def get_gazetteer_key(cls, location):
+        return u"Gazetteer:{}".format(cls.normalise(location))
+
+    @classmethod
+    def resolve(cls, location):
+        """
+        Returns a (lat, lng) tuple for `location`, from the gazetteer or the
+        cache if we can, and from Google if we can't.
+        """
+
+        keys = (cls.get_gazetteer_key(location), cls.get_cache_key(location))
+
+        found = cache.get_many(keys)
+        for key in keys:
+            if key in found:
+                return found[key]
+
+        r = cls._query(location)
+        cache.set(keys[1], r, cls.CACHE_EXPIRATION_TIME)
+
+        return r
+
+    @classmethod
+    def _query(cls, location):
+
+        try:
+            result = requests.get(cls.URL, params={
+                "sensor": "false",
+                "address": location
+            })
+        except (
+            requests.ConnectionError,
+            requests.HTTPError,
+            requests.Timeout,
+        ) as e:
+            raise RipeAtlasToolsException(
+                cls.ERROR_MESSAGE.format(location, e))
+
+        result = result.json()
+
+        try:
+            return (
+                result["results"][0]["geometry"]["location"]["lat"],
+                result["results"][0]["geometry"]["location"]["lng"]
+            )
+        except (KeyError, IndexError) as e:
+            raise RipeAtlasToolsException(
+                cls.ERROR_MESSAGE.format(location, e))
+
+    @classmethod
+    def import_gazetteer(cls, path):
+        """
+        Loads every place in the gazetteer at `path` into the cache, where
+        they're kept until `ripe-atlas cache clear --namespace Gazetteer`, and
+        returns the number of places imported.  Two formats are understood:
+
+          * CSV, with one `location,lat,lng` per line.  Blank lines and lines
+            starting with # are skipped.
+          * A GeoNames dump (like cities1000.txt), where a name shared by more
+            than one place goes to the one with the most people.
+        """
+
+        places = {}
+        with io.open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                for name, lat, lng, population in cls._parse_line(line):
+                    key = cls.get_gazetteer_key(name)
+                    if key not in places or population > places[key][0]:
+                        places[key] = (population, (lat, lng))
+
+        batch = {}
+        for key, (_, coordinates) in places.items():
+            batch[key] = coordinates
+            if len(batch) >= cls.IMPORT_BATCH_SIZE:
+                cache.set_many(batch)
+                batch = {}
+        if batch:
+            cache.set_many(batch)
+
+        return len(places)
+
+    @classmethod
+    def _parse_line(cls, line):
+        """
+        Returns a list of (name, lat, lng, population) tuples for the names
+        given to a place on one line of a gazetteer.
+        """
+
+        columns = line.rstrip("\r\n").split("\t")
+
+        try:
+
+            if len(columns) > cls.GEONAMES_POPULATION:
+                lat = float(columns[cls.GEONAMES_LAT])
+                lng = float(columns[cls.GEONAMES_LNG])
+                population = int(columns[cls.GEONAMES_POPULATION] or 0)
+                return [
+                    (columns[i], lat, lng, population)
+                    for i in (cls.GEONAMES_NAME, cls.GEONAMES_ASCII_NAME)
+                    if columns[i]
+                ]
+
+            # The csv module in Python 2 doesn't do unicode
+            if six.PY2:
+                row = next(csv.reader([line.strip().encode("utf-8")]))
+                row = [_.decode("utf-8") for _ in row]
+            else:
+                row = next(csv.reader([line.strip()]))
+            return [(row[0], float(row[1]), float(row[2]), 0)]
+
+        except (IndexError, ValueError):
+            raise RipeAtlasToolsException(
+                "This doesn't look like a gazetteer entry: {}".format(
+                    line.strip()))
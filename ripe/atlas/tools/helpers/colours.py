@@ -44,7 +44,22 @@ class Colour(object):
         return cls._colourise(text, 1)
 
 
+def is_tty():
+    """
+    Whether standard out is a terminal.  We only ask once for each thing
+    that's standing in for standard out, since we ask for every line we
+    colour.
+    """
+    global _tty
+    if _tty[0] is not sys.stdout:
+        _tty = (sys.stdout, sys.stdout.isatty())
+    return _tty[1]
+
+
+_tty = (None, False)
+
+
 def colourise(text, colour):
-    if sys.stdout.isatty():
+    if is_tty():
         return getattr(Colour, colour)(text)
     return text
@@ -0,0 +1,26 @@
+"""
+JSON encoding and decoding with ujson if it's installed (it's in the "fast"
+extra), and the standard library if it isn't.  Either way, what comes out of
+dumps() is compact: no spaces after separators.
+"""
+
+from __future__ import absolute_import
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+import json
+
+
+def loads(string):
+    if ujson is not None:
+        return ujson.loads(string)
+    return json.loads(string)
+
+
+def dumps(data):
+    if ujson is not None:
+        return ujson.dumps(data, escape_forward_slashes=False)
+    return json.dumps(data, separators=(",", ":"))
@@ -0,0 +1,146 @@
+import bz2
+import gzip
+import sys
+import threading
+
+import six
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..exceptions import RipeAtlasToolsException
+
+
+def _open_zstd(path):
+    return zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+
+
+class Output(object):
+    """
+    Where rendered output goes: standard out unless we're given another
+    file.  Rather than write every line as it comes, we collect them and
+    write them BUFFER_SIZE characters at a time.  With a `flush_interval`,
+    we also never hold on to anything for longer than that many seconds, so
+    a slow trickle of results (like a stream) still shows up as it arrives:
+
+      output = Output(flush_interval=Output.FLUSH_INTERVAL)
+      output.write("Hello\n")
+      output.flush()
+
+    Whether we're writing to a terminal is only asked once, so it's cheap to
+    check for every line we colour.  An Output can stand in for a file, so
+    anything that print()s can be pointed at one.
+    """
+
+    BUFFER_SIZE = 1024 * 64
+    FLUSH_INTERVAL = 0.5
+
+    # Files with these extensions are compressed as we write them
+    COMPRESSORS = (
+        (".gz", "gzip", gzip, "gzip", lambda path: gzip.open(path, "wb")),
+        (".bz2", "bzip2", bz2, "bz2", lambda path: bz2.BZ2File(path, "wb")),
+        (".xz", "xz", lzma, "lzma", lambda path: lzma.open(path, "wb")),
+        (".zst", "zstd", zstandard, "zstandard", _open_zstd),
+    )
+
+    def __init__(self, f=None, buffer_size=None, flush_interval=None,
+                 binary=False):
+
+        self.file = f or sys.stdout
+        self.buffer_size = buffer_size or self.BUFFER_SIZE
+        self.flush_interval = flush_interval
+
+        isatty = getattr(self.file, "isatty", None)
+        self.is_tty = bool(isatty and isatty())
+
+        # Binary files want bytes, and in Python 2, so does everything else
+        self._encode = binary or six.PY2
+
+        self._buffer = []
+        self._size = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """
+        An Output writing to the file at `path`, compressed if its name ends
+        with .gz, .bz2, .xz or .zst.
+        """
+
+        for extension, name, module, module_name, opener in cls.COMPRESSORS:
+            if path.endswith(extension):
+                if module is None:
+                    raise RipeAtlasToolsException(
+                        "We can't write {} files without the {} module.".format(
+                            name, module_name))
+                return cls(opener(path), binary=True, **kwargs)
+
+        return cls(open(path, "wb" if six.PY2 else "w"), **kwargs)
+
+    def isatty(self):
+        return self.is_tty
+
+    def write(self, text):
+
+        if self._encode and isinstance(text, six.text_type):
+            text = text.encode("utf-8")
+
+        with self._lock:
+            self._buffer.append(text)
+            self._size += len(text)
+            full = self._size >= self.buffer_size
+            if not full and self.flush_interval and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+
+        with self._lock:
+            timer, self._timer = self._timer, None
+            if self._buffer:
+                self.file.write(
+                    (b"" if self._encode else u"").join(self._buffer))
+                self._buffer = []
+                self._size = 0
+            flush = getattr(self.file, "flush", None)  # Not on Python 2's BZ2File
+            if flush:
+                flush()
+
+        # The timer may be waiting on the lock to flush for itself, so we
+        # only wait for it once we've let go.
+        if timer is not None:
+            timer.cancel()
+            if timer is not threading.current_thread():
+                timer.join()
+
+    def close(self):
+        """
+        Flushes what's left and, unless it's standard out, closes the file.
+        """
+        self.flush()
+        if self.file not in (sys.stdout, sys.__stdout__):
+            self.file.close()
+
+
+def write_to(output, function, *args, **kwargs):
+    """
+    Calls `function` with anything it print()s going to `output`.
+    """
+    stdout = sys.stdout
+    sys.stdout = output
+    try:
+        return function(*args, **kwargs)
+    finally:
+        sys.stdout = stdout
@@ -0,0 +1,138 @@
+import math
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from ripe.atlas.cousteau import (
+    APIResponseError, AtlasRequest, MeasurementRequest, ProbeRequest)
+
+try:
+    from urllib.parse import parse_qsl, urlencode, urlparse
+except ImportError:  # Python 2
+    from urllib import urlencode
+    from urlparse import parse_qsl, urlparse
+
+
+class Prefetcher(object):
+    """
+    Wraps one of Cousteau's paginated requests (ProbeRequest,
+    MeasurementRequest) so that, rather than asking for page N+1 only once
+    we've finished with page N, we keep up to CONCURRENCY pages in flight
+    while the objects are handed out in order:
+
+      for probe in Prefetcher(ProbeRequest(return_objects=True), limit=100):
+          print(probe.id)
+
+    The first page tells us how many objects there are and how many come in
+    a page, so we can work out the rest of the page urls up front, and with
+    a `limit`, we never ask for a page we won't need.  Anything that isn't a
+    plain Cousteau request (like a very long id__in list that Cousteau splits
+    across several urls) is just iterated the usual way.
+    """
+
+    CONCURRENCY = 4
+
+    def __init__(self, request, limit=None, concurrency=None):
+        self.request = request
+        self.limit = limit
+        self.concurrency = concurrency or self.CONCURRENCY
+        self._count = None
+
+    @property
+    def total_count(self):
+        if self._count is None:
+            return self.request.total_count
+        return self._count
+
+    def __iter__(self):
+
+        if not self._is_prefetchable():
+            for obj in self.request:
+                yield obj
+            return
+
+        page = self._get_page(self.request.atlas_url)
+        self._count = page.get("count") or 0
+
+        for obj in self._get_objects(page):
+            yield obj
+
+        urls = self._get_page_urls(page)
+        if urls is None:
+            # No page numbers to work with, so we follow the links instead
+            while page.get("next"):
+                page = self._get_page(self._get_path(page["next"]))
+                for obj in self._get_objects(page):
+                    yield obj
+            return
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            pending = deque()
+            for url in urls:
+                pending.append(pool.apply_async(self._get_page, (url,)))
+                if len(pending) >= self.concurrency:
+                    for obj in self._get_objects(pending.popleft().get()):
+                        yield obj
+            while pending:
+                for obj in self._get_objects(pending.popleft().get()):
+                    yield obj
+        finally:
+            pool.terminate()
+
+    def _is_prefetchable(self):
+        if not isinstance(self.request, (MeasurementRequest, ProbeRequest)):
+            return False
+        return self.request.atlas_url and not self.request.split_urls
+
+    def _get_page(self, url):
+        is_success, results = AtlasRequest(
+            url_path=url,
+            user_agent=self.request._user_agent,
+            server=self.request.server,
+            verify=self.request.verify,
+        ).get()
+        if not is_success:
+            raise APIResponseError(results)
+        return results
+
+    def _get_objects(self, page):
+        for obj in page.get("results") or []:
+            if self.request.return_objects:
+                yield self.request.object_class(meta_data=obj)
+            else:
+                yield obj
+
+    def _get_page_urls(self, first_page):
+        """
+        The urls of every page after the first one that we need, or None if
+        the API isn't numbering its pages.
+        """
+
+        if not first_page.get("next"):
+            return []
+
+        parsed = urlparse(first_page["next"])
+        query = parse_qsl(parsed.query)
+        if dict(query).get("page") != "2":
+            return None
+
+        page_size = len(first_page.get("results") or [])
+        if not page_size:
+            return []
+
+        wanted = self._count
+        if self.limit is not None:
+            wanted = min(wanted, self.limit)
+        pages = int(math.ceil(wanted / float(page_size)))
+
+        query = [(k, v) for k, v in query if k != "page"]
+        return [
+            "{}?{}".format(parsed.path, urlencode(query + [("page", n)]))
+            for n in range(2, pages + 1)
+        ]
+
+    @staticmethod
+    def _get_path(url):
+        parsed = urlparse(url)
+        return "{}?{}".format(parsed.path, parsed.query)
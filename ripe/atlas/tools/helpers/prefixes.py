@@ -0,0 +1,218 @@
+import binascii
+import socket
+
+import IPy
+
+
+BITS = {4: 32, 6: 128}
+
+
+def parse_prefix(prefix):
+    """
+    A (version, network, length) tuple for `prefix`, a string or an `IPy.IP`
+    instance, with the network as an integer and its host bits cleared.  An
+    address without a length is a host route.  Raises ValueError if `prefix`
+    isn't valid.
+
+    This is the same as asking IPy, just without building an IPy object for
+    every one of the thousands of prefixes we may be indexing.
+    """
+
+    if not isinstance(prefix, IPy.IP):
+        address, _, length = prefix.partition("/")
+        version, family = (6, socket.AF_INET6) if ":" in address else (4, socket.AF_INET)
+        try:
+            network = int(binascii.hexlify(socket.inet_pton(family, address)), 16)
+            length = int(length) if length else BITS[version]
+        except (AttributeError, UnicodeError, ValueError, socket.error):
+            network = None  # No inet_pton on this platform, or a form it doesn't know
+        if network is None or not 0 <= length <= BITS[version]:
+            prefix = IPy.IP(prefix, make_net=True)
+
+    if isinstance(prefix, IPy.IP):
+        version, network, length = prefix.version(), prefix.int(), prefix.prefixlen()
+
+    host_bits = BITS[version] - length
+    return version, network >> host_bits << host_bits, length
+
+
+class PrefixTree(object):
+    """
+    A binary radix tree of IPv4 and IPv6 prefixes, each carrying an arbitrary
+    value.  Finding the most specific prefix containing an address walks at
+    most one node per bit of that address, no matter how many prefixes are in
+    the tree:
+
+      tree = PrefixTree()
+      tree.insert("193.0.0.0/21", "RIPE NCC")
+      tree.lookup("193.0.6.1")  # ("193.0.0.0/21", "RIPE NCC")
+    """
+
+    # Node layout: [zero-branch, one-branch, prefix, value].  The prefix is
+    # kept as a (version, network, length) tuple until someone asks for it.
+    ZERO, ONE, PREFIX, VALUE = range(4)
+
+    BITS = BITS
+
+    def __init__(self):
+        self._roots = {4: self._node(), 6: self._node()}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, prefix, value):
+        """
+        Adds `prefix` to the tree, or replaces the value of an existing one.
+        Host bits are ignored, so "193.0.6.1/21" is treated as "193.0.0.0/21".
+        """
+        self.insert_network(*parse_prefix(prefix), value=value)
+
+    def insert_network(self, version, network, length, value):
+        """
+        insert() for a prefix that's already been through parse_prefix(),
+        which is the cheapest way to fill a tree with lots of them.
+        """
+
+        node = self._roots[version]
+        for bit in self._get_bits(version, network, length):
+            if node[bit] is None:
+                node[bit] = [None, None, None, None]  # Inlined _node()
+            node = node[bit]
+
+        if node[self.PREFIX] is None:
+            self._size += 1
+        node[self.PREFIX] = (version, network, length)
+        node[self.VALUE] = value
+
+    def remove(self, prefix):
+        """
+        Removes `prefix` from the tree if it's there.  Empty branches are left
+        in place, since they're cheap and will likely be filled up again.
+        """
+
+        node = self._find(prefix)
+        if node is None:
+            return
+
+        if node[self.PREFIX] is not None:
+            self._size -= 1
+        node[self.PREFIX] = None
+        node[self.VALUE] = None
+
+    def lookup(self, address):
+        """
+        Returns a (prefix, value) tuple for the most specific prefix that
+        contains `address`, or None if there isn't one.  `address` may be a
+        string or an `IPy.IP` instance.
+        """
+
+        version, network, _ = parse_prefix(address)
+        node = self._roots[version]
+        match = None
+        for bit in self._get_bits(version, network, self.BITS[version]):
+            if node[self.PREFIX] is not None:
+                match = node
+            node = node[bit]
+            if node is None:
+                break
+        else:
+            if node[self.PREFIX] is not None:
+                match = node
+
+        if match is None:
+            return None
+        return self._get_item(match)
+
+    def within(self, prefix):
+        """
+        Yields a (prefix, value) tuple for `prefix` itself, if it's in the
+        tree, and for every prefix more specific than it.
+        """
+        for node in self._get_within(prefix):
+            yield self._get_item(node)
+
+    def within_values(self, prefix):
+        """
+        within(), but only the values, which saves formatting every prefix
+        when there are thousands of them and nobody wants to read them.
+        """
+        for node in self._get_within(prefix):
+            yield node[self.VALUE]
+
+    def covering(self, prefix):
+        """
+        Returns a list of (prefix, value) tuples for every prefix in the tree
+        that contains `prefix`, including itself, least specific first.
+        """
+        return [self._get_item(node) for node in self._get_covering(prefix)]
+
+    def covering_values(self, prefix):
+        """
+        covering(), but only the values.
+        """
+        return [node[self.VALUE] for node in self._get_covering(prefix)]
+
+    @staticmethod
+    def _node():
+        return [None, None, None, None]
+
+    def _get_within(self, prefix):
+        node = self._find(prefix)
+        if node is None:
+            return
+
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node[self.PREFIX] is not None:
+                yield node
+            for branch in (self.ONE, self.ZERO):
+                if node[branch] is not None:
+                    stack.append(node[branch])
+
+    def _get_covering(self, prefix):
+        version, network, length = parse_prefix(prefix)
+        node = self._roots[version]
+        r = []
+        for bit in self._get_bits(version, network, length):
+            if node[self.PREFIX] is not None:
+                r.append(node)
+            node = node[bit]
+            if node is None:
+                return r
+        if node[self.PREFIX] is not None:
+            r.append(node)
+        return r
+
+    def _find(self, prefix):
+        """
+        The node for `prefix`, or None if there isn't one.
+        """
+        version, network, length = parse_prefix(prefix)
+        node = self._roots[version]
+        for bit in self._get_bits(version, network, length):
+            node = node[bit]
+            if node is None:
+                return None
+        return node
+
+    @classmethod
+    def _get_item(cls, node):
+        """
+        A (prefix, value) tuple for `node`, formatting its prefix the first
+        time it's asked for.
+        """
+        if isinstance(node[cls.PREFIX], tuple):
+            version, network, length = node[cls.PREFIX]
+            node[cls.PREFIX] = str(
+                IPy.IP(network, ipversion=version).make_net(length))
+        return node[cls.PREFIX], node[cls.VALUE]
+
+    @classmethod
+    def _get_bits(cls, version, network, length):
+        """
+        The first `length` bits of `network`, most significant first.
+        """
+        width = cls.BITS[version]
+        return [(network >> (width - 1 - i)) & 1 for i in range(length)]
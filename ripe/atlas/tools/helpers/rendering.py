@@ -1,8 +1,183 @@
-from __future__ import print_function
+import functools
+import re
+import sys
+
+from collections import deque
 
 from ripe.atlas.sagan import Result, ResultParseError
 
 from ..probes import Probe
+from ..renderers.base import Renderer as BaseRenderer
+from .fastjson import loads
+from .output import Output, write_to
+from .streaming import MappedLines
+
+
+class ResultFilter(object):
+    """
+    Picks out the results from one of `probes` and/or created between the
+    `start` and `stop` timestamps.
+
+    Parsing a result is the expensive part of reading one, so is_wanted()
+    first has a quick look at the raw line for its probe id and timestamp,
+    and only the lines that might be wanted are parsed at all.  That look is
+    only ever allowed to let too much through (a nested "timestamp" counts
+    too, for example), as is_wanted_result() makes the final decision on the
+    parsed result.
+    """
+
+    PROBE_ID = re.compile(r'"prb_id"\s*:\s*(\d+)')
+    TIMESTAMP = re.compile(r'"timestamp"\s*:\s*(\d+)')
+
+    def __init__(self, probes=(), start=None, stop=None):
+        self.probes = frozenset(probes or ())
+        self.start = start
+        self.stop = stop
+
+    def __bool__(self):
+        return bool(self.probes) or self.start is not None or \
+            self.stop is not None
+
+    __nonzero__ = __bool__  # Python 2
+
+    def is_wanted(self, line):
+        """
+        False if we can tell that the raw result (a JSON string or a
+        dictionary) isn't wanted without parsing it.
+        """
+
+        if isinstance(line, dict):
+            probe_ids = [line.get("prb_id")]
+            timestamps = [line.get("timestamp")]
+        else:
+            probe_ids = self.PROBE_ID.findall(line)
+            timestamps = self.TIMESTAMP.findall(line)
+
+        if self.probes and probe_ids:
+            if not any(self._is_wanted_probe(pk) for pk in probe_ids):
+                return False
+
+        if (self.start is not None or self.stop is not None) and timestamps:
+            if not any(self._is_wanted_time(t) for t in timestamps):
+                return False
+
+        return True
+
+    def is_wanted_data(self, data):
+        """
+        The final say on a decoded result we aren't going to parse.
+        """
+        if self.probes and data.get("prb_id") not in self.probes:
+            return False
+        return self._is_wanted_time(data.get("timestamp"))
+
+    def is_wanted_result(self, sagan):
+        if self.probes and sagan.probe_id not in self.probes:
+            return False
+        return self._is_wanted_time(sagan.created_timestamp)
+
+    def _is_wanted_probe(self, pk):
+        try:
+            return int(pk) in self.probes
+        except (TypeError, ValueError):
+            return True  # Let the parser sort it out
+
+    def _is_wanted_time(self, timestamp):
+        try:
+            timestamp = int(timestamp)
+        except (TypeError, ValueError):
+            return True
+        if self.start is not None and timestamp < self.start:
+            return False
+        if self.stop is not None and timestamp > self.stop:
+            return False
+        return True
+
+
+def parse_results(lines, probes=(), start=None, stop=None):
+    """
+    Parses a list of results (JSON strings or dictionaries) and returns the
+    ones we could make sense of, that came from one of `probes` if any were
+    given, and that were created between the `start` and `stop` timestamps.
+    This is what the worker processes of a SaganSet run, so it has to live
+    out here where pickle can find it.
+    """
+
+    return list(iter_results(lines, ResultFilter(probes, start, stop)))
+
+
+def iter_results(lines, wanted):
+    """
+    Yields the results parse_results() would return, as they're parsed,
+    using a ResultFilter to decide which ones we want.
+    """
+    for line in lines:
+        if wanted and not wanted.is_wanted(line):
+            continue
+        try:
+            sagan = Result.get(
+                line,
+                on_error=Result.ACTION_IGNORE,
+                on_warning=Result.ACTION_IGNORE
+            )
+        except ResultParseError:
+            continue  # Probably garbage in the file
+        if not wanted or wanted.is_wanted_result(sagan):
+            yield sagan
+
+
+class RawResult(object):
+    """
+    A result we haven't parsed, for renderers that don't need us to: `raw` is
+    the line it came from (or None if it wasn't a line, but a dictionary), and
+    `raw_data` is what's in it, only decoded if someone asks.
+    """
+
+    def __init__(self, line, data=None):
+        self.raw = None
+        self._data = data
+        if isinstance(line, dict):
+            self._data = line
+        else:
+            self.raw = line
+
+    @property
+    def raw_data(self):
+        if self._data is None:
+            self._data = loads(self.raw)
+        return self._data
+
+
+def iter_raw_results(lines, wanted):
+    """
+    Like iter_results(), but yields RawResults.  Without a filter, nothing is
+    decoded at all, and with one, lines are decoded only as far as a
+    dictionary to check their probe id and timestamp.
+    """
+    for line in lines:
+        if not wanted:
+            yield RawResult(line)
+            continue
+        if not wanted.is_wanted(line):
+            continue
+        data = line
+        if not isinstance(line, dict):
+            try:
+                data = loads(line)
+            except ValueError:
+                continue  # Probably garbage in the file
+        if isinstance(data, dict) and wanted.is_wanted_data(data):
+            yield RawResult(line, data)
+
+
+def parse_range(path, begin, end, **kwargs):
+    """
+    Like parse_results(), but for a range of lines in a file, as given by
+    MappedLines.get_ranges(), so that a worker process can read the lines
+    itself rather than have them sent to it.
+    """
+    lines = MappedLines(path).read_range(begin, end)
+    return parse_results([line for line in lines if line.strip()], **kwargs)
 
 
 class SaganSet(object):
@@ -10,15 +185,86 @@ class SaganSet(object):
     We need something that doesn't take up a lot of memory while it's being
     constructed, but that will also spread out into a handy string when we need
     it to.
+
+    With `jobs` > 1, the parsing is spread over that many processes, a chunk
+    of lines at a time, with the results still coming out in the order they
+    went in.  If the iterable is a MappedLines, the workers are only told
+    where their chunk is in the file, and read it themselves.
+
+    Probes are looked up a batch at a time on a background thread, so while
+    one batch is being rendered, the probes for the next one are already on
+    their way.  The batch size adapts: if the lookups are done by the time
+    we need them, the batches shrink so the first results come out sooner,
+    and if we keep waiting on them, they grow so there are fewer, larger
+    trips to the cache or the API.  It only changes after STREAK lookups in
+    a row have gone the same way, so one slow lookup (or a busy moment for
+    the thread doing them) doesn't send it back and forth.  If nobody's going
+    to look at the probes (`attach_probes=False`), we don't look them up at
+    all.
+
+    With `parse=False`, nothing is parsed either: what comes out are
+    RawResults, for renderers that only pass the input on.
     """
 
-    def __init__(self, iterable=None, probes=()):
-        self._probes = probes
+    # The number of lines sent to a worker process at once
+    CHUNK_SIZE = 1000
+
+    # The bounds of the number of results whose probes are looked up at once
+    MIN_BATCH_SIZE = 25
+    MAX_BATCH_SIZE = 1000
+
+    # The number of lookups in a row that have to be early (or late) before
+    # we change the batch size
+    STREAK = 3
+
+    def __init__(self, iterable=None, probes=(), jobs=1, start=None,
+                 stop=None, attach_probes=True, parse=True):
+        self._probes = frozenset(probes or ())
+        self._start = start
+        self._stop = stop
         self._iterable = iterable
+        self._jobs = jobs or 1
+        self._attach = attach_probes and parse
+        self._parse = parse
+        self.batch_size = self.MIN_BATCH_SIZE * 4
+        self._streak = 0  # Positive for early lookups, negative for late ones
 
     def __iter__(self):
 
-        sagans = []
+        if not self._attach:
+            for sagan in self._get_sagans():
+                yield sagan
+            return
+
+        # Imported here, as most of the time we never need it
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(1)
+        try:
+            pending = None
+            for batch in self._get_batches():
+                lookup = pool.apply_async(self._get_probes, (batch,))
+                if pending is not None:
+                    for sagan in self._attach_probes(*pending):
+                        yield sagan
+                pending = (batch, lookup)
+            if pending is not None:
+                for sagan in self._attach_probes(*pending):
+                    yield sagan
+        finally:
+            pool.terminate()
+
+    def _get_batches(self):
+        batch = []
+        for sagan in self._get_sagans():
+            batch.append(sagan)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _get_lines(self):
 
         for line in self._iterable:
 
@@ -30,23 +276,60 @@ class SaganSet(object):
             if not line:
                 break
 
-            try:
-                sagan = Result.get(
-                    line,
-                    on_error=Result.ACTION_IGNORE,
-                    on_warning=Result.ACTION_IGNORE
-                )
-                if not self._probes or sagan.probe_id in self._probes:
-                    sagans.append(sagan)
-                if len(sagans) > 100:
-                    for sagan in self._attach_probes(sagans):
-                        yield sagan
-                    sagans = []
-            except ResultParseError:
-                pass  # Probably garbage in the file
+            yield line
 
-        for sagan in self._attach_probes(sagans):
-            yield sagan
+    def _get_chunks(self):
+        chunk = []
+        for line in self._get_lines():
+            chunk.append(line)
+            if len(chunk) >= self.CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _get_sagans(self):
+
+        if not self._parse:
+            wanted = ResultFilter(self._probes, self._start, self._stop)
+            for result in iter_raw_results(self._get_lines(), wanted):
+                yield result
+            return
+
+        if self._jobs == 1:
+            wanted = ResultFilter(self._probes, self._start, self._stop)
+            for sagan in iter_results(self._get_lines(), wanted):
+                yield sagan
+            return
+
+        # Imported here, as most of the time we never need it
+        from multiprocessing import Pool
+
+        kwargs = {
+            "probes": self._probes, "start": self._start, "stop": self._stop}
+        if isinstance(self._iterable, MappedLines):
+            parse = functools.partial(
+                parse_range, self._iterable.path, **kwargs)
+            chunks = self._iterable.get_ranges()
+        else:
+            parse = functools.partial(parse_results, **kwargs)
+            chunks = ((chunk,) for chunk in self._get_chunks())
+
+        # Only a couple of chunks per worker are read ahead, so the input is
+        # never read much faster than we can write the output.
+        pool = Pool(self._jobs)
+        try:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(parse, chunk))
+                if len(pending) >= self._jobs * 2:
+                    for sagan in pending.popleft().get():
+                        yield sagan
+            while pending:
+                for sagan in pending.popleft().get():
+                    yield sagan
+        finally:
+            pool.terminate()
 
     def __next__(self):
         return iter(self).next()
@@ -54,38 +337,122 @@ class SaganSet(object):
     def next(self):
         return self.__next__()
 
-    @staticmethod
-    def _attach_probes(sagans):
-        probes = dict(
-            [(p.id, p) for p in Probe.get_many(s.probe_id for s in sagans)]
-        )
+    def _attach_probes(self, sagans, lookup):
+
+        self._adapt_batch_size(lookup.ready())
+
+        probes = lookup.get()
         for sagan in sagans:
             sagan.probe = probes[sagan.probe_id]
             yield sagan
 
+    def _adapt_batch_size(self, ready):
+
+        if ready != (self._streak > 0):
+            self._streak = 0
+        self._streak += 1 if ready else -1
+
+        if self._streak >= self.STREAK:
+            self.batch_size = max(
+                self.MIN_BATCH_SIZE, self.batch_size - self.MIN_BATCH_SIZE)
+            self._streak = 0
+        elif self._streak <= -self.STREAK:
+            self.batch_size = min(self.MAX_BATCH_SIZE, self.batch_size * 2)
+            self._streak = 0
+
+    @staticmethod
+    def _get_probes(sagans):
+        return dict(
+            [(p.id, p) for p in Probe.get_many(s.probe_id for s in sagans)]
+        )
+
 
 class Rendering(object):
+    """
+    Renders a payload (a SaganSet, or an aggregation of one) in a single
+    pass: every result goes through the renderer's on_result() as it's read,
+    and the renderer's additional() is left to summarise what it collected
+    along the way, so the input is never read or parsed twice.
+
+    Everything goes out through an Output (standard out's, unless we're given
+    another), so it's written in large blocks rather than a line at a time.
+    """
+
+    # Results are handed to the renderer's prefetch() in batches of this size
+    BATCH_SIZE = 100
+
+    # The most results we keep for the renderer's additional()
+    KEEP_LIMIT = 10000
 
-    def __init__(self, renderer=None, header="", footer="", payload=()):
+    def __init__(self, renderer=None, header="", footer="", payload=(),
+                 output=None):
 
         self.renderer = renderer
         self.header = header + "\n" if header else ""
         self.footer = footer + "\n" if footer else ""
         self.payload = payload
+        self.output = output
+        self.kept = []
 
     def render(self):
-        print(self.header, end="")
+
+        # Anything the renderer print()s, and whether it colours what it
+        # writes, has to do with our output rather than standard out.
+        output = self.output or Output()
+        write_to(output, self._render, output)
+        output.flush()
+
+    def _render(self, output):
+        output.write(self.header)
         self.renderer.header()
-        self._smart_render(self.payload)
-        self.renderer.additional(self.payload)
+        self._smart_render(self.payload, output)
+        self.renderer.additional(self.kept)
         self.renderer.footer()
-        print(self.footer, end="")
+        output.write(self.footer)
 
     def _get_rendered_results(self, data):
+        keep = self._keeps_results()
+        for batch in self._get_batches(data):
+            self.renderer.prefetch(batch)
+            if keep:
+                keep = self._keep(batch)
+            for sagan in batch:
+                yield self.renderer.on_result(sagan)
+
+    def _keeps_results(self):
+        if not getattr(self.renderer, "KEEP_RESULTS", True):
+            return False
+        additional = getattr(type(self.renderer), "additional", None)
+        return additional is not BaseRenderer.additional
+
+    def _keep(self, batch):
+        """
+        Keeps a batch of results for additional(), and returns whether we
+        should keep any more.  Once we've reached KEEP_LIMIT we stop, rather
+        than hold on to every result in a large file, and say so.
+        """
+
+        room = self.KEEP_LIMIT - len(self.kept)
+        self.kept.extend(batch[:room])
+        if len(batch) <= room:
+            return True
+
+        sys.stderr.write(
+            "Only the first {} results will be summarised.\n".format(
+                self.KEEP_LIMIT))
+        return False
+
+    def _get_batches(self, data):
+        batch = []
         for sagan in data:
-            yield self.renderer.on_result(sagan)
+            batch.append(sagan)
+            if len(batch) >= self.BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
-    def _smart_render(self, data, indent=""):
+    def _smart_render(self, data, output, indent=""):
         """
         Traverses the aggregation data and prints everything nicely indented.
         """
@@ -96,10 +463,10 @@ class Rendering(object):
         if isinstance(data, (list, SaganSet)):
 
             for line in self._get_rendered_results(data):
-                print(indent + line, end="")
+                output.write(indent + line)
 
         elif isinstance(data, dict):
 
             for k, v in data.items():
-                print("{}{}".format(indent, k))
-                self._smart_render(v, indent=indent + " ")
+                output.write("{}{}\n".format(indent, k))
+                self._smart_render(v, output, indent=indent + " ")
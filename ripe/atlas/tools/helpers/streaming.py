@@ -0,0 +1,360 @@
+import bz2
+import contextlib
+import io
+import json
+import mmap
+import os
+import re
+import zlib
+
+import six
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..exceptions import RipeAtlasToolsException
+
+# The number of characters we ask for each time we read from a file
+READ_SIZE = 1024 * 64
+
+
+def _get_zstd_decompressor():
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+# The magic bytes at the start of a compressed file, what it's compressed
+# with, the module we need to decompress it (and its name, for when it's
+# missing), and how to make a decompressor.
+COMPRESSIONS = (
+    (b"\x1f\x8b", "gzip", zlib, "zlib",
+     lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)),
+    (b"BZh", "bzip2", bz2, "bz2",
+     lambda: bz2.BZ2Decompressor()),
+    (b"\xfd7zXZ\x00", "xz", lzma, "lzma",
+     lambda: lzma.LZMADecompressor()),
+    (b"\x28\xb5\x2f\xfd", "zstd", zstandard, "zstandard",
+     _get_zstd_decompressor),
+)
+
+
+def get_compression(f):
+    """
+    The entry in COMPRESSIONS for whatever the buffered binary file `f` is
+    compressed with, or None if it isn't.
+    """
+    magic = f.peek(6)[:6]
+    for compression in COMPRESSIONS:
+        if magic.startswith(compression[0]):
+            return compression
+    return None
+
+
+def open_input(path, buffer_size=READ_SIZE):
+    """
+    Opens the file at `path` for reading text, `buffer_size` bytes at a
+    time.  If it's been compressed with gzip, bzip2, xz or zstd (which we
+    tell by its first few bytes rather than its name), it's decompressed as
+    it's read.
+    """
+
+    f = io.open(path, "rb", buffering=buffer_size)
+
+    compression = get_compression(f)
+    if compression is None:
+        f.close()
+        return open(path, "r", buffer_size)
+
+    _, name, module, module_name, factory = compression
+
+    if module is None:
+        f.close()
+        raise RipeAtlasToolsException(
+            "{} is compressed with {}, which we can't decompress without the "
+            "{} module.".format(path, name, module_name))
+
+    r = io.BufferedReader(Decompressor(f, factory), buffer_size)
+
+    # Python 2 reads ordinary files as bytes too
+    if six.PY2:
+        return r
+    return io.TextIOWrapper(r, encoding="utf-8")
+
+
+class Decompressor(io.RawIOBase):
+    """
+    A read-only file that decompresses the contents of another one as it
+    goes.  `factory` makes a new decompressor (like zlib's decompressobj()),
+    and we make another one whenever a stream ends and there's still more to
+    read, so files made by concatenating several compressed files work too.
+    Like gzip.GzipFile, we skip any zeros between or after the streams, which
+    some tools (like pigz, or anything writing to tape) pad them out with.
+    """
+
+    def __init__(self, f, factory, read_size=READ_SIZE):
+        io.RawIOBase.__init__(self)
+        self._file = f
+        self._factory = factory
+        self._decompressor = factory()
+        self._read_size = read_size
+        self._pending = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+
+        while self._offset >= len(self._pending):
+            data = self._file.read(self._read_size)
+            if not data:
+                return 0
+            self._pending, self._offset = self._decompress(data), 0
+
+        size = min(len(b), len(self._pending) - self._offset)
+        b[:size] = self._pending[self._offset:self._offset + size]
+        self._offset += size
+
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        io.RawIOBase.close(self)
+
+    def _decompress(self, data):
+
+        r = []
+        while data:
+            if self._decompressor is None:
+                # Between streams, where there may be padding.  No format
+                # we know starts with a zero, so it can't be anything else.
+                data = data.lstrip(b"\x00")
+                if not data:
+                    break
+                self._decompressor = self._factory()
+            try:
+                r.append(self._decompressor.decompress(data))
+            except EOFError:
+                # The last stream ended exactly where the last read did
+                self._decompressor = None
+                continue
+            data = getattr(self._decompressor, "unused_data", b"")
+            if data:
+                self._decompressor = None
+
+        return b"".join(r)
+
+
+def read_chunks(f, size=READ_SIZE):
+    """
+    Yields the contents of a file-like object `size` characters at a time.
+    """
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class JSONArrayStream(object):
+    """
+    Hands out the elements of a JSON array one at a time, reading the text of
+    the array from an iterable of chunks as it goes, so that the whole array
+    never has to be in memory at once:
+
+      for result in JSONArrayStream(read_chunks(open("results.json"))):
+          print(result["prb_id"])
+
+    Only the text of the element being decoded is kept, so memory use has
+    more to do with the size of the largest element than that of the array.
+    """
+
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._decoder = json.JSONDecoder()
+
+    def __iter__(self):
+
+        chunks = iter(self._chunks)
+        buffer, position = "", 0
+        opened, separated, empty = False, True, True
+
+        while True:
+
+            while position < len(buffer) and buffer[position] in self.WHITESPACE:
+                position += 1
+
+            if position == len(buffer):
+                buffer, position, more = self._read(chunks, buffer, position)
+                if not more:
+                    raise ValueError("The JSON array is incomplete")
+                continue
+
+            character = buffer[position]
+
+            if not opened:
+                if character != "[":
+                    raise ValueError("This isn't a JSON array")
+                opened = True
+                position += 1
+                continue
+
+            if character == "]" and (not separated or empty):
+                return  # Anything after the array is none of our business
+
+            if not separated:
+                if character != ",":
+                    raise ValueError(
+                        "Expected a comma at character {}".format(position))
+                separated = True
+                position += 1
+                continue
+
+            try:
+                element, end = self._decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = None
+
+            # If we've run out of text, the element may just be incomplete (or
+            # a number with more digits to come), so we read more and try
+            # again.  We read at least as much as we've got every time, so a
+            # large element isn't decoded over and over.
+            if end is None or end == len(buffer):
+                start = position
+                buffer, position, more = self._read(
+                    chunks, buffer, position, len(buffer) - position)
+                if more:
+                    continue
+                if end is None:
+                    raise ValueError(
+                        "The JSON array has an invalid element: {}".format(
+                            buffer[:80]))
+                end -= start
+
+            yield element
+            position = end
+            separated, empty = False, False
+
+    @staticmethod
+    def _read(chunks, buffer, position, minimum=1):
+        """
+        Drops what we've already decoded from the buffer and adds at least
+        `minimum` more characters to it (unless we run out).
+        """
+
+        buffer = [buffer[position:]]
+        read = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            read += len(chunk)
+            if read >= minimum:
+                break
+
+        return "".join(buffer), 0, read > 0
+
+
+class MappedLines(object):
+    """
+    The lines of a regular, uncompressed file, read through mmap, so that we
+    can split it into ranges of whole lines without reading it through
+    Python's file objects:
+
+      lines = MappedLines("results.json")
+      for start, end in lines.get_ranges():
+          print(lines.read_range(start, end))
+
+    Those ranges are what a SaganSet hands to its worker processes, so the
+    only thing that has to cross over to them is a pair of offsets.  Like
+    everywhere else we read results, a blank line marks the end.
+    """
+
+    RANGE_SIZE = 1024 * 1024
+
+    # A blank line after some other line.  Looking for a newline first is
+    # much quicker than also allowing for one at the very start of the file,
+    # so that's checked for separately.
+    BLANK_LINE = re.compile(br"\n(?P<blank>[ \t\r]*\n)")
+    BLANK_FIRST_LINE = re.compile(br"[ \t\r]*\n")
+
+    def __init__(self, path, range_size=None):
+        self.path = path
+        self.range_size = range_size or self.RANGE_SIZE
+
+    def __iter__(self):
+        with self._open() as f:
+            for start, end in self._get_ranges(f):
+                for line in self._split(f[start:end]):
+                    yield line
+
+    @classmethod
+    def can_map(cls, path):
+        """
+        Whether the file at `path` is one we can (and should) map: a
+        regular file that isn't empty or compressed.
+        """
+        if not os.path.isfile(path) or not os.path.getsize(path):
+            return False
+        with io.open(path, "rb") as f:
+            return get_compression(f) is None
+
+    def get_ranges(self):
+        """
+        Yields (start, end) offsets that split the file into ranges of about
+        RANGE_SIZE bytes, each ending with a newline (or the end of the
+        file).
+        """
+        with self._open() as f:
+            for r in self._get_ranges(f):
+                yield r
+
+    def read_range(self, start, end):
+        """
+        The lines between two of the offsets from get_ranges().
+        """
+        with self._open() as f:
+            return self._split(f[start:end])
+
+    def _open(self):
+        with io.open(self.path, "rb") as f:
+            return contextlib.closing(
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _get_ranges(self, f):
+
+        start, size = 0, len(f)
+
+        if self.BLANK_FIRST_LINE.match(f):
+            return
+
+        while start < size:
+
+            end = size
+            if start + self.range_size < size:
+                newline = f.find(b"\n", start + self.range_size - 1)
+                if newline != -1:
+                    end = newline + 1
+
+            blank = self.BLANK_LINE.search(f, max(0, start - 1), end)
+            if blank:
+                if blank.start("blank") > start:
+                    yield start, blank.start("blank")
+                return
+
+            yield start, end
+            start = end
+
+    @staticmethod
+    def _split(data):
+        lines = data.splitlines()
+        if six.PY2:
+            return lines
+        return [line.decode("utf-8") for line in lines]
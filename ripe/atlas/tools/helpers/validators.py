@@ -4,8 +4,6 @@ import argparse
 import os
 import re
 
-from dateutil import parser
-
 
 class ArgumentType(object):
 
@@ -26,8 +24,23 @@ class ArgumentType(object):
                 "Countries must be defined with a two-letter ISO code")
         return string.upper()
 
+    @staticmethod
+    def coordinates(string):
+        message = 'Coordinates must be specified as <lat>,<lng>.  For ' \
+                  'example: 52.37,4.89'
+        try:
+            lat, lng = [float(_) for _ in string.split(",")]
+        except ValueError:
+            raise argparse.ArgumentTypeError(message)
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            raise argparse.ArgumentTypeError(message)
+        return lat, lng
+
     @staticmethod
     def datetime(string):
+
+        from dateutil import parser
+
         try:
             return parser.parse(string)
         except:
@@ -0,0 +1,281 @@
+import bisect
+import bz2
+import gzip
+import mmap
+import os
+import struct
+import sys
+
+import IPy
+
+from .settings import Configuration
+
+
+class PrefixDatabase(object):
+    """
+    A compact, read-only, on-disk table mapping prefixes to their origin ASN,
+    built from a pfx2as file or a RIB dump with `ripe-atlas ipdb import`.
+
+    Nested prefixes are flattened into non-overlapping address ranges at import
+    time, each of which remembers the most specific prefix it belongs to.  The
+    ranges are stored sorted as fixed-width big-endian records, so a longest-
+    prefix match is a binary search over a memory-mapped file and never needs
+    to read the whole table into memory:
+
+      header:  MAGIC, IPv4 record count, IPv6 record count
+      records: range start, range end, prefix length, ASN
+    """
+
+    MAGIC = b"RATIPDB1"
+    HEADER = struct.Struct(">8sII")
+    WIDTHS = {4: 4, 6: 16}
+    RECORDS = {
+        4: struct.Struct(">4s4sBI"),
+        6: struct.Struct(">16s16sBI"),
+    }
+
+    PATH = os.path.join(Configuration.USER_CONFIG_DIR, "ipdb")
+
+    def __init__(self, path=None):
+
+        self.path = path or self.PATH
+        self._sections = {}
+
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, v4_count, v6_count = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(
+                "{} is not a prefix database".format(self.path))
+
+        offset = self.HEADER.size
+        for version, count in ((4, v4_count), (6, v6_count)):
+            self._sections[version] = _RangeStarts(
+                self._map, offset, count, self.RECORDS[version],
+                self.WIDTHS[version]
+            )
+            offset += count * self.RECORDS[version].size
+
+    def __len__(self):
+        return sum(len(section) for section in self._sections.values())
+
+    def lookup(self, address):
+        """
+        Returns a (prefix, asn) tuple for the most specific prefix containing
+        `address`, or None if it isn't covered by the table.  `address` may be
+        a string or an `IPy.IP` instance.
+        """
+
+        if not isinstance(address, IPy.IP):
+            address = IPy.IP(address)
+
+        version = address.version()
+        section = self._sections[version]
+        key = self._pack(address.int(), version)
+
+        index = bisect.bisect_right(section, key) - 1
+        if index < 0:
+            return None
+
+        start, end, length, asn = section.get_record(index)
+        if key > end:
+            return None
+
+        return self._get_prefix(start, length, version), asn
+
+    def close(self):
+        self._map.close()
+
+    @classmethod
+    def exists(cls, path=None):
+        return os.path.exists(path or cls.PATH)
+
+    @classmethod
+    def build(cls, prefixes, path=None):
+        """
+        Writes a new database to `path` from an iterable of (prefix, asn)
+        pairs, and returns the number of distinct prefixes it contains.  If the
+        same prefix appears more than once, the last one wins.  The file is
+        written alongside the target and moved into place, so readers never
+        see a half-written table.  If there aren't any prefixes, nothing is
+        written at all.
+        """
+
+        path = path or cls.PATH
+
+        by_version = {4: {}, 6: {}}
+        for prefix, asn in prefixes:
+            prefix = IPy.IP(prefix, make_net=True)
+            by_version[prefix.version()][
+                (prefix.int(), prefix.prefixlen())] = asn
+
+        count = len(by_version[4]) + len(by_version[6])
+        if not count:
+            return 0
+
+        sections = {}
+        for version, table in by_version.items():
+            sections[version] = list(cls._flatten(table, version))
+
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            pass  # Better to ask forgiveness than permission
+
+        temporary = "{}.tmp".format(path)
+        with open(temporary, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(sections[4]), len(sections[6])))
+            for version in (4, 6):
+                record = cls.RECORDS[version]
+                for start, end, length, asn in sections[version]:
+                    f.write(record.pack(
+                        cls._pack(start, version),
+                        cls._pack(end, version),
+                        length,
+                        asn
+                    ))
+        os.rename(temporary, path)
+
+        return count
+
+    @classmethod
+    def parse(cls, lines):
+        """
+        Yields (prefix, asn) pairs from the lines of a prefix-to-ASN table.  We
+        understand the common formats:
+
+          CAIDA pfx2as:     193.0.0.0<tab>21<tab>3333
+          Prefix and ASN:   193.0.0.0/21 3333
+          bgpdump -m:       TABLE_DUMP2|1445025600|B|...|193.0.0.0/21|1 2 3333|IGP|...
+
+        Where a prefix has more than one origin (AS sets or MOAS entries like
+        "3333_3334"), we use the first one.  Anything we don't understand is
+        skipped.
+        """
+
+        for line in lines:
+
+            if isinstance(line, bytes) and not isinstance(line, str):
+                line = line.decode("utf-8", "ignore")
+
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            if "|" in line:
+                fields = line.split("|")
+                if len(fields) < 7:
+                    continue
+                prefix, asn = fields[5], fields[6].split(" ")[-1]
+            else:
+                fields = line.split()
+                if len(fields) == 3:
+                    prefix, asn = "{}/{}".format(fields[0], fields[1]), fields[2]
+                elif len(fields) == 2:
+                    prefix, asn = fields
+                else:
+                    continue
+
+            asn = asn.strip("{}").replace("_", ",").split(",")[0]
+            if asn.upper().startswith("AS"):
+                asn = asn[2:]
+
+            try:
+                yield str(IPy.IP(prefix, make_net=True)), int(asn)
+            except ValueError:
+                continue
+
+    @staticmethod
+    def open_source(path):
+        """
+        Prefix tables are usually distributed compressed, so we transparently
+        handle .gz and .bz2 files.  "-" means standard in.
+        """
+        if path == "-":
+            return getattr(sys.stdin, "buffer", sys.stdin)
+        if path.endswith(".gz"):
+            return gzip.open(path, "rb")
+        if path.endswith(".bz2"):
+            return bz2.BZ2File(path, "rb")
+        return open(path, "rb")
+
+    @classmethod
+    def _flatten(cls, table, version):
+        """
+        Turns possibly-nested prefixes into sorted, non-overlapping
+        (start, end, length, asn) ranges, where each range carries the most
+        specific prefix covering it.  Since two prefixes are always either
+        nested or disjoint, a single sweep with a stack of the currently-open
+        prefixes does the job.
+        """
+
+        bits = 128 if version == 6 else 32
+
+        # Enclosing prefixes must come before the ones they contain
+        prefixes = sorted((
+            (start, start + (1 << (bits - length)) - 1, length, asn)
+            for (start, length), asn in table.items()
+        ), key=lambda prefix: (prefix[0], prefix[2]))
+
+        stack = []
+        cursor = 0
+        for prefix in prefixes:
+            while stack and stack[-1][1] < prefix[0]:
+                enclosing = stack.pop()
+                if cursor <= enclosing[1]:
+                    yield cursor, enclosing[1], enclosing[2], enclosing[3]
+                cursor = enclosing[1] + 1
+            if stack and cursor < prefix[0]:
+                yield cursor, prefix[0] - 1, stack[-1][2], stack[-1][3]
+            cursor = prefix[0]
+            stack.append(prefix)
+
+        while stack:
+            enclosing = stack.pop()
+            if cursor <= enclosing[1]:
+                yield cursor, enclosing[1], enclosing[2], enclosing[3]
+            cursor = enclosing[1] + 1
+
+    @staticmethod
+    def _pack(integer, version):
+        if version == 4:
+            return struct.pack(">I", integer)
+        return struct.pack(">QQ", integer >> 64, integer & 0xFFFFFFFFFFFFFFFF)
+
+    @classmethod
+    def _get_prefix(cls, start, length, version):
+        if version == 4:
+            integer = struct.unpack(">I", start)[0]
+        else:
+            high, low = struct.unpack(">QQ", start)
+            integer = (high << 64) | low
+        bits = cls.WIDTHS[version] * 8
+        mask = ((1 << length) - 1) << (bits - length)
+        return str(IPy.IP("{}/{}".format(
+            IPy.IP(integer & mask, ipversion=version).strNormal(), length)))
+
+
+class _RangeStarts(object):
+    """
+    A read-only sequence view over the start addresses of one section of the
+    memory-mapped file, so we can hand it straight to `bisect`.
+    """
+
+    def __init__(self, buffer, offset, count, record, width):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._record = record
+        self._width = width
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        start = self._offset + index * self._record.size
+        return self._buffer[start:start + self._width]
+
+    def get_record(self, index):
+        return self._record.unpack_from(
+            self._buffer, self._offset + index * self._record.size)
@@ -1,7 +1,15 @@
+import struct
+
+from multiprocessing.pool import ThreadPool
+
 import requests
 import IPy
 
+from requests.adapters import HTTPAdapter
+
 from .cache import cache
+from .helpers.prefixes import PrefixTree
+from .ipdb import PrefixDatabase
 
 
 class IP(object):
@@ -9,7 +17,20 @@ class IP(object):
     RIPESTAT_URL = "https://stat.ripe.net/data/prefix-overview/data.json?resource={ip}"
     CACHE_EXPIRATION_TIME = 60 * 60 * 24 * 7
 
-    def __init__(self, address):
+    # An index of the IPDetailsPrefix entries in the cache, built on first use
+    # and kept up to date by update_cache()
+    _prefixes = None
+
+    # The offline prefix-to-ASN table from `ripe-atlas ipdb import`, opened on
+    # first use.  False means we've looked and there isn't one.
+    _database = None
+
+    # The number of RIPEstat queries resolve_many() runs at once, over a single
+    # pooled session.
+    CONCURRENCY = 8
+    _session = None
+
+    def __init__(self, address, resolve=True):
         self.cached_prefix_found = False
         self.ip_object = IPy.IP(address)
 
@@ -23,25 +44,125 @@ class IP(object):
             'LINKLOCAL', 'PRIVATE'
         ]
 
-        details = self._get_details()
+        if resolve:
+            self._set_details(self._get_details())
+
+    @classmethod
+    def resolve_many(cls, addresses):
+        """
+        Resolve a whole batch of addresses at once and return a dictionary of
+        address -> IP.  Duplicates and addresses that aren't worth asking about
+        are only dealt with once, everything we can answer from the cache or
+        the offline table is answered from there, and whatever is left is
+        fetched from RIPEstat concurrently rather than one address at a time.
+        The cache is read in one go up front, and everything new is written
+        back to it in one go at the end.
+        """
+
+        r = {}
+        missing = {}
+        updates = {}
+
+        for address in set(addresses):
+            try:
+                r[address] = cls(address, resolve=False)
+            except ValueError:
+                continue  # Not an IP address
+
+        querable = [ip for ip in r.values() if ip.is_querable()]
+        cached = cache.get_many([ip.get_cache_key() for ip in querable])
+
+        for ip in querable:
+            details = cached.get(ip.get_cache_key())
+            if not details:
+                details = ip.get_from_cached_prefix()
+                if details:
+                    updates.update(ip.get_cache_entries(details))
+                else:
+                    details = ip.get_from_database()
+            if details:
+                ip._set_details(details)
+            else:
+                missing.setdefault(ip.address, []).append(ip)
+
+        cls._query_many(missing, updates)
+
+        if updates:
+            cache.set_many(updates, cls.CACHE_EXPIRATION_TIME)
+
+        return r
+
+    @classmethod
+    def _query_many(cls, missing, updates):
+        """
+        Query RIPEstat concurrently for each of the addresses in `missing`
+        (address -> [IP, ...]), filling in the IPs as we go and collecting
+        what should be cached in `updates`.
+        """
+
+        if not missing:
+            return
+
+        session = cls.get_session()
+        queries = [ips[0] for ips in missing.values()]
+        pool = ThreadPool(min(cls.CONCURRENCY, len(queries)))
+        try:
+            results = pool.map(lambda ip: ip.query_stat(session), queries)
+        finally:
+            pool.close()
+            pool.join()
+
+        for ip, details in zip(queries, results):
+            if not details:
+                continue
+            updates.update(ip.get_cache_entries(details))
+            ip.index_prefix(details)
+            for duplicate in missing[ip.address]:
+                duplicate._set_details(details)
+
+    @classmethod
+    def get_session(cls):
+        """
+        A requests session with a connection pool big enough for all of
+        resolve_many()'s threads, so we're not setting up a new TLS connection
+        to RIPEstat for every address.
+        """
+        if cls._session is None:
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=cls.CONCURRENCY)
+            cls._session = requests.Session()
+            cls._session.mount("https://", adapter)
+        return cls._session
+
+    def _set_details(self, details):
         if details:
             self.asn = details["ASN"]
             self.holder = details["Holder"]
             self.prefix = details["Prefix"]
 
-    def _get_details(self):
+    def _get_details(self, query=True):
+        """
+        Look for the address in the cache, the cached prefixes and the offline
+        table, in that order.  If none of them know about it, ask RIPEstat,
+        unless `query` is False.
+        """
         details = None
 
         if not self.is_querable():
             return details
 
-        details = cache.get("IPDetails:{}".format(self.address))
+        details = cache.get(self.get_cache_key())
         if details:
             return details
 
         details = self.get_from_cached_prefix()
 
         if not details:
+            # The offline table is at least as quick as the cache, so there's
+            # no point in caching what we find there.
+            details = self.get_from_database()
+            if details or not query:
+                return details
             details = self.query_stat()
 
         if details:
@@ -53,31 +174,82 @@ class IP(object):
         """Determines if address is worth querable."""
         return (self.ip_object.iptype() not in self.not_querable_types)
 
+    @classmethod
+    def get_prefix_tree(cls):
+        """
+        Load the cached prefixes into a PrefixTree once per process, so that
+        finding the one containing an address doesn't mean walking the whole
+        cache.
+        """
+        if cls._prefixes is None:
+            cls._prefixes = PrefixTree()
+            for cache_entry in cache.keys("IPDetailsPrefix"):
+                try:
+                    cls._prefixes.insert(
+                        cache_entry.split(":", 1)[1], cache_entry)
+                except ValueError:
+                    pass  # Garbage in the cache
+        return cls._prefixes
+
     def get_from_cached_prefix(self):
         """Search cache for existing cached Prefix"""
-        details = None
+        prefixes = self.get_prefix_tree()
 
-        for cache_entry in cache.keys():
-            if not cache_entry.startswith("IPDetailsPrefix:"):
-                continue
+        while True:
 
-            prefix_details = cache.get(cache_entry)
-            prefix = IPy.IP(prefix_details["Prefix"])
+            match = prefixes.lookup(self.ip_object)
+            if not match:
+                return None
 
-            if self.ip_object in prefix:
-                details = prefix_details
+            prefix, cache_entry = match
+            details = cache.get(cache_entry)
+            if details:
                 self.cached_prefix_found = True
-                break
+                return details
 
-        return details
+            # Expired, so fall back to a less specific prefix if there is one
+            prefixes.remove(prefix)
+
+    @classmethod
+    def get_database(cls):
+        """
+        Returns the imported PrefixDatabase, or None if nobody has imported
+        one.
+        """
+        if cls._database is None:
+            cls._database = False
+            if PrefixDatabase.exists():
+                try:
+                    cls._database = PrefixDatabase()
+                except (EnvironmentError, ValueError, struct.error):
+                    pass  # Broken or half-written, so act like it's not there
+        return cls._database or None
 
-    def query_stat(self):
-        """Query RIPE Stat to get address details."""
+    def get_from_database(self):
+        """Search the offline prefix-to-ASN table."""
+        database = self.get_database()
+        if not database:
+            return None
+
+        match = database.lookup(self.ip_object)
+        if not match:
+            return None
+
+        # The table doesn't know who holds the ASN, so we say so the way
+        # RIPEstat does when it doesn't know either: with an empty string.
+        prefix, asn = match
+        return {"ASN": str(asn), "Holder": "", "Prefix": prefix}
+
+    def query_stat(self, session=None):
+        """
+        Query RIPE Stat to get address details, optionally over an existing
+        requests session.
+        """
         URL = self.RIPESTAT_URL.format(ip=self.address)
         details = {}
 
         try:
-            response = requests.get(URL)
+            response = (session or requests).get(URL)
             if not response.ok:
                 return details
             res = response.json()
@@ -100,14 +272,37 @@ class IP(object):
 
         return details
 
+    def get_cache_key(self):
+        return "IPDetails:{}".format(self.address)
+
+    @staticmethod
+    def get_prefix_cache_key(details):
+        return "IPDetailsPrefix:{}".format(details["Prefix"])
+
+    def get_cache_entries(self, details):
+        """
+        The cache entries we need for the address, plus one for its prefix
+        unless that's where the details came from in the first place.
+        """
+        r = {self.get_cache_key(): details}
+        if not self.cached_prefix_found:
+            r[self.get_prefix_cache_key(details)] = details
+        return r
+
+    def index_prefix(self, details):
+        """Make a freshly cached prefix findable by get_from_cached_prefix()"""
+        if not self.cached_prefix_found:
+            self.get_prefix_tree().insert(
+                details["Prefix"], self.get_prefix_cache_key(details))
+
     def update_cache(self, details):
         """Update cache for the address and prefix if needed."""
         if not self.cached_prefix_found:
-            key = "IPDetailsPrefix:{}".format(details["Prefix"])
+            key = self.get_prefix_cache_key(details)
             cache.set(key, details, self.CACHE_EXPIRATION_TIME)
+            self.index_prefix(details)
 
-        key = "IPDetails:{}".format(self.address)
-        cache.set(key, details, self.CACHE_EXPIRATION_TIME)
+        cache.set(self.get_cache_key(), details, self.CACHE_EXPIRATION_TIME)
 
     def __str__(self):
         return "IP {}, ASN {}, Holder {}".format(
@@ -1,4 +1,8 @@
+from collections import OrderedDict
+
 from ..cache import cache
+from .catalogue import ProbeCatalogue
+from .records import ProbeRecord
 
 from ripe.atlas.cousteau import ProbeRequest
 from ripe.atlas.cousteau import Probe as CProbe
@@ -14,30 +18,48 @@ class Probe(object):
     @classmethod
     def get(cls, pk):
         """
-        Given a single id, attempt to fetch a probe object from the cache.  If
+        Given a single id, attempt to fetch a probe record from the cache.  If
         that fails, do an API call to get it.  Don't use this for multiple
         probes unless you know they're all in the cache, or you'll be in for a
         long wait.
         """
-        r = cache.get("probe:{}".format(pk))
+
+        catalogue = ProbeCatalogue.get_fresh()
+        if catalogue and int(pk) in catalogue:
+            return catalogue.get(int(pk))
+
+        r = ProbeRecord.decode(cache.get("probe:{}".format(pk)))
         if not r:
-            probe = CProbe(id=pk)
-            cache.set("probe:{}".format(probe.id), probe, cls.EXPIRE_TIME)
-            return probe
+            r = ProbeRecord.from_probe(CProbe(id=pk))
+            cache.set("probe:{}".format(r.id), r.encode(), cls.EXPIRE_TIME)
+        return r
 
     @classmethod
     def get_many(cls, ids):
         """
-        Given a list of ids, attempt to get probe objects out of the local
-        cache.  Probes that cannot be found will be fetched from the API and
-        cached for future use.
+        Given a list of ids, attempt to get probe records out of the probe
+        catalogue if it's fresh, and then the local cache.  Probes that cannot
+        be found will be fetched from the API and cached for future use.
+        Either way, it's one trip to the cache to read and at most one to
+        write, no matter how many ids you ask for.
         """
 
         r = []
 
+        ids = list(OrderedDict.fromkeys(ids))  # Drop duplicates, keep order
+
+        catalogue = ProbeCatalogue.get_fresh()
+        if catalogue:
+            found = catalogue.get_many([int(pk) for pk in ids])
+            r = [found[int(pk)] for pk in ids if int(pk) in found]
+            ids = [pk for pk in ids if int(pk) not in found]
+            if not ids:
+                return r
+        cached = cache.get_many(["probe:{}".format(pk) for pk in ids])
+
         fetch_ids = []
         for pk in ids:
-            probe = cache.get("probe:{}".format(pk))
+            probe = ProbeRecord.decode(cached.get("probe:{}".format(pk)))
             if probe:
                 r.append(probe)
             else:
@@ -45,8 +67,21 @@ class Probe(object):
 
         if fetch_ids:
             kwargs = {"id__in": fetch_ids}
-            for probe in [p for p in ProbeRequest(return_objects=True, **kwargs)]:
-                cache.set("probe:{}".format(probe.id), probe, cls.EXPIRE_TIME)
-                r.append(probe)
+            fetched = [
+                ProbeRecord.from_probe(p)
+                for p in ProbeRequest(return_objects=True, **kwargs)
+            ]
+            cls.cache_many(fetched)
+            r += fetched
 
         return r
+
+    @classmethod
+    def cache_many(cls, probes):
+        """
+        Write a list of probe records to the cache in one go.
+        """
+        cache.set_many(
+            dict([("probe:{}".format(p.id), p.encode()) for p in probes]),
+            cls.EXPIRE_TIME
+        )
@@ -0,0 +1,207 @@
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import os
+import time
+
+from ripe.atlas.cousteau import ProbeRequest
+
+from ..helpers.prefetching import Prefetcher
+from ..settings import Configuration
+from .index import ProbeIndex
+from .records import ProbeRecord
+
+
+class ProbeCatalogue(object):
+    """
+    A local copy of every probe in RIPE Atlas, kept in a single file and
+    brought up to date with `ripe-atlas probes sync`.  While it's fresh, we
+    look probes up in here rather than asking the API about them.
+
+    The first sync downloads everything.  After that, we only ask for probes
+    that are new or have changed status since the last sync, and every so
+    often (FULL_SYNC_INTERVAL) we download everything again to pick up
+    anything that changed in some other way.
+
+    Probes are kept as encoded ProbeRecords keyed by id, and only decoded
+    when someone asks for them, so loading the catalogue is a single read of
+    the file no matter how many probes there are.
+    """
+
+    VERSION = 1
+
+    PATH = os.path.join(Configuration.USER_CONFIG_DIR, "probes")
+
+    # How long after a sync we trust the catalogue
+    MAX_AGE = 60 * 60 * 24
+
+    # How long we go on with incremental syncs before downloading everything
+    FULL_SYNC_INTERVAL = 60 * 60 * 24 * 7
+
+    PAGE_SIZE = 500
+
+    # The catalogue loaded by get_fresh(), shared by everyone in this process.
+    # False means we've looked and there isn't a fresh one.
+    _fresh = None
+
+    def __init__(self, path=None):
+
+        self.path = path or self.PATH
+        self.synced = None
+        self.full_synced = None
+        self._probes = {}
+        self._index = None
+
+        if os.path.exists(self.path):
+            self._load()
+
+    def __len__(self):
+        return len(self._probes)
+
+    def __contains__(self, pk):
+        return pk in self._probes
+
+    def __iter__(self):
+        """
+        Every probe, in order of id, which is the order the API uses too.
+        """
+        for pk in sorted(self._probes):
+            yield ProbeRecord.decode(self._probes[pk])
+
+    @property
+    def total_count(self):
+        """For compatibility with Cousteau's ProbeRequest"""
+        return len(self)
+
+    def get(self, pk):
+        return ProbeRecord.decode(self._probes.get(pk))
+
+    def get_many(self, ids):
+        """
+        Returns a dictionary of id -> ProbeRecord for those of `ids` that are
+        in the catalogue.
+        """
+        r = {}
+        for pk in ids:
+            if pk in self._probes:
+                r[pk] = ProbeRecord.decode(self._probes[pk])
+        return r
+
+    def get_index(self):
+        """
+        A ProbeIndex of the whole catalogue, built the first time it's asked
+        for.
+        """
+        if self._index is None:
+            self._index = ProbeIndex(self)
+        return self._index
+
+    def is_fresh(self, now=None):
+        if not self.synced:
+            return False
+        return (now or time.time()) - self.synced < self.MAX_AGE
+
+    def sync(self, full=False, now=None):
+        """
+        Brings the catalogue up to date, writes it to disk, and returns a
+        (fetched, is_full) tuple: the number of probes we downloaded and
+        whether we downloaded everything.
+        """
+
+        now = now or time.time()
+
+        if not self.full_synced or now - self.full_synced > \
+                self.FULL_SYNC_INTERVAL:
+            full = True
+
+        if full:
+            probes = {}
+            requests = [ProbeRequest(
+                return_objects=True, page_size=self.PAGE_SIZE)]
+        else:
+            probes = dict(self._probes)
+            requests = [
+                ProbeRequest(
+                    return_objects=True,
+                    page_size=self.PAGE_SIZE,
+                    id__gt=max(probes or [0])
+                ),
+                ProbeRequest(
+                    return_objects=True,
+                    page_size=self.PAGE_SIZE,
+                    status_since__gte=int(self.synced)
+                ),
+            ]
+
+        fetched = 0
+        for request in requests:
+            for probe in Prefetcher(request):
+                probes[probe.id] = ProbeRecord.from_probe(probe).encode()
+                fetched += 1
+
+        self._probes = probes
+        self._index = None
+        self.synced = now
+        if full:
+            self.full_synced = now
+        self.save()
+
+        return fetched, full
+
+    def save(self):
+        """
+        The file is written alongside the target and moved into place, so
+        nobody ever reads a half-written catalogue.
+        """
+
+        try:
+            os.makedirs(os.path.dirname(self.path))
+        except OSError:
+            pass  # Better to ask forgiveness than permission
+
+        temporary = "{}.tmp".format(self.path)
+        with open(temporary, "wb") as f:
+            pickle.dump({
+                "version": self.VERSION,
+                "records": ProbeRecord.VERSION,
+                "synced": self.synced,
+                "full-synced": self.full_synced,
+                "probes": self._probes,
+            }, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temporary, self.path)
+
+    def _load(self):
+        """
+        Anything we can't read, or that was written in a different format, is
+        treated as if it's not there, and the next sync starts from scratch.
+        """
+
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return
+
+        if not isinstance(data, dict):
+            return
+        if data.get("version") != self.VERSION:
+            return
+        if data.get("records") != ProbeRecord.VERSION:
+            return
+
+        self.synced = data["synced"]
+        self.full_synced = data["full-synced"]
+        self._probes = data["probes"]
+
+    @classmethod
+    def get_fresh(cls):
+        """
+        Returns the catalogue if it has been synced recently enough to be
+        trusted, or None.  It's only read from disk once per process.
+        """
+        if cls._fresh is None:
+            catalogue = cls()
+            cls._fresh = catalogue if catalogue.is_fresh() else False
+        return cls._fresh or None
@@ -0,0 +1,290 @@
+import gc
+from collections import defaultdict
+
+import IPy
+
+from ..exceptions import RipeAtlasToolsException
+from ..helpers.prefixes import PrefixTree, parse_prefix
+from .spatial import SpatialIndex
+
+
+class ProbeSelection(object):
+    """
+    The probes matching a query, in order of id.  It looks enough like
+    Cousteau's ProbeRequest (iterable, with a total_count) that the probes
+    command can't tell the difference.
+    """
+
+    def __init__(self, probes):
+        self.probes = probes
+
+    def __iter__(self):
+        return iter(self.probes)
+
+    def __len__(self):
+        return len(self.probes)
+
+    @property
+    def total_count(self):
+        return len(self.probes)
+
+
+class ProbeIndex(object):
+    """
+    In-memory indexes over a set of probe records, so that the filters the
+    API understands can be answered locally:
+
+      * asn, asn_v4, asn_v6 & country_code: a hash of value -> probe ids
+      * prefix, prefix_v4 & prefix_v6: a PrefixTree of the probes' prefixes
+      * radius: a SpatialIndex of the probes' coordinates
+
+    Each filter narrows the set of candidate ids, and only the survivors are
+    looked up, so a query costs little more than the size of its answer.
+    Each index is only built the first time a query needs it, so asking for
+    an ASN never pays for parsing every probe's prefixes.
+    """
+
+    FILTERS = (
+        "asn", "asn_v4", "asn_v6",
+        "prefix", "prefix_v4", "prefix_v6",
+        "country_code",
+        "radius", "latitude", "longitude",
+    )
+
+    def __init__(self, probes=()):
+
+        self._probes = {}
+        self._indexes = {}
+
+        for probe in probes:
+            self.add(probe)
+
+    def __len__(self):
+        return len(self._probes)
+
+    def add(self, probe):
+        self._probes[probe.id] = probe
+        for name, index in self._indexes.items():
+            getattr(self, "_index_{}".format(name))(index, probe)
+
+    @property
+    def _asns(self):
+        return self._get_index("asns", lambda: {
+            4: defaultdict(set), 6: defaultdict(set)})
+
+    @property
+    def _countries(self):
+        return self._get_index("countries", lambda: defaultdict(set))
+
+    @property
+    def _prefixes(self):
+        return self._get_index("prefixes", lambda: (PrefixTree(), {}))[0]
+
+    @property
+    def _locations(self):
+        return self._get_index("locations", SpatialIndex)
+
+    def _get_index(self, name, factory):
+        """
+        The index called `name`, built from every probe we have if this is
+        the first time it's been asked for.
+        """
+        if name not in self._indexes:
+
+            # Building an index makes hundreds of thousands of containers
+            # and frees none of them, so the cyclic garbage collector would
+            # only be slowing us down by looking through them all.
+            enabled = gc.isenabled()
+            gc.disable()
+            try:
+                index = factory()
+                add = getattr(self, "_index_{}".format(name))
+                for probe in self._probes.values():
+                    add(index, probe)
+            finally:
+                if enabled:
+                    gc.enable()
+
+            self._indexes[name] = index
+
+        return self._indexes[name]
+
+    @staticmethod
+    def _index_asns(asns, probe):
+        for version in (4, 6):
+            asn = getattr(probe, "asn_v{}".format(version))
+            if asn:
+                asns[version][int(asn)].add(probe.id)
+
+    @staticmethod
+    def _index_countries(countries, probe):
+        if probe.country_code:
+            countries[probe.country_code.upper()].add(probe.id)
+
+    @staticmethod
+    def _index_prefixes(prefixes, probe):
+        tree, ids = prefixes
+        for prefix in (probe.prefix_v4, probe.prefix_v6):
+            if not prefix:
+                continue
+            try:
+                prefix = parse_prefix(prefix)
+            except ValueError:
+                continue  # We can't index what we can't parse
+            if prefix not in ids:
+                ids[prefix] = set()
+                tree.insert_network(*prefix, value=ids[prefix])
+            ids[prefix].add(probe.id)
+
+    @classmethod
+    def _index_locations(cls, locations, probe):
+        coordinates = cls.get_coordinates(probe)
+        if coordinates:
+            locations.insert(coordinates[0], coordinates[1], probe.id)
+
+    @classmethod
+    def can_filter(cls, filters):
+        """
+        Whether filter() can answer a query with these filters.
+        """
+        if set(filters) - set(cls.FILTERS):
+            return False
+        if "radius" not in filters:
+            return "latitude" not in filters and "longitude" not in filters
+        return True
+
+    def filter(self, **filters):
+        """
+        Takes the same filters as the API's probe endpoint (as built by the
+        probes command) and returns a ProbeSelection of the probes matching
+        all of them.
+        """
+
+        ids = self._get_ids(filters)
+        if ids is None:
+            ids = self._probes.keys()
+
+        return ProbeSelection([self._probes[pk] for pk in sorted(ids)])
+
+    def nearest(self, lat, lng, count, radius=None, accept=None, **filters):
+        """
+        Returns a ProbeSelection of the `count` probes nearest to `lat`,`lng`,
+        nearest first.  Only probes within `radius` km, for which
+        `accept(probe)` is true, and that match `filters` are considered.
+        """
+
+        ids = self._get_ids(filters)
+
+        def is_acceptable(pk):
+            if ids is not None and pk not in ids:
+                return False
+            return accept is None or accept(self._probes[pk])
+
+        return ProbeSelection([
+            self._probes[pk] for _, pk in self._locations.nearest(
+                lat, lng, count, radius=radius, accept=is_acceptable)
+        ])
+
+    def _get_ids(self, filters):
+        """
+        The set of ids matching all of `filters`, or None if there aren't any
+        filters.
+        """
+
+        unknown = set(filters) - set(self.FILTERS)
+        if unknown:
+            raise RipeAtlasToolsException(
+                "These filters can't be used offline: {}".format(
+                    ", ".join(sorted(unknown))))
+
+        ids = None
+        for matches in self._get_matches(filters):
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                break
+
+        return ids
+
+    def _get_matches(self, filters):
+        """
+        Yields a set of matching ids per filter, cheapest first.
+        """
+
+        if "asn" in filters:
+            asn = int(filters["asn"])
+            yield self._asns[4].get(asn, set()) | self._asns[6].get(asn, set())
+        for version in (4, 6):
+            key = "asn_v{}".format(version)
+            if key in filters:
+                yield set(self._asns[version].get(int(filters[key]), ()))
+
+        if "country_code" in filters:
+            yield set(self._countries.get(filters["country_code"].upper(), ()))
+
+        for key in ("prefix", "prefix_v4", "prefix_v6"):
+            if key in filters:
+                yield self._get_prefix_matches(filters[key])
+
+        if "radius" in filters:
+            yield self._get_radius_matches(filters["radius"])
+        elif "latitude" in filters or "longitude" in filters:
+            raise RipeAtlasToolsException(
+                "Offline queries around a point need a --radius.")
+
+    def _get_prefix_matches(self, prefix):
+        """
+        Probes in `prefix`: those whose own prefix is the same or more
+        specific, as well as those in a less specific prefix whose address is
+        inside this one.
+        """
+
+        try:
+            prefix = IPy.IP(prefix, make_net=True)
+        except ValueError:
+            raise RipeAtlasToolsException(
+                "{} isn't a valid prefix.".format(prefix))
+
+        r = set()
+        for ids in self._prefixes.within_values(prefix):
+            r |= ids
+
+        field = "address_v{}".format(prefix.version())
+        for ids in self._prefixes.covering_values(prefix):
+            for pk in ids - r:
+                address = getattr(self._probes[pk], field)
+                if address and self._contains(prefix, address):
+                    r.add(pk)
+
+        return r
+
+    def _get_radius_matches(self, radius):
+        """
+        `radius` is in the API's format: "<lat>,<lng>:<km>".
+        """
+        try:
+            point, distance = radius.split(":")
+            lat, lng = [float(_) for _ in point.split(",")]
+            distance = float(distance)
+        except ValueError:
+            raise RipeAtlasToolsException(
+                "{} isn't a valid radius.".format(radius))
+        return set(pk for _, pk in self._locations.within(lat, lng, distance))
+
+    @staticmethod
+    def get_coordinates(probe):
+        """
+        A (lat, lng) tuple for the probe, or None if it doesn't have any.
+        GeoJSON puts longitude first.
+        """
+        try:
+            lng, lat = probe.geometry["coordinates"][:2]
+            return float(lat), float(lng)
+        except (TypeError, KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def _contains(prefix, address):
+        try:
+            return address in prefix
+        except ValueError:
+            return False
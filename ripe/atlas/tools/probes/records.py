@@ -0,0 +1,77 @@
+class ProbeRecord(object):
+    """
+    The parts of a probe we actually use, and nothing else.  These are what we
+    keep in the cache rather than pickled Cousteau objects: they're a fraction
+    of the size, quick to load, and don't care which version of Cousteau wrote
+    them.
+
+    The encoded form is a flat tuple of VERSION followed by the values of
+    FIELDS, in order.  It's made only of built-in types, so the cache can
+    pickle and unpickle it in a fraction of the time a Cousteau Probe takes.
+    If either changes, bump VERSION, and anything cached in the old format will
+    simply be fetched again.
+    """
+
+    VERSION = 1
+
+    FIELDS = (
+        "id",
+        "asn_v4",
+        "asn_v6",
+        "prefix_v4",
+        "prefix_v6",
+        "address_v4",
+        "address_v6",
+        "country_code",
+        "status",
+        "geometry",
+        "is_anchor",
+        "is_public",
+        "description",
+    )
+
+    __slots__ = FIELDS
+
+    def __init__(self, **kwargs):
+        for field in self.FIELDS:
+            setattr(self, field, kwargs.get(field))
+
+    def __repr__(self):
+        return "<ProbeRecord {}>".format(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, ProbeRecord) and \
+            self.to_list() == other.to_list()
+
+    def __ne__(self, other):
+        return not self == other
+
+    @classmethod
+    def from_probe(cls, probe):
+        """
+        Make a record out of a Cousteau Probe, or anything else with the same
+        attributes.
+        """
+        return cls(**dict(
+            [(field, getattr(probe, field, None)) for field in cls.FIELDS]))
+
+    def to_list(self):
+        return [getattr(self, field) for field in self.FIELDS]
+
+    def encode(self):
+        return tuple([self.VERSION] + self.to_list())
+
+    @classmethod
+    def decode(cls, encoded):
+        """
+        The opposite of encode().  Returns None for anything that isn't a
+        record in the current format.
+        """
+        if not isinstance(encoded, tuple) or not encoded:
+            return None
+        if encoded[0] != cls.VERSION or len(encoded) != len(cls.FIELDS) + 1:
+            return None
+        r = cls.__new__(cls)
+        for field, value in zip(cls.FIELDS, encoded[1:]):
+            setattr(r, field, value)
+        return r
@@ -0,0 +1,130 @@
+import math
+
+
+# The mean radius of the Earth, in km
+EARTH_RADIUS = 6371.0088
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """
+    The great-circle distance in km between two points given in degrees.
+    """
+
+    lat1, lng1, lat2, lng2 = [math.radians(_) for _ in (lat1, lng1, lat2, lng2)]
+
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+class SpatialIndex(object):
+    """
+    Points on the globe, bucketed into a grid of CELL_SIZE x CELL_SIZE degree
+    cells, so that a radius query only has to measure the distance to points
+    in the handful of cells that overlap the circle:
+
+      index = SpatialIndex()
+      index.insert(52.3, 4.9, "Amsterdam")
+      index.within(52.1, 5.1, 50)  # [(26.08..., "Amsterdam")]
+      index.nearest(0, 0, 1)  # [(5833.47..., "Amsterdam")]
+    """
+
+    CELL_SIZE = 1.0
+
+    def __init__(self, cell_size=None):
+        self.cell_size = float(cell_size or self.CELL_SIZE)
+        self.rows = int(math.ceil(180 / self.cell_size))
+        self.columns = int(math.ceil(360 / self.cell_size))
+        self._cells = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, lat, lng, value):
+        self._cells.setdefault(self._get_cell(lat, lng), []).append(
+            (lat, lng, value))
+        self._size += 1
+
+    def within(self, lat, lng, radius):
+        """
+        Returns a list of (distance, value) tuples for every point no more
+        than `radius` km from `lat`,`lng`, nearest first.
+        """
+
+        r = []
+        for cell in self._get_cells_around(lat, lng, radius):
+            for point_lat, point_lng, value in self._cells.get(cell, ()):
+                distance = haversine(lat, lng, point_lat, point_lng)
+                if distance <= radius:
+                    r.append((distance, value))
+
+        return sorted(r, key=lambda _: _[0])
+
+    def nearest(self, lat, lng, count, radius=None, accept=None):
+        """
+        Returns a list of (distance, value) tuples for the `count` points
+        nearest to `lat`,`lng`, nearest first, optionally only those within
+        `radius` km, and those for which `accept(value)` is true.
+
+        We search a circle about a cell wide and double it until it holds
+        enough points, so a query in a crowded area only ever looks at the
+        few cells around it.
+        """
+
+        limit = math.pi * EARTH_RADIUS  # Halfway around the world
+        if radius is not None:
+            limit = min(limit, radius)
+
+        distance = min(limit, math.radians(self.cell_size) * EARTH_RADIUS)
+        while True:
+            r = self.within(lat, lng, distance)
+            if accept is not None:
+                r = [_ for _ in r if accept(_[1])]
+            if len(r) >= count or distance >= limit:
+                return r[:count]
+            distance = min(limit, distance * 2)
+
+    def _get_cell(self, lat, lng):
+        return self._get_row(lat), self._get_column(lng)
+
+    def _get_row(self, lat):
+        return min(self.rows - 1, max(0, int((lat + 90) // self.cell_size)))
+
+    def _get_column(self, lng):
+        return int((lng + 180) // self.cell_size) % self.columns
+
+    def _get_cells_around(self, lat, lng, radius):
+        """
+        The cells overlapping the bounding box of a circle.  Near the poles,
+        or for a circle wider than half the globe, that's every column in the
+        rows it spans.
+        """
+
+        angle = radius / EARTH_RADIUS
+        delta_lat = math.degrees(angle)
+
+        top = lat + delta_lat
+        bottom = lat - delta_lat
+        rows = range(self._get_row(bottom), self._get_row(top) + 1)
+
+        # How far east and west the circle reaches, at its widest
+        sine = math.sin(angle) / max(1e-12, math.cos(math.radians(lat)))
+        if top >= 90 or bottom <= -90 or angle >= math.pi / 2 or sine >= 1:
+            columns = range(self.columns)
+        else:
+            delta_lng = math.degrees(math.asin(sine))
+            first = int((lng - delta_lng + 180) // self.cell_size)
+            last = int((lng + delta_lng + 180) // self.cell_size)
+            columns = set(
+                _ % self.columns for _ in range(first, last + 1))
+
+        # A big enough circle is quicker to answer by looking at every cell
+        if len(rows) * len(columns) > len(self._cells):
+            return [
+                cell for cell in self._cells
+                if cell[0] in rows and cell[1] in columns
+            ]
+
+        return [(row, column) for row in rows for column in columns]
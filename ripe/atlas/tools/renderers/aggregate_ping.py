@@ -9,6 +9,8 @@ class Renderer(BaseRenderer):
     """
 
     RENDERS = [BaseRenderer.TYPE_PING]
+    NEEDS_PROBES = False
+    KEEP_RESULTS = False
 
     def __init__(self):
         self.target = ""
@@ -47,14 +49,20 @@ class Renderer(BaseRenderer):
         results.
         """
         for result in results:
-            self.set_target(result)
+            self.collect_result(result)
 
-            self.sent_packets += result.packets_sent
-            self.received_packets += result.packets_received
-            self.collect_min_max_rtts("min", result.rtt_min)
-            self.collect_min_max_rtts("max", result.rtt_max)
+    def collect_result(self, result):
+        """
+        Collects the stats we want from a single result.
+        """
+        self.set_target(result)
+
+        self.sent_packets += result.packets_sent
+        self.received_packets += result.packets_received
+        self.collect_min_max_rtts("min", result.rtt_min)
+        self.collect_min_max_rtts("max", result.rtt_max)
 
-            self.collect_packets_rtt(result.packets)
+        self.collect_packets_rtt(result.packets)
 
     def set_target(self, result):
         """Sets the target of the measurement if not set."""
@@ -105,4 +113,5 @@ class Renderer(BaseRenderer):
             return (sorted_rtts[index] + sorted_rtts[index + 1]) / 2.0
 
     def on_result(self, result):
+        self.collect_result(result)
         return ""
@@ -17,6 +17,23 @@ class Renderer(object):
 
     RENDERS = ()
 
+    # Set this to False if neither on_result() nor additional() use
+    # result.probe, so we needn't look the probes up at all, which saves a
+    # trip to the cache (or the API) for every batch of results.
+    NEEDS_PROBES = True
+
+    # Set this to False if on_result() can make do with a RawResult (see
+    # helpers.rendering) rather than a parsed one, so we needn't parse it.
+    # It's only used when the results aren't being aggregated.
+    NEEDS_PARSING = True
+
+    # Results are only read once, as they're rendered, so to hand them to
+    # additional() we have to keep them in memory as they go by (up to
+    # Rendering.KEEP_LIMIT of them).  A renderer that collects what it needs
+    # for its summary in on_result() should set this to False, and it's
+    # never done for one that doesn't override additional().
+    KEEP_RESULTS = True
+
     @staticmethod
     def get_available():
         """
@@ -111,10 +128,20 @@ class Renderer(object):
         """
         pass
 
+    @staticmethod
+    def prefetch(*args, **kwargs):
+        """
+        Override this to look up anything you'll need for a batch of results
+        in one go, before on_result() is called for each of them.
+        """
+        pass
+
     @staticmethod
     def additional(*args, **kwargs):
         """
-        Override this for summary logic.
+        Override this for summary logic.  It's called once every result has
+        been through on_result(), with the results kept along the way, or an
+        empty list if KEEP_RESULTS is False.
         """
         pass
 
@@ -136,7 +163,8 @@ class Renderer(object):
     def on_result(self, result):
         """
         This must be defined in the subclass, and must return a string, even if
-        that string is "".
+        that string is "".  This is also the place to collect anything you
+        need for a summary in additional().
         """
         raise NotImplementedError()
 
@@ -6,6 +6,7 @@ from .base import Renderer as BaseRenderer
 class Renderer(BaseRenderer):
 
     RENDERS = [BaseRenderer.TYPE_DNS]
+    NEEDS_PROBES = False
     TIME_FORMAT = "%a %b %d %H:%M:%S %Z %Y"
 
     def on_result(self, result):
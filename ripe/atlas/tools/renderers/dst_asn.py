@@ -1,3 +1,5 @@
+from __future__ import print_function
+
 from .base import Renderer as BaseRenderer
 from collections import Counter
 
@@ -7,15 +9,24 @@ from ..ipdetails import IP
 class Renderer(BaseRenderer):
 
     RENDERS = [BaseRenderer.TYPE_PING]
+    NEEDS_PROBES = False
+    KEEP_RESULTS = False
 
     def __init__(self):
         self.asns = Counter()  # keys are timestamps, data struct captures ASN membership
         self.asn2name = {}
+        self.ips = {}
+
+    def prefetch(self, results):
+        self.ips = IP.resolve_many(
+            result.destination_address for result in results
+            if result.destination_address is not None
+        )
 
     def on_result(self, result):
         dst = result.destination_address
         if dst is not None:
-            ip = IP(dst)
+            ip = self.ips.get(dst) or IP(dst)
             if ip.asn:
                 self.asns[ip.asn] += 1
                 self.asn2name[ip.asn] = ip.holder
@@ -28,8 +39,9 @@ class Renderer(BaseRenderer):
     def additional(self, results):
         total = sum(self.asns.values())
         for asn, count in self.asns.most_common():
-            print "AS%s %.2f%% (%s)" % (
+            holder = self.asn2name[asn]
+            print("AS%s %.2f%%%s" % (
               asn,
               100.0*count/total,
-              self.asn2name[asn]
-            )
+              " (%s)" % holder if holder else ""
+            ))
@@ -1,7 +1,6 @@
 from __future__ import print_function
 
-import json
-
+from ..helpers.fastjson import dumps
 from .base import Renderer as BaseRenderer
 
 
@@ -16,5 +15,14 @@ class Renderer(BaseRenderer):
         BaseRenderer.TYPE_NTP
     ]
 
+    NEEDS_PROBES = False
+    NEEDS_PARSING = False
+
     def on_result(self, result, probes=None):
-        return json.dumps(result.raw_data, separators=(",", ":")) + "\n"
+        """
+        Whenever we have the line a result came from, we pass it on as it
+        is.  Otherwise, it's encoded again.
+        """
+        if getattr(result, "raw", None):
+            return result.raw + "\n"
+        return dumps(result.raw_data) + "\n"
@@ -5,6 +5,8 @@ THRESHOLD = 80  # %
 
 class Renderer(BaseRenderer):
     RENDERS = [BaseRenderer.TYPE_SSLCERT]
+    NEEDS_PROBES = True
+    KEEP_RESULTS = False
 
     def __init__(self):
         self.uniqcerts = {}
@@ -89,4 +91,5 @@ class Renderer(BaseRenderer):
         return blob_list
 
     def on_result(self, result):
+        self.bucketize_result_cert(result)
         return ""
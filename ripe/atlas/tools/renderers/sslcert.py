@@ -9,6 +9,7 @@ class Renderer(BaseRenderer):
     """
 
     RENDERS = [BaseRenderer.TYPE_SSLCERT]
+    NEEDS_PROBES = False
 
     def on_result(self, result):
         r = ""
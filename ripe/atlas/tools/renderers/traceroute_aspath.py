@@ -6,9 +6,11 @@ from .base import Result
 class Renderer(BaseRenderer):
 
     RENDERS = [BaseRenderer.TYPE_TRACEROUTE]
+    NEEDS_PROBES = False
 
     def __init__(self):
         self.paths = {}
+        self.ips = {}
 
         # Number of different ASs starting from the end of the traceroute path.
         #
@@ -28,21 +30,32 @@ class Renderer(BaseRenderer):
         return "For each traceroute path toward the target, the " \
                "last {} ASNs will be shown\n\n".format(self.RADIUS)
 
-    def on_result(self, result):
-
+    @staticmethod
+    def _get_ip_hops(result):
         ip_hops = []
-
         for hop in result.hops:
             for packet in hop.packets:
                 if packet.origin:
                     ip_hops.append(packet.origin)
                     break
+        return ip_hops
+
+    def prefetch(self, results):
+        self.ips = IP.resolve_many(
+            address
+            for result in results
+            for address in self._get_ip_hops(result)
+        )
+
+    def on_result(self, result):
+
+        ip_hops = self._get_ip_hops(result)
 
         asns = []
 
         # starting from the last hop's IP, get up to <RADIUS> ASNs
         for address in reversed(ip_hops):
-            ip = IP(address)
+            ip = self.ips.get(address) or IP(address)
             if ip.asn and ip.asn not in asns:
                 asns.append(ip.asn)
             if len(asns) == self.RADIUS:
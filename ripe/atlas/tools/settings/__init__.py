@@ -1,8 +1,11 @@
-import collections
 import copy
 import os
 import re
-import yaml
+
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:  # Python 2
+    from collections import Mapping, MutableMapping
 
 
 class Configuration(object):
@@ -20,6 +23,11 @@ class Configuration(object):
             "fetch": "",
             "create": "",
         },
+        "cache": {
+            "memory-entries": 10000,
+            "max-entries": 0,
+            "max-bytes": 100 * 1024 * 1024,
+        },
         "specification": {
             "af": 4,
             "description": "",
@@ -156,6 +164,7 @@ class Configuration(object):
     def get(self):
         r = copy.deepcopy(self.DEFAULT)
         if os.path.exists(self.USER_RC):
+            import yaml
             with open(self.USER_RC) as y:
                 custom = yaml.load(y)
                 if custom:
@@ -169,7 +178,7 @@ class Configuration(object):
         Stolen from http://stackoverflow.com/questions/3232943/
         """
         for k, v in u.items():
-            if isinstance(v, collections.Mapping):
+            if isinstance(v, Mapping):
                 r = cls.deep_update(d.get(k, {}), v)
                 d[k] = r
             else:
@@ -185,10 +194,13 @@ class Configuration(object):
         easy for n00bs to read.
         """
 
+        import yaml
+
         template = os.path.join(
             os.path.dirname(__file__), "templates", "base.yaml")
 
         authorisation = re.compile("^authorisation:$", re.MULTILINE)
+        cache = re.compile("^cache:$", re.MULTILINE)
         tags = re.compile("^  tags:$", re.MULTILINE)
         specification = re.compile("^specification:$", re.MULTILINE)
         ripe = re.compile("^ripe-ncc:$", re.MULTILINE)
@@ -196,7 +208,7 @@ class Configuration(object):
         with open(template) as t:
             payload = str(t.read()).format(
                 payload=yaml.dump(
-                    config,
+                    dict(config),
                     default_flow_style=False
                 )
             )
@@ -210,6 +222,11 @@ class Configuration(object):
                 "authorisation:",
                 payload
             )
+            payload = cache.sub(
+                "\n# Local Caching\n"
+                "cache:",
+                payload
+            )
             payload = specification.sub(
                 "\n# Measurement Creation\n"
                 "specification:",
@@ -225,4 +242,35 @@ class Configuration(object):
             rc.write(payload)
 
 
-conf = Configuration().get()
+class LazyConfiguration(MutableMapping):
+    """
+    Stands in for the configuration dictionary, but doesn't go looking for
+    (or parsing) the user's config file until something actually asks for a
+    value.  Commands like `ripe-atlas go` never need it at all.
+    """
+
+    def __init__(self):
+        self._conf = None
+
+    def load(self):
+        if self._conf is None:
+            self._conf = Configuration().get()
+        return self._conf
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __setitem__(self, key, value):
+        self.load()[key] = value
+
+    def __delitem__(self, key):
+        del self.load()[key]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+
+conf = LazyConfiguration()
@@ -1,10 +1,9 @@
 from __future__ import absolute_import
 
-import sys
-
 from ripe.atlas.cousteau import AtlasStream
 from ripe.atlas.sagan import Result
 
+from .helpers.output import Output
 from .renderers import Renderer
 
 
@@ -14,19 +13,24 @@ class CaptureLimitExceeded(Exception):
 
 class Stream(object):
 
-    def __init__(self, capture_limit=None, timeout=None):
+    def __init__(self, capture_limit=None, timeout=None, output=None):
 
         self.captured = 0
         self.capture_limit = capture_limit
 
         self.timeout = timeout
 
+        # Results are written out in blocks, but never held back for longer
+        # than Output.FLUSH_INTERVAL, so the stream still looks live.
+        self.output = output
+
     def stream(self, renderer_name, kind, pk):
 
         renderer = Renderer.get_renderer(name=renderer_name, kind=kind)()
+        output = self.output or Output(flush_interval=Output.FLUSH_INTERVAL)
 
         def on_result_response(result, *args):
-            sys.stdout.write(renderer.on_result(Result.get(
+            output.write(renderer.on_result(Result.get(
                 result,
                 on_error=Result.ACTION_IGNORE,
                 on_malformation=Result.ACTION_IGNORE
@@ -45,3 +49,5 @@ class Stream(object):
         except (KeyboardInterrupt, CaptureLimitExceeded) as e:
             stream.disconnect()
             raise e
+        finally:
+            output.flush()
@@ -32,6 +32,7 @@ with open(os.path.join(os.path.dirname(__file__), "README.rst")) as description:
             "tzlocal",
             "pyyaml",
             "pyOpenSSL>=0.13",
+            "six",
         ],
         tests_require=[
             "nose",
@@ -1,13 +1,26 @@
 from .aggregators import TestAggregators
 from .commands import (
+    TestCacheCommand,
     TestProbesCommand,
     TestMeasureCommand,
     TestMeasurementsCommand,
     TestReportCommand
 )
-from .helpers import TestArgumentTypeHelper
+from .helpers import (
+    TestArgumentTypeHelper,
+    TestJSONArrayStream,
+    TestMappedLines,
+    TestOpenInput,
+    TestOutput,
+    TestPrefetcher,
+    TestPrefixTree,
+    TestRendering,
+    TestResultFilter,
+    TestSaganSet
+)
 from .renderers import (
     TestPingRenderer,
+    TestRawRenderer,
     TestSSLConsistency,
     TestAggregatePing
 )
@@ -15,12 +28,23 @@ from .renderers import (
 
 __all__ = [
     TestAggregators,
+    TestCacheCommand,
     TestProbesCommand,
     TestMeasureCommand,
     TestMeasurementsCommand,
     TestReportCommand,
     TestArgumentTypeHelper,
+    TestOutput,
+    TestPrefetcher,
+    TestPrefixTree,
+    TestRendering,
+    TestResultFilter,
+    TestSaganSet,
+    TestJSONArrayStream,
+    TestMappedLines,
+    TestOpenInput,
     TestPingRenderer,
+    TestRawRenderer,
     TestSSLConsistency,
     TestAggregatePing,
 ]
@@ -2,7 +2,7 @@ import unittest
 from collections import namedtuple
 
 from ripe.atlas.tools.aggregators.base import (
-    aggregate, ValueKeyAggregator, RangeKeyAggregator
+    aggregate, aggregate_stream, Bucket, ValueKeyAggregator, RangeKeyAggregator
 )
 
 
@@ -285,3 +285,34 @@ class TestAggregators(unittest.TestCase):
             }
         }
         self.assertEquals(buckets, expected_output)
+
+    def test_stream_aggregation(self):
+        """A single pass gives the same buckets as aggregate()"""
+        keys = [
+            ValueKeyAggregator(key='probe.country'),
+            RangeKeyAggregator(key='rtt', ranges=[10, 20, 30])
+        ]
+        expected = aggregate(self.results, keys[:])
+        result = aggregate_stream(iter(self.results), keys)
+        self.assertEquals(result, expected)
+        self.assertEquals(len(keys), 2)
+
+    def test_stream_aggregation_max_per_bucket(self):
+        """Only the first few entities are kept, but all of them are counted"""
+        keys = [ValueKeyAggregator(key='country')]
+        result = aggregate_stream(iter(self.probes), keys, max_per_bucket=2)
+        self.assertEquals(
+            [p.id for p in result["COUNTRY: SE"]], [3, 4])
+        self.assertEquals(result["COUNTRY: SE"].total, 4)
+        self.assertEquals(result["COUNTRY: GR"].total, 1)
+        self.assertTrue(isinstance(result["COUNTRY: GR"], Bucket))
+
+        result = aggregate_stream(iter(self.probes), [], max_per_bucket=3)
+        self.assertEquals([p.id for p in result], [1, 2, 3])
+        self.assertEquals(result.total, 11)
+
+    def test_needs_probes(self):
+        """Aggregators know whether they need the results' probes"""
+        self.assertTrue(ValueKeyAggregator(key='probe.country').needs_probes)
+        self.assertFalse(
+            RangeKeyAggregator(key='rtt', ranges=[10]).needs_probes)
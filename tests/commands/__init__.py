@@ -1,9 +1,11 @@
+from .cache import TestCacheCommand
 from .measure import TestMeasureCommand
 from .measurements import TestMeasurementsCommand
 from .probes import TestProbesCommand
 from .report import TestReportCommand
 
 __all__ = [
+    TestCacheCommand,
     TestMeasureCommand,
     TestMeasurementsCommand,
     TestProbesCommand,
@@ -0,0 +1,92 @@
+import mock
+import os
+import tempfile
+import unittest
+
+from ripe.atlas.cousteau import Probe
+from ripe.atlas.tools.cache import LocalCache
+from ripe.atlas.tools.commands.cache import Command
+from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.probes import ProbeRecord
+
+from ..base import capture_sys_output
+
+
+class TestCacheCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache(path=":memory:", max_entries=0, max_bytes=0)
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2, 60)
+        self.cache.set("IPDetails:193.0.6.1", 3, 60)
+        mock.patch("ripe.atlas.tools.commands.cache.cache", self.cache).start()
+        mock.patch("ripe.atlas.tools.probes.cache", self.cache).start()
+        mock.patch("ripe.atlas.tools.geocoding.cache", self.cache).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def _run(self, *args):
+        with capture_sys_output() as (stdout, stderr):
+            cmd = Command()
+            cmd.init_args(list(args))
+            cmd.run()
+            return stdout.getvalue()
+
+    def test_stats(self):
+        """Totals and a line for each namespace"""
+        self.cache._now += 90
+        output = self._run("stats")
+        self.assertTrue("Entries:        3 (limit: none)" in output)
+        self.assertTrue("Expired:        3" in output)
+        self.assertTrue("IPDetails" in output)
+        self.assertTrue("probe                         2" in output)
+
+    def test_expire(self):
+        self.cache.set("probe:3", 3)
+        self.cache._now += 90
+        self.assertTrue("Removed 3 entries" in self._run("expire"))
+        self.assertEqual(self.cache.keys(), ["probe:3"])
+
+    def test_clear_namespace(self):
+        self._run("clear", "--namespace", "probe")
+        self.assertEqual(self.cache.keys(), ["IPDetails:193.0.6.1"])
+        self._run("clear")
+        self.assertEqual(self.cache.keys(), [])
+
+    def test_compact(self):
+        self.assertTrue("The cache file is now" in self._run("compact"))
+
+    def test_warm(self):
+        """Probes are fetched and cached in batches"""
+        probes = [Probe(id=pk, meta_data={"id": pk}) for pk in (1, 2, 3)]
+        path = "ripe.atlas.cousteau.ProbeRequest"
+        with mock.patch(path, return_value=iter(probes)) as request:
+            with mock.patch.object(Command, "WARM_BATCH_SIZE", 2):
+                self.assertTrue(
+                    "Cached 3 probes" in self._run("warm", "--probes", "1,2,3"))
+            self.assertEqual(
+                request.call_args[1], {"return_objects": True, "id__in": "1,2,3"})
+        self.assertEqual(
+            ProbeRecord.decode(self.cache.get("probe:3")).id, 3)
+
+    def test_gazetteer(self):
+        """Places in the gazetteer are cached and never expire"""
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("Amsterdam,52.37,4.89\n")
+            output = self._run("gazetteer", "--file", path)
+        finally:
+            os.unlink(path)
+        self.assertTrue("Imported 1 places" in output)
+        self.cache._now += 10 ** 9
+        self.assertEqual(self.cache.get("Gazetteer:amsterdam"), (52.37, 4.89))
+
+        self._run("clear")
+        self.assertEqual(self.cache.get("Gazetteer:amsterdam"), (52.37, 4.89))
+        self._run("clear", "--namespace", "Gazetteer")
+        self.assertEqual(self.cache.get("Gazetteer:amsterdam"), None)
+
+        with self.assertRaises(RipeAtlasToolsException):
+            self._run("gazetteer")
@@ -21,6 +21,8 @@ from ripe.atlas.tools.commands.measure import (
     NtpMeasureCommand,
 )
 from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.probes import ProbeRecord
+from ripe.atlas.tools.probes.index import ProbeIndex
 from ripe.atlas.tools.settings import Configuration
 
 from ..base import capture_sys_output
@@ -572,6 +574,71 @@ class TestMeasureCommand(unittest.TestCase):
                 }
             })
 
+    def test_get_source_kwargs_from_center(self):
+        """--from-center picks the nearest connected probes locally"""
+
+        catalogue = mock.Mock()
+        catalogue.__len__ = mock.Mock(return_value=3)
+        catalogue.get_index.return_value = ProbeIndex([
+            ProbeRecord(id=1, status="Connected", geometry={
+                "type": "Point", "coordinates": [4.9, 52.37]}),
+            ProbeRecord(id=2, status="Disconnected", geometry={
+                "type": "Point", "coordinates": [4.48, 51.92]}),
+            ProbeRecord(id=3, status="Connected", geometry={
+                "type": "Point", "coordinates": [13.4, 52.52]}),
+        ])
+
+        path = "ripe.atlas.tools.probes.catalogue.ProbeCatalogue"
+        with mock.patch(path) as ProbeCatalogue:
+            ProbeCatalogue.get_fresh.return_value = catalogue
+
+            cmd = PingMeasureCommand()
+            cmd.init_args([
+                "ping", "--target", "example.com",
+                "--probes", "5", "--from-center", "52,4.5"
+            ])
+            r = cmd._get_source_kwargs()
+            self.assertEqual(r["type"], "probes")
+            self.assertEqual(r["value"], "1,3")
+            self.assertEqual(r["requested"], 2)
+
+            cmd = PingMeasureCommand()
+            cmd.init_args([
+                "ping", "--target", "example.com",
+                "--from-center", "52,4.5", "--from-radius", "100"
+            ])
+            self.assertEqual(cmd._get_source_kwargs()["value"], "1")
+
+            cmd = PingMeasureCommand()
+            cmd.init_args([
+                "ping", "--target", "example.com",
+                "--from-center", "0,0", "--from-radius", "100"
+            ])
+            with self.assertRaises(RipeAtlasToolsException):
+                cmd._get_source_kwargs()
+
+    def test_get_source_kwargs_from_center_stale(self):
+        """We won't pick probes from a catalogue that isn't fresh"""
+        path = "ripe.atlas.tools.probes.catalogue.ProbeCatalogue"
+        with mock.patch(path) as ProbeCatalogue:
+            ProbeCatalogue.get_fresh.return_value = None
+            ProbeCatalogue.MAX_AGE = 60 * 60 * 24
+            cmd = PingMeasureCommand()
+            cmd.init_args([
+                "ping", "--target", "example.com", "--from-center", "52,4.5"
+            ])
+            with self.assertRaises(RipeAtlasToolsException):
+                cmd._get_source_kwargs()
+
+    def test_from_radius_needs_from_center(self):
+        cmd = PingMeasureCommand()
+        with capture_sys_output() as (stdout, stderr):
+            with self.assertRaises(SystemExit):
+                cmd.init_args([
+                    "ping", "--target", "example.com", "--from-radius", "100"
+                ])
+        self.assertIn("--from-center", stderr.getvalue())
+
     def test_get_af(self):
 
         conf = copy.deepcopy(Configuration.DEFAULT)
@@ -6,6 +6,9 @@ from ripe.atlas.tools.commands.probes import Command
 from ripe.atlas.tools.exceptions import RipeAtlasToolsException
 from ripe.atlas.cousteau import Probe
 from ripe.atlas.tools.aggregators import ValueKeyAggregator
+from ripe.atlas.tools.cache import LocalCache
+from ripe.atlas.tools.probes import ProbeRecord
+from ripe.atlas.tools.probes.index import ProbeIndex
 
 from ..base import capture_sys_output
 
@@ -44,6 +47,16 @@ class TestProbesCommand(unittest.TestCase):
 
     def setUp(self):
         self.maxDiff = None
+        self.get_fresh = mock.patch(
+            "ripe.atlas.tools.commands.probes.ProbeCatalogue.get_fresh",
+            return_value=None
+        ).start()
+        mock.patch(
+            "ripe.atlas.tools.geocoding.cache", LocalCache(path=":memory:")
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
 
     def test_with_empty_args(self):
         """User passes no args, should fail with RipeAtlasToolsException"""
@@ -528,3 +541,126 @@ class TestProbesCommand(unittest.TestCase):
                 expected_set = set(expected_output.split("\n"))
                 returned_set = set(stdout.getvalue().split("\n"))
                 self.assertEquals(returned_set, expected_set)
+
+    def test_sync(self):
+        """ripe-atlas probes sync"""
+        cmd = Command()
+        cmd.init_args(["sync", "--full"])
+        self.assertTrue(cmd.is_sync)
+
+        path = "ripe.atlas.tools.commands.probes.ProbeCatalogue"
+        with capture_sys_output() as (stdout, stderr):
+            with mock.patch(path) as catalogue:
+                catalogue.return_value.sync.return_value = (5, True)
+                catalogue.return_value.__len__.return_value = 5
+                cmd.run()
+                catalogue.return_value.sync.assert_called_once_with(full=True)
+        self.assertTrue(
+            "Full sync complete: 5 probes downloaded, 5 in the catalogue" in
+            stdout.getvalue()
+        )
+
+    def test_all_from_catalogue(self):
+        """--all reads a fresh catalogue instead of the API"""
+        cmd = Command()
+        cmd.init_args(["--all", "--ids-only"])
+
+        path = "ripe.atlas.tools.commands.probes.{}"
+        with capture_sys_output() as (stdout, stderr):
+            with mock.patch(path.format("ProbeCatalogue.get_fresh")) as fresh:
+                with mock.patch(path.format("ProbeRequest")) as request:
+                    fresh.return_value = FakeGen()
+                    cmd.run()
+                    self.assertEquals(request.call_count, 0)
+        self.assertEquals(stdout.getvalue(), "1\n2\n3\n4\n5\n")
+
+    def test_offline(self):
+        """--offline answers from the local catalogue's indexes"""
+        cmd = Command()
+        cmd.init_args(["--offline", "--asn", "3333", "--ids-only"])
+
+        path = "ripe.atlas.tools.commands.probes.{}"
+        with capture_sys_output() as (stdout, stderr):
+            with mock.patch(path.format("ProbeCatalogue")) as catalogue:
+                with mock.patch(path.format("ProbeRequest")) as request:
+                    catalogue.return_value.__len__.return_value = 5
+                    catalogue.return_value.get_index.return_value = \
+                        ProbeIndex(FakeGen())
+                    cmd.run()
+                    self.assertEquals(request.call_count, 0)
+        self.assertEquals(stdout.getvalue(), "1\n2\n4\n5\n")
+
+    def test_offline_without_catalogue(self):
+        """--offline needs a catalogue to query"""
+        cmd = Command()
+        cmd.init_args(["--offline", "--asn", "3333"])
+        path = "ripe.atlas.tools.commands.probes.ProbeCatalogue"
+        with mock.patch(path) as catalogue:
+            catalogue.return_value.__len__.return_value = 0
+            with self.assertRaises(RipeAtlasToolsException):
+                cmd.run()
+
+    def _get_catalogue(self):
+        catalogue = mock.Mock()
+        catalogue.get_index.return_value = ProbeIndex([
+            ProbeRecord(id=1, country_code="NL", asn_v4=3333, geometry={
+                "type": "Point", "coordinates": [4.9, 52.37]}),
+            ProbeRecord(id=2, country_code="NL", asn_v4=1136, geometry={
+                "type": "Point", "coordinates": [4.48, 51.92]}),
+            ProbeRecord(id=3, country_code="DE", asn_v4=3320, geometry={
+                "type": "Point", "coordinates": [13.4, 52.52]}),
+        ])
+        return catalogue
+
+    def test_fresh_catalogue(self):
+        """A fresh catalogue answers the filters it can"""
+        self.get_fresh.return_value = self._get_catalogue()
+        path = "ripe.atlas.tools.commands.probes.ProbeRequest"
+
+        cmd = Command()
+        cmd.init_args(["--center", "52.1,4.7", "--radius", "100", "--ids-only"])
+        with capture_sys_output() as (stdout, stderr):
+            with mock.patch(path) as request:
+                cmd.run()
+                self.assertEquals(request.call_count, 0)
+        self.assertEquals(stdout.getvalue(), "1\n2\n")
+
+        # Without a radius, only the API knows what to do with a point
+        cmd = Command()
+        cmd.init_args(["--center", "52.1,4.7", "--ids-only"])
+        with capture_sys_output():
+            with mock.patch(path) as request:
+                request.return_value = FakeGen()
+                cmd.run()
+                self.assertEquals(request.call_count, 1)
+
+    def test_nearest(self):
+        """--nearest N, nearest first, among probes matching other filters"""
+        self.get_fresh.return_value = self._get_catalogue()
+
+        cmd = Command()
+        cmd.init_args(["--center", "52.5,13", "--nearest", "2", "--ids-only"])
+        with capture_sys_output() as (stdout, stderr):
+            cmd.run()
+        self.assertEquals(stdout.getvalue(), "3\n1\n")
+
+        cmd = Command()
+        cmd.init_args([
+            "--center", "52.5,13", "--nearest", "2", "--asnv4", "3333",
+            "--radius", "600", "--ids-only"
+        ])
+        with capture_sys_output() as (stdout, stderr):
+            cmd.run()
+        self.assertEquals(stdout.getvalue(), "1\n")
+
+    def test_nearest_needs_catalogue_and_point(self):
+        cmd = Command()
+        cmd.init_args(["--center", "52.5,13", "--nearest", "2"])
+        with self.assertRaises(RipeAtlasToolsException):
+            cmd.run()
+
+        self.get_fresh.return_value = self._get_catalogue()
+        cmd = Command()
+        cmd.init_args(["--country", "NL", "--nearest", "2"])
+        with self.assertRaises(RipeAtlasToolsException):
+            cmd.run()
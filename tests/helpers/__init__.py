@@ -1,3 +1,19 @@
+from .output import TestOutput
+from .prefetching import TestPrefetcher
+from .prefixes import TestPrefixTree
+from .rendering import TestRendering, TestResultFilter, TestSaganSet
+from .streaming import TestJSONArrayStream, TestMappedLines, TestOpenInput
 from .validators import TestArgumentTypeHelper
 
-__all__ = [TestArgumentTypeHelper]
+__all__ = [
+    TestOutput,
+    TestPrefetcher,
+    TestPrefixTree,
+    TestRendering,
+    TestResultFilter,
+    TestSaganSet,
+    TestJSONArrayStream,
+    TestMappedLines,
+    TestOpenInput,
+    TestArgumentTypeHelper,
+]
@@ -0,0 +1,149 @@
+# coding: utf-8
+
+from __future__ import print_function
+
+import bz2
+import gzip
+import mock
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.helpers import colours
+from ripe.atlas.tools.helpers.output import Output, write_to
+
+
+class File(object):
+    """
+    Somewhere to write that remembers every write, and how often it was asked
+    whether it's a terminal.
+    """
+
+    def __init__(self, tty=False):
+        self.writes = []
+        self.tty = tty
+        self.asked = 0
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        self.asked += 1
+        return self.tty
+
+
+class TestOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_buffered(self):
+        """Nothing's written until we flush, and then it's all written at once"""
+        f = File()
+        output = Output(f)
+        for i in range(100):
+            output.write("line {}\n".format(i))
+        self.assertEqual(f.writes, [])
+        output.flush()
+        self.assertEqual(len(f.writes), 1)
+        self.assertEqual(
+            f.writes[0], "".join("line {}\n".format(i) for i in range(100)))
+
+    def test_buffer_size(self):
+        """A full buffer is written without waiting for a flush"""
+        f = File()
+        output = Output(f, buffer_size=10)
+        output.write("12345")
+        self.assertEqual(f.writes, [])
+        output.write("67890")
+        self.assertEqual(f.writes, ["1234567890"])
+        output.write("1")
+        self.assertEqual(f.writes, ["1234567890"])
+
+    def test_flush_interval(self):
+        """With a flush interval, nothing waits around for long"""
+        f = File()
+        output = Output(f, flush_interval=0.01)
+        output.write("Hello\n")
+        for _ in range(100):
+            if f.writes:
+                break
+            time.sleep(0.01)
+        self.assertEqual(f.writes, ["Hello\n"])
+        output.flush()
+        self.assertEqual(f.writes, ["Hello\n"])
+
+    def test_is_tty(self):
+        """We only ask the file whether it's a terminal once"""
+        f = File(tty=True)
+        output = Output(f)
+        for _ in range(10):
+            self.assertTrue(output.isatty())
+        self.assertEqual(f.asked, 1)
+        self.assertFalse(Output(File()).isatty())
+
+    def test_colourise(self):
+        """Colouring only asks whether standard out is a terminal once"""
+        f = File(tty=True)
+        with mock.patch.object(sys, "stdout", f):
+            for _ in range(10):
+                self.assertNotEqual(colours.colourise("x", "red"), "x")
+            self.assertEqual(f.asked, 1)
+        with mock.patch.object(sys, "stdout", File()):
+            self.assertEqual(colours.colourise("x", "red"), "x")
+
+    def test_write_to(self):
+        """Whatever's printed goes to the output"""
+        f = File()
+        output = Output(f)
+        write_to(output, print, "Hello")
+        self.assertIsNot(sys.stdout, output)
+        output.flush()
+        self.assertEqual(f.writes, ["Hello\n"])
+
+    def test_open(self):
+        path = os.path.join(self.directory, "results.txt")
+        output = Output.open(path)
+        output.write(u"münchen\n")
+        output.close()
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), u"münchen\n".encode("utf-8"))
+
+    def test_open_compressed(self):
+        """Files are compressed according to their extensions"""
+        for extension, decompress in ((".gz", self.gunzip), (".bz2", bz2.decompress)):
+            path = os.path.join(self.directory, "results" + extension)
+            output = Output.open(path, buffer_size=16)
+            for i in range(100):
+                output.write(u"münchen {}\n".format(i))
+            output.close()
+            with open(path, "rb") as f:
+                self.assertEqual(
+                    decompress(f.read()).decode("utf-8"),
+                    u"".join(u"münchen {}\n".format(i) for i in range(100))
+                )
+
+    def test_open_without_module(self):
+        path = os.path.join(self.directory, "results.xz")
+        compressors = ((".xz", "xz", None, "lzma", None),)
+        with mock.patch.object(Output, "COMPRESSORS", compressors):
+            with self.assertRaises(RipeAtlasToolsException):
+                Output.open(path)
+        self.assertFalse(os.path.exists(path))
+
+    def gunzip(self, data):
+        path = os.path.join(self.directory, "gunzip.gz")
+        with open(path, "wb") as f:
+            f.write(data)
+        with gzip.open(path, "rb") as f:
+            return f.read()
@@ -0,0 +1,113 @@
+import mock
+import threading
+import time
+import unittest
+
+from ripe.atlas.cousteau import APIResponseError, Probe, ProbeRequest
+
+from ripe.atlas.tools.helpers.prefetching import Prefetcher
+
+try:
+    from urllib.parse import parse_qsl, urlparse
+except ImportError:  # Python 2
+    from urlparse import parse_qsl, urlparse
+
+
+class FakeAPI(object):
+    """
+    Pretends to be the probes endpoint, with `count` probes in pages of
+    `page_size`, answering the later pages faster than the earlier ones.
+    """
+
+    def __init__(self, count, page_size=10, numbered=True):
+        self.count = count
+        self.page_size = page_size
+        self.numbered = numbered
+        self.requested = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url_path, **kwargs):
+        request = mock.Mock()
+        request.get.side_effect = lambda: self.get(url_path)
+        return request
+
+    def get(self, url):
+
+        query = dict(parse_qsl(urlparse(url).query))
+        page = int(query.get("page") or query.get("cursor") or 1)
+
+        with self.lock:
+            self.requested.append(page)
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(0.01 / page)
+        with self.lock:
+            self.in_flight -= 1
+
+        first = (page - 1) * self.page_size
+        last = min(self.count, first + self.page_size)
+        next_url = None
+        if last < self.count:
+            next_url = "https://atlas.ripe.net/api/v2/probes/?{}={}".format(
+                "page" if self.numbered else "cursor", page + 1)
+
+        return True, {
+            "count": self.count,
+            "next": next_url,
+            "results": [{"id": pk} for pk in range(first + 1, last + 1)]
+        }
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeAPI(95)
+        mock.patch(
+            "ripe.atlas.tools.helpers.prefetching.AtlasRequest", self.api
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_order(self):
+        """Pages arrive out of order, but the objects don't"""
+        prefetcher = Prefetcher(ProbeRequest(return_objects=True))
+        probes = list(prefetcher)
+        self.assertTrue(all([isinstance(p, Probe) for p in probes]))
+        self.assertEqual([p.id for p in probes], list(range(1, 96)))
+        self.assertEqual(prefetcher.total_count, 95)
+        self.assertEqual(sorted(self.api.requested), list(range(1, 11)))
+
+    def test_concurrency(self):
+        """No more than `concurrency` pages are requested at once"""
+        list(Prefetcher(ProbeRequest(), concurrency=3))
+        self.assertTrue(1 < self.api.most_in_flight <= 3)
+
+    def test_limit(self):
+        """We don't ask for pages we won't use"""
+        probes = list(Prefetcher(ProbeRequest(), limit=25))
+        self.assertEqual(sorted(self.api.requested), [1, 2, 3])
+        self.assertEqual(len(probes), 30)
+
+    def test_unnumbered(self):
+        """Without page numbers, we follow the links one at a time"""
+        self.api.numbered = False
+        probes = list(Prefetcher(ProbeRequest()))
+        self.assertEqual([p["id"] for p in probes], list(range(1, 96)))
+        self.assertEqual(self.api.requested, list(range(1, 11)))
+
+    def test_error(self):
+        self.api.get = lambda url: (False, {"error": "Nope"})
+        with self.assertRaises(APIResponseError):
+            list(Prefetcher(ProbeRequest()))
+
+    def test_anything_else(self):
+        """Things that aren't Cousteau requests are just iterated"""
+        request = mock.MagicMock(total_count=2)
+        request.__iter__.return_value = iter([1, 2])
+        prefetcher = Prefetcher(request)
+        self.assertEqual(list(prefetcher), [1, 2])
+        self.assertEqual(prefetcher.total_count, 2)
+        self.assertEqual(self.api.requested, [])
@@ -0,0 +1,124 @@
+import unittest
+
+import IPy
+
+from ripe.atlas.tools.helpers.prefixes import PrefixTree, parse_prefix
+
+
+class TestPrefixTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = PrefixTree()
+        self.tree.insert("193.0.0.0/16", "sixteen")
+        self.tree.insert("193.0.0.0/21", "twentyone")
+        self.tree.insert("193.0.6.0/24", "twentyfour")
+        self.tree.insert("2001:db8::/32", "documentation")
+
+    def test_lookup(self):
+        self.assertEqual(
+            self.tree.lookup("193.0.6.1"), ("193.0.6.0/24", "twentyfour"))
+        self.assertEqual(
+            self.tree.lookup("193.0.7.1"), ("193.0.0.0/21", "twentyone"))
+        self.assertEqual(
+            self.tree.lookup("193.0.22.1"), ("193.0.0.0/16", "sixteen"))
+        self.assertEqual(self.tree.lookup("194.0.0.1"), None)
+        self.assertEqual(
+            self.tree.lookup("2001:db8::1"),
+            ("2001:db8::/32", "documentation")
+        )
+        self.assertEqual(self.tree.lookup("2001:db9::1"), None)
+
+    def test_lookup_ipy(self):
+        """IPy objects are accepted as well as strings"""
+        self.assertEqual(
+            self.tree.lookup(IPy.IP("193.0.6.1")),
+            ("193.0.6.0/24", "twentyfour")
+        )
+
+    def test_lookup_full_length(self):
+        """Host routes match exactly"""
+        self.tree.insert("193.0.6.1/32", "host")
+        self.assertEqual(self.tree.lookup("193.0.6.1"), ("193.0.6.1", "host"))
+        self.assertEqual(
+            self.tree.lookup("193.0.6.2"), ("193.0.6.0/24", "twentyfour"))
+
+    def test_default_route(self):
+        self.tree.insert("0.0.0.0/0", "default")
+        self.assertEqual(self.tree.lookup("10.0.0.1"), ("0.0.0.0/0", "default"))
+
+    def test_insert_host_bits(self):
+        """Host bits are ignored on insertion"""
+        self.tree.insert("10.1.2.3/8", "ten")
+        self.assertEqual(self.tree.lookup("10.200.0.1"), ("10.0.0.0/8", "ten"))
+
+    def test_insert_replace(self):
+        self.tree.insert("193.0.0.0/21", "replaced")
+        self.assertEqual(len(self.tree), 4)
+        self.assertEqual(
+            self.tree.lookup("193.0.7.1"), ("193.0.0.0/21", "replaced"))
+
+    def test_remove(self):
+        self.tree.remove("193.0.6.0/24")
+        self.assertEqual(len(self.tree), 3)
+        self.assertEqual(
+            self.tree.lookup("193.0.6.1"), ("193.0.0.0/21", "twentyone"))
+        self.tree.remove("193.0.6.0/24")  # Not there any more
+        self.tree.remove("10.0.0.0/8")  # Never there
+        self.assertEqual(len(self.tree), 3)
+
+    def test_within(self):
+        """A prefix and everything more specific than it"""
+        self.assertEqual(sorted(self.tree.within("193.0.0.0/16")), [
+            ("193.0.0.0/16", "sixteen"),
+            ("193.0.0.0/21", "twentyone"),
+            ("193.0.6.0/24", "twentyfour"),
+        ])
+        self.assertEqual(sorted(self.tree.within("193.0.4.0/22")), [
+            ("193.0.6.0/24", "twentyfour"),
+        ])
+        self.assertEqual(list(self.tree.within("193.0.7.0/24")), [])
+        self.assertEqual(list(self.tree.within("10.0.0.0/8")), [])
+
+    def test_covering(self):
+        """Every prefix containing a prefix, least specific first"""
+        self.assertEqual(self.tree.covering("193.0.6.128/25"), [
+            ("193.0.0.0/16", "sixteen"),
+            ("193.0.0.0/21", "twentyone"),
+            ("193.0.6.0/24", "twentyfour"),
+        ])
+        self.assertEqual(self.tree.covering("193.0.0.0/21"), [
+            ("193.0.0.0/16", "sixteen"),
+            ("193.0.0.0/21", "twentyone"),
+        ])
+        self.assertEqual(self.tree.covering("2001:db9::/32"), [])
+
+    def test_values(self):
+        """The values alone, without the prefixes"""
+        self.assertEqual(
+            sorted(self.tree.within_values("193.0.0.0/21")),
+            ["twentyfour", "twentyone"]
+        )
+        self.assertEqual(
+            self.tree.covering_values("193.0.6.0/24"),
+            ["sixteen", "twentyone", "twentyfour"]
+        )
+
+    def test_insert_network(self):
+        """Parsed prefixes go in just like strings do"""
+        self.tree.insert_network(*parse_prefix("10.1.2.3/8"), value="ten")
+        self.assertEqual(self.tree.lookup("10.200.0.1"), ("10.0.0.0/8", "ten"))
+        self.tree.insert_network(6, 0x20010db8 << 96, 48, "forty-eight")
+        self.assertEqual(
+            self.tree.lookup("2001:db8::1"), ("2001:db8::/48", "forty-eight"))
+
+    def test_parse_prefix(self):
+        """The same as IPy says, host bits and all"""
+        for prefix in ("193.0.6.1/21", "193.0.6.1", "0.0.0.0/0",
+                       "2001:db8::1/32", "2001:db8::1", "::ffff:1.2.3.4/96",
+                       "10/8", IPy.IP("193.0.0.0/16")):
+            ip = IPy.IP(prefix, make_net=True)
+            self.assertEqual(
+                parse_prefix(prefix), (ip.version(), ip.int(), ip.prefixlen()))
+        for prefix in ("not a prefix", "193.0.0.0/33", "193.0.0.0/x", ""):
+            with self.assertRaises(ValueError):
+                parse_prefix(prefix)
@@ -0,0 +1,325 @@
+import itertools
+import json
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from ripe.atlas.sagan import Result
+from ripe.atlas.tools.helpers.rendering import (
+    Rendering, ResultFilter, SaganSet, parse_results)
+from ripe.atlas.tools.helpers.streaming import MappedLines
+from ripe.atlas.tools.probes import ProbeRecord
+from ripe.atlas.tools.renderers.base import Renderer as BaseRenderer
+from ripe.atlas.tools.renderers.ping import Renderer as PingRenderer
+
+from ..base import capture_sys_output
+
+
+class ScriptedLookup(object):
+    """
+    Stands in for a probe lookup, but says whether it's ready as `ready`
+    tells it to, whatever the real one would say.
+    """
+
+    def __init__(self, lookup, ready):
+        self._lookup = lookup
+        self._ready = ready
+
+    def ready(self):
+        return next(self._ready)
+
+    def get(self):
+        return self._lookup.get()
+
+
+class TestSaganSet(unittest.TestCase):
+
+    RESULT = {
+        "af": 4, "prb_id": 1, "result": [{"rtt": 10.001}], "ttl": 20,
+        "avg": 10.001, "size": 20, "from": "1.2.3.4", "proto": "ICMP",
+        "timestamp": 1440000000, "dup": 0, "type": "ping", "sent": 1,
+        "msm_id": 1000001, "fw": 4700, "max": 10.001, "step": 360,
+        "src_addr": "2.3.4.5", "rcvd": 1, "msm_name": "Ping", "lts": 40,
+        "dst_name": "my.name.ca", "min": 10.001, "dst_addr": "3.4.5.6"
+    }
+
+    def setUp(self):
+        self.lines = []
+        for i in range(250):
+            result = dict(self.RESULT, prb_id=i % 7 + 1, timestamp=i)
+            self.lines.append(json.dumps(result) + "\n")
+        mock.patch(
+            "ripe.atlas.tools.helpers.rendering.Probe.get_many",
+            side_effect=lambda ids: [ProbeRecord(id=pk) for pk in set(ids)]
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_parse_results(self):
+        """Garbage is skipped, and results can be limited to some probes"""
+        sagans = parse_results(self.lines[:3] + ["garbage"])
+        self.assertEqual([s.probe_id for s in sagans], [1, 2, 3])
+        sagans = parse_results(self.lines[:3], probes=frozenset([2]))
+        self.assertEqual([s.probe_id for s in sagans], [2])
+
+    def test_iterate(self):
+        """Every result, in order, with its probe attached"""
+        sagans = list(SaganSet(self.lines))
+        self.assertEqual([s.created_timestamp for s in sagans], list(range(250)))
+        self.assertTrue(all([s.probe.id == s.probe_id for s in sagans]))
+
+    def test_start_and_stop(self):
+        """Results can be limited to a time range"""
+        sagans = list(SaganSet(self.lines, probes=[3], start=10, stop=100))
+        self.assertEqual(
+            [s.created_timestamp for s in sagans],
+            [i for i in range(10, 101) if i % 7 + 1 == 3]
+        )
+
+    def test_without_probes(self):
+        """Probes aren't looked up if nobody needs them"""
+        path = "ripe.atlas.tools.helpers.rendering.Probe.get_many"
+        with mock.patch(path) as get_many:
+            sagans = list(SaganSet(self.lines, attach_probes=False))
+        self.assertEqual(len(sagans), 250)
+        self.assertFalse(get_many.called)
+        self.assertFalse(hasattr(sagans[0], "probe"))
+
+    def test_without_parsing(self):
+        """Lines are passed on as they are, filtered without sagan"""
+        path = "ripe.atlas.tools.helpers.rendering.Result.get"
+        with mock.patch(path) as get:
+            results = list(SaganSet(self.lines, parse=False))
+            self.assertEqual(
+                [r.raw for r in results], [line.strip() for line in self.lines])
+            results = list(SaganSet(
+                self.lines + ["garbage"], probes=[3], start=10, parse=False))
+            self.assertEqual(
+                [r.raw_data["timestamp"] for r in results],
+                [i for i in range(10, 250) if i % 7 + 1 == 3]
+            )
+            results = list(SaganSet(
+                [json.loads(line) for line in self.lines], probes=[3],
+                parse=False))
+            self.assertEqual(len(results), 36)
+            self.assertEqual(results[0].raw, None)
+        self.assertFalse(get.called)
+
+    def test_stops_at_blank_line(self):
+        sagans = list(SaganSet(self.lines[:5] + ["\n"] + self.lines[5:]))
+        self.assertEqual(len(sagans), 5)
+
+    def test_jobs(self):
+        """A process pool gives the same results in the same order"""
+        with mock.patch.object(SaganSet, "CHUNK_SIZE", 10):
+            sagans = list(SaganSet(self.lines, probes=[1, 2], jobs=3))
+        expected = [
+            i for i in range(250) if i % 7 + 1 in (1, 2)
+        ]
+        self.assertEqual([s.created_timestamp for s in sagans], expected)
+        self.assertTrue(all([s.probe.id == s.probe_id for s in sagans]))
+
+    def test_jobs_mapped(self):
+        """Workers reading their own part of a file give the same results"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "results.json")
+            with open(path, "w") as f:
+                f.write("".join(self.lines))
+            lines = MappedLines(path, range_size=1000)
+            sagans = list(SaganSet(lines, probes=[1, 2], jobs=3))
+        finally:
+            shutil.rmtree(directory)
+        expected = [
+            i for i in range(250) if i % 7 + 1 in (1, 2)
+        ]
+        self.assertEqual([s.created_timestamp for s in sagans], expected)
+
+    def test_lookup_in_background(self):
+        """Probes are looked up on another thread"""
+        threads = set()
+
+        def get_many(ids):
+            threads.add(threading.current_thread().ident)
+            return [ProbeRecord(id=pk) for pk in set(ids)]
+
+        with mock.patch(
+                "ripe.atlas.tools.helpers.rendering.Probe.get_many",
+                side_effect=get_many):
+            sagans = list(SaganSet(self.lines))
+
+        self.assertEqual([s.created_timestamp for s in sagans], list(range(250)))
+        self.assertNotIn(threading.current_thread().ident, threads)
+
+    def iterate(self, sagan_set, ready):
+        """
+        Iterates over `sagan_set`, with every lookup being done (or not) by
+        the time we need it, depending on what `ready` says.
+        """
+        attach_probes = SaganSet._attach_probes
+
+        def attach(self, sagans, lookup):
+            return attach_probes(self, sagans, ScriptedLookup(lookup, ready))
+
+        with mock.patch.object(SaganSet, "_attach_probes", attach):
+            return list(sagan_set)
+
+    def test_batch_size_grows(self):
+        """Batches grow while we're waiting on the lookups"""
+        sagan_set = SaganSet(self.lines * 4)
+        sagans = self.iterate(sagan_set, itertools.repeat(False))
+        self.assertEqual(len(sagans), 1000)
+        self.assertEqual(sagan_set.batch_size, SaganSet.MIN_BATCH_SIZE * 16)
+
+    def test_batch_size_shrinks(self):
+        """Batches shrink when the lookups are done before we need them"""
+        sagan_set = SaganSet(self.lines * 4)
+        sagans = self.iterate(sagan_set, itertools.repeat(True))
+        self.assertEqual(len(sagans), 1000)
+        self.assertEqual(sagan_set.batch_size, SaganSet.MIN_BATCH_SIZE)
+
+    def test_batch_size_steady(self):
+        """The odd early or late lookup doesn't change the batch size"""
+        sagan_set = SaganSet(self.lines * 4)
+        self.iterate(sagan_set, itertools.cycle([True, True, False]))
+        self.assertEqual(sagan_set.batch_size, SaganSet.MIN_BATCH_SIZE * 4)
+
+
+class TestResultFilter(unittest.TestCase):
+
+    LINE = (
+        '{"prb_id": 5, "timestamp": 1440000000, "type": "ping", '
+        '"result": [{"rtt": 1.0}]}'
+    )
+
+    def test_raw_lines(self):
+        """Lines are picked out by probe id and time without parsing them"""
+        self.assertTrue(ResultFilter(probes=[5]).is_wanted(self.LINE))
+        self.assertFalse(ResultFilter(probes=[6]).is_wanted(self.LINE))
+        self.assertTrue(ResultFilter(start=1440000000).is_wanted(self.LINE))
+        self.assertFalse(ResultFilter(start=1440000001).is_wanted(self.LINE))
+        self.assertFalse(ResultFilter(stop=1439999999).is_wanted(self.LINE))
+        self.assertTrue(ResultFilter(probes=[1]).is_wanted('{"type": "ping"}'))
+
+    def test_dictionaries(self):
+        line = {"prb_id": 5, "timestamp": 1440000000}
+        self.assertTrue(ResultFilter(probes=[5]).is_wanted(line))
+        self.assertFalse(ResultFilter(probes=[4]).is_wanted(line))
+        self.assertFalse(ResultFilter(stop=1).is_wanted(line))
+
+    def test_nested_timestamps(self):
+        """A nested timestamp can let a line through, but never keep it out"""
+        line = '{"result": {"timestamp": 1}, "prb_id": 5, "timestamp": 9}'
+        self.assertTrue(ResultFilter(start=5).is_wanted(line))
+        self.assertTrue(ResultFilter(stop=5).is_wanted(line))
+
+    def test_skips_parsing(self):
+        """Unwanted lines are never parsed"""
+        lines = [
+            json.dumps(dict(TestSaganSet.RESULT, prb_id=i)) for i in range(100)]
+        path = "ripe.atlas.tools.helpers.rendering.Result.get"
+        with mock.patch(path, wraps=Result.get) as get:
+            sagans = parse_results(lines, probes=frozenset([5, 50]))
+        self.assertEqual([s.probe_id for s in sagans], [5, 50])
+        self.assertEqual(get.call_count, 2)
+
+
+class CountingRenderer(BaseRenderer):
+
+    RENDERS = [BaseRenderer.TYPE_PING]
+
+    def __init__(self):
+        self.count = 0
+        self.summarised = None
+
+    def on_result(self, result):
+        self.count += 1
+        return "{}\n".format(result.probe_id)
+
+    def additional(self, results):
+        self.summarised = list(results)
+        print("Rendered {}".format(self.count))
+
+
+class TestRendering(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = [
+            json.dumps(dict(TestSaganSet.RESULT, prb_id=i % 3 + 1)) + "\n"
+            for i in range(250)
+        ]
+        mock.patch(
+            "ripe.atlas.tools.helpers.rendering.Probe.get_many",
+            side_effect=lambda ids: [ProbeRecord(id=pk) for pk in set(ids)]
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_single_pass(self):
+        """Input that can only be read once (like stdin) is summarised too"""
+        renderer = CountingRenderer()
+        renderer.KEEP_RESULTS = False
+        payload = SaganSet(iter(self.lines))
+        with capture_sys_output() as (stdout, stderr):
+            Rendering(renderer=renderer, payload=payload).render()
+        output = stdout.getvalue().splitlines()
+        self.assertEqual(len(output), 251)
+        self.assertEqual(output[-1], "Rendered 250")
+        self.assertEqual(renderer.summarised, [])
+
+    def test_needs_probes(self):
+        """Renderers get their probes unless they say they don't need them"""
+
+        class ProbeRenderer(CountingRenderer):
+            def on_result(self, result):
+                return "{}\n".format(result.probe.id)
+
+        renderer = ProbeRenderer()
+        payload = SaganSet(
+            iter(self.lines), attach_probes=renderer.NEEDS_PROBES)
+        with capture_sys_output() as (stdout, stderr):
+            Rendering(renderer=renderer, payload=payload).render()
+        self.assertEqual(stdout.getvalue().splitlines()[:3], ["1", "2", "3"])
+        self.assertFalse(PingRenderer.NEEDS_PROBES)
+
+    def test_keep_results(self):
+        """Unless they opt out, renderers get the results, parsed only once"""
+        renderer = CountingRenderer()
+        payload = SaganSet(iter(self.lines))
+        with capture_sys_output():
+            Rendering(renderer=renderer, payload=payload).render()
+        self.assertEqual(len(renderer.summarised), 250)
+        self.assertEqual(
+            [s.probe_id for s in renderer.summarised[:4]], [1, 2, 3, 1])
+
+    def test_keep_limit(self):
+        """We only keep so many results, and say when we stop"""
+        renderer = CountingRenderer()
+        payload = SaganSet(iter(self.lines))
+        rendering = Rendering(renderer=renderer, payload=payload)
+        rendering.KEEP_LIMIT = 120
+        with capture_sys_output() as (stdout, stderr):
+            rendering.render()
+        self.assertEqual(renderer.count, 250)
+        self.assertEqual(len(renderer.summarised), 120)
+        self.assertIn("first 120 results", stderr.getvalue())
+
+    def test_nothing_to_keep_for(self):
+        """Nothing's kept for a renderer without a summary"""
+
+        class PlainRenderer(BaseRenderer):
+            RENDERS = [BaseRenderer.TYPE_PING]
+
+            def on_result(self, result):
+                return ""
+
+        rendering = Rendering(
+            renderer=PlainRenderer(), payload=SaganSet(iter(self.lines)))
+        with capture_sys_output():
+            rendering.render()
+        self.assertEqual(rendering.kept, [])
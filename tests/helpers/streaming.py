@@ -0,0 +1,193 @@
+import bz2
+import gzip
+import io
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.helpers.streaming import (
+    COMPRESSIONS, Decompressor, JSONArrayStream, MappedLines, open_input,
+    read_chunks
+)
+
+
+class TestJSONArrayStream(unittest.TestCase):
+
+    RESULTS = [
+        {"prb_id": 1, "result": [{"rtt": 10.001}], "msm_name": "Ping"},
+        {"prb_id": 2, "result": [], "dst_name": "[not, the] end"},
+        12345,
+        "a string, with \"quotes\"",
+        [1, [2, 3]],
+        None,
+    ]
+
+    def decode(self, text, size):
+        chunks = read_chunks(io.StringIO(text), size)
+        return list(JSONArrayStream(chunks))
+
+    def test_decode(self):
+        """Every element comes out, whatever size the chunks are"""
+        text = u"" + json.dumps(self.RESULTS, indent=2)
+        for size in (1, 2, 3, 7, 64, len(text)):
+            self.assertEqual(self.decode(text, size), self.RESULTS)
+
+    def test_empty(self):
+        self.assertEqual(self.decode(u" [ ] ", 1), [])
+
+    def test_numbers_at_the_end_of_a_chunk(self):
+        """A number isn't cut short by the end of a chunk"""
+        self.assertEqual(self.decode(u"[1234,5678]", 2), [1234, 5678])
+
+    def test_is_lazy(self):
+        """Elements are handed out before the rest is read"""
+        def chunks():
+            yield u'[{"prb_id": 1}, '
+            raise AssertionError("Read too far")
+        self.assertEqual(next(iter(JSONArrayStream(chunks()))), {"prb_id": 1})
+
+    def test_garbage(self):
+        """Broken input raises a ValueError"""
+        for text in (u"{}", u"[1 2]", u"[1, nope]", u"[1, 2", u'[{"a": 1'):
+            self.assertRaises(ValueError, self.decode, text, 3)
+
+
+class TestOpenInput(unittest.TestCase):
+
+    LINES = ['{{"prb_id": {}, "name": "m\\u00fcnchen"}}\n'.format(i) for i in range(500)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.text = "".join(self.LINES)
+        self.data = self.text.encode("utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def gzip(self, data):
+        f = io.BytesIO()
+        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            gz.write(data)
+        return f.getvalue()
+
+    def read(self, path):
+        f = open_input(path, buffer_size=64)
+        try:
+            return [line for line in f]
+        finally:
+            f.close()
+
+    def test_plain(self):
+        """Uncompressed files are read as they are"""
+        self.assertEqual(self.read(self.write("plain", self.data)), self.LINES)
+
+    def test_gzip(self):
+        """Gzipped files are decompressed, whatever they're called"""
+        path = os.path.join(self.directory, "results.json")
+        with gzip.GzipFile(path, "wb") as f:
+            f.write(self.data)
+        self.assertEqual(self.read(path), self.LINES)
+
+    def test_bzip2(self):
+        path = self.write("results", bz2.compress(self.data))
+        self.assertEqual(self.read(path), self.LINES)
+
+    def test_several_streams(self):
+        """Files made by concatenating compressed files are read in full"""
+        data = bz2.compress(self.data[:1000]) + bz2.compress(self.data[1000:])
+        for read_size in (7, 64, len(data)):
+            decompressor = Decompressor(
+                io.BytesIO(data), bz2.BZ2Decompressor, read_size=read_size)
+            self.assertEqual(decompressor.read(), self.data)
+
+    def test_padding(self):
+        """Zeros after or between streams are skipped, as gzip does"""
+        gunzip = COMPRESSIONS[0][4]
+        first, second = self.gzip(self.data[:1000]), self.gzip(self.data[1000:])
+        for data, factory, expected in (
+                (first + b"\x00" * 1000, gunzip, self.data[:1000]),
+                (first + b"\x00" * 7 + second, gunzip, self.data),
+                (bz2.compress(self.data) + b"\x00" * 100,
+                 bz2.BZ2Decompressor, self.data)):
+            for read_size in (7, 64, len(data)):
+                decompressor = Decompressor(
+                    io.BytesIO(data), factory, read_size=read_size)
+                self.assertEqual(decompressor.read(), expected)
+
+    def test_buffer_size(self):
+        """Uncompressed files are read with the buffer size we ask for"""
+        path = self.write("plain", self.data)
+        with mock.patch(
+                "ripe.atlas.tools.helpers.streaming.open",
+                create=True) as mock_open:
+            open_input(path, buffer_size=64)
+        mock_open.assert_called_once_with(path, "r", 64)
+
+    def test_missing_module(self):
+        """A file we can't decompress gives a helpful error"""
+        compressions = ((b"BZh", "bzip2", None, "bz2", None),)
+        path = self.write("results", bz2.compress(self.data))
+        with mock.patch(
+                "ripe.atlas.tools.helpers.streaming.COMPRESSIONS",
+                compressions):
+            self.assertRaises(RipeAtlasToolsException, open_input, path)
+
+
+class TestMappedLines(unittest.TestCase):
+
+    LINES = ['{{"prb_id": {}}}'.format(i) for i in range(100)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        path = os.path.join(self.directory, "results.json")
+        with open(path, "wb") as f:
+            f.write(text.encode("utf-8"))
+        return path
+
+    def test_ranges(self):
+        """The ranges cover the file in whole lines"""
+        path = self.write("\n".join(self.LINES))
+        for range_size in (1, 10, 100, 10000):
+            lines = MappedLines(path, range_size=range_size)
+            ranges = list(lines.get_ranges())
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], os.path.getsize(path))
+            read = []
+            for start, end in ranges:
+                read += lines.read_range(start, end)
+            self.assertEqual(read, self.LINES)
+            self.assertEqual(list(lines), self.LINES)
+
+    def test_stops_at_blank_line(self):
+        path = self.write(
+            "\n".join(self.LINES[:10] + [" \r"] + self.LINES[10:]))
+        for range_size in (1, 50, 10000):
+            lines = MappedLines(path, range_size=range_size)
+            self.assertEqual(list(lines), self.LINES[:10])
+        path = self.write("\n".join([""] + self.LINES))
+        self.assertEqual(list(MappedLines(path)), [])
+
+    def test_can_map(self):
+        """Only regular, uncompressed files with something in them"""
+        self.assertTrue(MappedLines.can_map(self.write("[]")))
+        self.assertFalse(MappedLines.can_map(self.write("")))
+        self.assertFalse(MappedLines.can_map(self.directory))
+        path = os.path.join(self.directory, "results.json")
+        with open(path, "wb") as f:
+            f.write(bz2.compress(b"[]"))
+        self.assertFalse(MappedLines.can_map(path))
@@ -25,6 +25,15 @@ class TestArgumentTypeHelper(unittest.TestCase):
             with self.assertRaises(argparse.ArgumentTypeError):
                 ArgumentType.country_code(value)
 
+    def test_coordinates(self):
+
+        self.assertEqual((52.37, 4.89), ArgumentType.coordinates("52.37,4.89"))
+        self.assertEqual((-90.0, 180.0), ArgumentType.coordinates("-90,180"))
+
+        for value in ("52.37", "52.37,4.89,1", "north,west", "91,0", "0,-181"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                ArgumentType.coordinates(value)
+
     def test_comma_separated_integers(self):
 
         self.assertEqual(
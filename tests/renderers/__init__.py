@@ -1,9 +1,11 @@
 from .ping import TestPingRenderer
 from .aggregate_ping import TestAggregatePing
+from .raw import TestRawRenderer
 from .ssl_consistency import TestSSLConsistency
 
 __all__ = [
     TestPingRenderer,
     TestAggregatePing,
+    TestRawRenderer,
     TestSSLConsistency
 ]
@@ -37,6 +37,15 @@ class TestAggregatePing(unittest.TestCase):
             Renderer().additional(self.sagans)
             self.assertEquals(stdout.getvalue(), expected_output)
 
+    def test_on_result(self):
+        """Stats are collected as each result is rendered."""
+        renderer = Renderer()
+        for sagan in self.sagans:
+            self.assertEquals(renderer.on_result(sagan), "")
+        self.assertEquals(renderer.sent_packets, 15)
+        self.assertEquals(renderer.received_packets, 15)
+        self.assertEquals(len(renderer.rtts), 15)
+
     def test_collect_stats(self):
         """Tests collect stats function."""
 
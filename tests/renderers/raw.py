@@ -0,0 +1,28 @@
+import json
+import unittest
+
+from ripe.atlas.sagan import Result
+from ripe.atlas.tools.helpers.rendering import RawResult
+from ripe.atlas.tools.renderers.raw import Renderer
+
+
+class TestRawRenderer(unittest.TestCase):
+
+    LINE = '{"af": 4, "prb_id": 1, "result": [{"rtt": 10.001}], "ttl": 20, "avg": 10.001, "size": 20, "from": "1.2.3.4", "proto": "ICMP", "timestamp": 1440000000, "dup": 0, "type": "ping", "sent": 1, "msm_id": 1000001, "fw": 4700, "max": 10.001, "step": 360, "src_addr": "2.3.4.5", "rcvd": 1, "msm_name": "Ping", "lts": 40, "dst_name": "my.name.ca/", "min": 10.001, "dst_addr": "3.4.5.6"}'
+
+    def test_parsed(self):
+        """Parsed results are encoded again, compactly"""
+        output = Renderer().on_result(Result.get(self.LINE))
+        self.assertTrue(output.endswith("\n"))
+        self.assertNotIn(", ", output)
+        self.assertEqual(json.loads(output), json.loads(self.LINE))
+
+    def test_passthrough(self):
+        """Lines we didn't parse are passed on exactly as they were"""
+        self.assertEqual(
+            Renderer().on_result(RawResult(self.LINE)), self.LINE + "\n")
+
+    def test_dictionary(self):
+        data = json.loads(self.LINE)
+        output = Renderer().on_result(RawResult(data))
+        self.assertEqual(json.loads(output), data)
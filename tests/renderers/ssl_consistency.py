@@ -1,7 +1,7 @@
 import mock
 import unittest
 from ripe.atlas.cousteau import Probe as CProbe
-from ripe.atlas.tools.helpers.rendering import SaganSet
+from ripe.atlas.tools.helpers.rendering import Rendering, SaganSet
 from ripe.atlas.tools.renderers.ssl_consistency import Renderer
 from ..base import capture_sys_output
 
@@ -121,6 +121,23 @@ class TestSSLConsistency(unittest.TestCase):
                 returned_set = set(stdout.getvalue().split("\n"))
                 self.assertEquals(returned_set, expected_set)
 
+    def test_single_pass(self):
+        """Rendering once gives the same summary as additional() alone"""
+        path = 'ripe.atlas.tools.helpers.rendering.Probe.get_many'
+        with mock.patch(path) as mock_get_many:
+            mock_get_many.return_value = self.probes.values()
+            with capture_sys_output() as (expected, stderr):
+                Renderer().additional(SaganSet(self.results))
+            with capture_sys_output() as (stdout, stderr):
+                Rendering(
+                    renderer=Renderer(),
+                    payload=SaganSet(iter(self.results))
+                ).render()
+        self.assertEquals(
+            set(stdout.getvalue().split("\n")),
+            set(expected.getvalue().split("\n"))
+        )
+
     def test_gather_unique_certs(self):
         """Test gathering of the unique certs in sagans set"""
         expected_certs = {
@@ -0,0 +1,378 @@
+import itertools
+import mock
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from ripe.atlas.tools.cache import LocalCache, MemoryCache
+
+from .base import capture_sys_output
+
+
+class TestLocalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache(path=":memory:")
+
+    def test_get_set(self):
+        """Values survive a round trip, and missing keys give the default"""
+        self.cache.set("probe:1", {"id": 1}, 60)
+        self.assertEquals(self.cache.get("probe:1"), {"id": 1})
+        self.assertEquals(self.cache["probe:1"], {"id": 1})
+        self.assertEquals(self.cache.get("probe:2"), None)
+        self.assertEquals(self.cache.get("probe:2", "default"), "default")
+        self.assertTrue("probe:1" in self.cache)
+        self.assertFalse("probe:2" in self.cache)
+
+    def test_set_without_expiry(self):
+        """Values set without an expiry time never expire"""
+        self.cache.set("probe:1", "x")
+        self.cache._now += 10 ** 9
+        self.assertEquals(self.cache.get("probe:1"), "x")
+
+    def test_get_expired(self):
+        """Expired values are removed when you ask for them"""
+        self.cache.set("probe:1", "x", 60)
+        self.cache._now += 61
+        self.assertEquals(self.cache.get("probe:1"), None)
+        self.assertFalse("probe:1" in self.cache)
+
+    def test_namespaces(self):
+        """Keys are filed by the part before the first colon"""
+        self.assertEquals(LocalCache.get_namespace("probe:1"), "probe")
+        self.assertEquals(
+            LocalCache.get_namespace("IPDetailsPrefix:::/0"), "IPDetailsPrefix")
+        self.assertEquals(LocalCache.get_namespace("nothing"), "")
+
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2, 60)
+        self.cache.set("IPDetails:193.0.6.1", 3, 60)
+        self.assertEquals(sorted(self.cache.keys("probe")), ["probe:1", "probe:2"])
+        self.assertEquals(len(self.cache.keys()), 3)
+        self.assertEquals(
+            sorted(self.cache.items("probe")), [("probe:1", 1), ("probe:2", 2)])
+
+    def test_expire(self):
+        """expire() only removes what's expired"""
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2, 120)
+        self.cache.set("probe:3", 3)
+        self.cache._now += 90
+        self.cache.expire()
+        self.assertEquals(sorted(self.cache.keys()), ["probe:2", "probe:3"])
+
+    def test_clear(self):
+        """Clearing by key, by namespace, and everything"""
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2, 60)
+        self.cache.set("IPDetails:193.0.6.1", 3, 60)
+
+        self.cache.clear("probe:1")
+        self.assertEquals(
+            sorted(self.cache.keys()), ["IPDetails:193.0.6.1", "probe:2"])
+
+        self.cache.clear(namespace="probe")
+        self.assertEquals(self.cache.keys(), ["IPDetails:193.0.6.1"])
+
+        self.cache.clear()
+        self.assertEquals(self.cache.keys(), [])
+
+    def test_delitem(self):
+        self.cache.set("probe:1", 1, 60)
+        del self.cache["probe:1"]
+        self.assertFalse("probe:1" in self.cache)
+        with self.assertRaises(KeyError):
+            del self.cache["probe:1"]
+
+    def test_get_many_set_many(self):
+        """Bulk reads and writes, across more keys than fit in one query"""
+        self.cache.set_many(
+            dict([("probe:{}".format(i), i) for i in range(1200)]), 60)
+        self.cache.set("probe:1200", 1200, 120)
+        self.cache.memory.clear()
+        self.cache.get("probe:0")  # One in memory, the rest from the file
+
+        keys = ["probe:{}".format(i) for i in range(1300)]
+        self.assertEquals(
+            self.cache.get_many(keys),
+            dict([("probe:{}".format(i), i) for i in range(1201)])
+        )
+
+        self.cache._now += 90
+        self.assertEquals(self.cache.get_many(keys), {"probe:1200": 1200})
+        self.assertEquals(self.cache.keys(), ["probe:1200"])
+
+    def test_set_many_is_one_transaction(self):
+        """set_many() commits once, however many keys it writes"""
+        with mock.patch.object(LocalCache, "_db") as db:
+            self.cache.set_many({"probe:1": 1, "probe:2": 2}, 60)
+            self.assertEquals(db.executemany.call_count, 1)
+            self.assertEquals(db.__exit__.call_count, 1)
+
+    def test_shrink_entries(self):
+        """The least recently used entries go first"""
+        cache = LocalCache(path=":memory:", max_entries=2, max_bytes=0)
+        with mock.patch("ripe.atlas.tools.cache.time") as clock:
+            clock.time.side_effect = itertools.count(cache._now)
+            for i in range(4):
+                cache.set("probe:{}".format(i), i, 60)
+            cache.memory.clear()
+            cache.get("probe:0")
+            self.assertEquals(cache.shrink(), 2)
+        self.assertEquals(sorted(cache.keys()), ["probe:0", "probe:3"])
+        self.assertEquals(cache.get("probe:1"), None)
+
+    def test_shrink_bytes(self):
+        """Values are evicted until they fit in max_bytes"""
+        cache = LocalCache(path=":memory:", max_entries=0, max_bytes=2500)
+        with mock.patch("ripe.atlas.tools.cache.time") as clock:
+            clock.time.side_effect = itertools.count(cache._now)
+            for i in range(4):
+                cache.set("probe:{}".format(i), "x" * 1000)
+        self.assertEquals(cache.shrink(), 2)
+        self.assertEquals(sorted(cache.keys()), ["probe:2", "probe:3"])
+
+    def test_reads_dont_write(self):
+        """Reading only notes what was used, and that's written later"""
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2, 60)
+        self.cache.memory.clear()
+        changes = self.cache._db.total_changes
+        with mock.patch("ripe.atlas.tools.cache.time") as clock:
+            clock.time.return_value = self.cache._now + 100
+            self.assertEquals(self.cache.get("probe:1"), 1)
+            self.assertEquals(self.cache.get_many(["probe:2"]), {"probe:2": 2})
+        self.assertEquals(self.cache._db.total_changes, changes)
+        self.cache.shrink()
+        used = dict(self.cache._db.execute("SELECT key, used FROM cache"))
+        self.assertEquals(used["probe:1"], self.cache._now + 100)
+        self.assertEquals(used["probe:2"], self.cache._now + 100)
+
+    def test_close(self):
+        """What was used is written down when the cache is closed"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.db")
+            cache = LocalCache(path=path)
+            cache.set("probe:1", 1, 60)
+            cache.memory.clear()
+            with mock.patch("ripe.atlas.tools.cache.time") as clock:
+                clock.time.return_value = 12345
+                cache.get("probe:1")
+            cache.close()
+            db = sqlite3.connect(path)
+            self.assertEquals(
+                db.execute("SELECT used FROM cache").fetchone()[0], 12345)
+            db.close()
+            self.assertEquals(cache.get("probe:1"), 1)
+            cache.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_kept_namespaces(self):
+        """The gazetteer doesn't count, and is never evicted or cleared"""
+        cache = LocalCache(path=":memory:", max_entries=2, max_bytes=0)
+        cache.set_many(dict(("Gazetteer:{}".format(i), i) for i in range(5)))
+        for i in range(3):
+            cache.set("probe:{}".format(i), i, 60)
+        self.assertEquals(cache.shrink(), 1)
+        self.assertEquals(len(cache.keys("Gazetteer")), 5)
+        cache.clear()
+        self.assertEquals(cache.keys("probe"), [])
+        self.assertEquals(len(cache.keys("Gazetteer")), 5)
+        cache.clear(namespace="Gazetteer")
+        self.assertEquals(cache.keys(), [])
+
+    def test_shrink_expires_first(self):
+        cache = LocalCache(path=":memory:", max_entries=2, max_bytes=0)
+        cache.set("probe:1", 1)
+        cache.set("probe:2", 2)
+        cache.set("probe:3", 3, 1)
+        cache._now += 2
+        self.assertEquals(cache.shrink(), 1)
+        self.assertEquals(sorted(cache.keys()), ["probe:1", "probe:2"])
+
+    def test_shrink_automatically(self):
+        """Writing to the cache keeps it within its limits"""
+        cache = LocalCache(path=":memory:", max_entries=10, max_bytes=0)
+        with mock.patch.object(LocalCache, "SHRINK_INTERVAL", 5):
+            for i in range(20):
+                cache.set("probe:{}".format(i), i)
+                self.assertTrue(len(cache.keys()) <= 14)
+
+    def test_stats(self):
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2)
+        self.cache.set("IPDetails:193.0.6.1", 3, 60)
+        self.cache._now += 90
+        stats = self.cache.get_stats()
+        self.assertEquals(stats["entries"], 3)
+        self.assertEquals(stats["expired"], 2)
+        self.assertEquals(stats["namespaces"]["probe"]["entries"], 2)
+        self.assertEquals(stats["namespaces"]["probe"]["expired"], 1)
+        self.assertTrue(stats["bytes"] > 0)
+
+    def test_old_schema_is_replaced(self):
+        """A cache from before the current schema is thrown away"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.db")
+            db = sqlite3.connect(path)
+            db.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB)")
+            db.commit()
+            db.close()
+            cache = LocalCache(path=path)
+            cache.set("probe:1", 1, 60)
+            self.assertEquals(cache.get("probe:1"), 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_threads(self):
+        """One cache can be shared by several threads"""
+        self.cache.set("probe:1", 1, 60)
+        errors = []
+
+        def work(n):
+            try:
+                for i in range(20):
+                    self.cache.set("probe:{}".format(n * 100 + i), i, 60)
+                    self.cache.get_many(["probe:1", "probe:{}".format(n)])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(errors, [])
+        self.assertEquals(len(self.cache.keys(namespace="probe")), 81)
+
+    def test_memory_hits(self):
+        """Repeated reads are served from memory, not the file"""
+        self.cache.set("probe:1", {"id": 1}, 60)
+        self.cache.memory.clear()
+        with mock.patch.object(LocalCache, "_load", wraps=LocalCache._load) as load:
+            for _ in range(3):
+                self.assertEquals(self.cache.get("probe:1"), {"id": 1})
+            self.assertEquals(load.call_count, 1)
+        self.assertEquals(self.cache.memory.misses, 1)
+        self.assertEquals(self.cache.memory.hits, 2)
+
+    def test_memory_write_through(self):
+        """Writes land in memory and in the file"""
+        self.cache.set("probe:1", 1, 60)
+        self.assertEquals(self.cache.memory.get("probe:1")[1], 1)
+        self.cache.memory.clear()
+        self.assertEquals(self.cache.get("probe:1"), 1)
+
+    def test_memory_is_cleared_too(self):
+        """Clearing or expiring the cache doesn't leave stale values behind"""
+        self.cache.set("probe:1", 1, 60)
+        self.cache.set("probe:2", 2)
+        self.cache.set("IPDetails:193.0.6.1", 3, 60)
+
+        self.cache.clear(namespace="IPDetails")
+        self.assertEquals(self.cache.memory.get("IPDetails:193.0.6.1"), None)
+
+        self.cache._now += 90
+        self.cache.expire()
+        self.assertEquals(self.cache.memory.get("probe:1"), None)
+        self.assertEquals(self.cache.memory.get("probe:2"), (None, 2))
+
+        self.cache.clear()
+        self.assertEquals(len(self.cache.memory), 0)
+        self.assertEquals(self.cache.get("probe:2"), None)
+
+    def test_legacy_file_is_replaced(self):
+        """A non-SQLite file at the cache path is thrown away"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.db")
+            with open(path, "wb") as f:
+                f.write(b"This is not a database, it's a dbm file" * 100)
+            cache = LocalCache(path=path)
+            cache.set("probe:1", 1, 60)
+            self.assertEquals(cache.get("probe:1"), 1)
+        finally:
+            shutil.rmtree(directory)
+
+
+    def test_locked_file_is_kept(self):
+        """A file another process has locked is left alone, not replaced"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.db")
+            cache = LocalCache(path=path)
+            cache.set("probe:1", 1, 60)
+            cache.close()
+
+            other = sqlite3.connect(path, isolation_level=None)
+            other.execute("BEGIN EXCLUSIVE")
+            try:
+                cache = LocalCache(path=path)
+                with mock.patch.object(LocalCache, "TIMEOUT", 0.01):
+                    with capture_sys_output() as (stdout, stderr):
+                        self.assertEquals(cache.get("probe:1"), None)
+                self.assertTrue("going without it" in stderr.getvalue())
+                cache.set("probe:2", 2, 60)
+                self.assertEquals(cache.get("probe:2"), 2)
+            finally:
+                other.execute("ROLLBACK")
+                other.close()
+
+            self.assertEquals(LocalCache(path=path).get("probe:1"), 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_newer_schema_is_kept(self):
+        """A cache written by a newer version is used by neither of us"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.db")
+            db = sqlite3.connect(path)
+            db.execute("CREATE TABLE newer (x)")
+            db.execute("PRAGMA user_version = {:d}".format(
+                LocalCache.SCHEMA_VERSION + 1))
+            db.commit()
+            db.close()
+
+            cache = LocalCache(path=path)
+            with capture_sys_output():
+                cache.set("probe:1", 1, 60)
+            self.assertEquals(cache.get("probe:1"), 1)
+
+            db = sqlite3.connect(path)
+            self.assertEquals(
+                [row[0] for row in db.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'")],
+                ["newer"]
+            )
+            db.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_eviction(self):
+        """The least recently used entry makes way for new ones"""
+        memory = MemoryCache(2)
+        memory.set("a", None, 1)
+        memory.set("b", None, 2)
+        memory.get("a")
+        memory.set("c", None, 3)
+        self.assertEquals(len(memory), 2)
+        self.assertEquals(memory.get("b"), None)
+        self.assertEquals(memory.get("a"), (None, 1))
+        self.assertEquals(memory.get("c"), (None, 3))
+
+    def test_disabled(self):
+        """A size of 0 turns the memory tier off"""
+        memory = MemoryCache(0)
+        memory.set("a", None, 1)
+        self.assertEquals(len(memory), 0)
@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+
+import io
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from ripe.atlas.tools.cache import LocalCache
+from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.geocoding import Geocoder
+
+
+class TestGeocoder(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache(path=":memory:")
+        mock.patch("ripe.atlas.tools.geocoding.cache", self.cache).start()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        mock.patch.stopall()
+
+    def _write(self, content):
+        path = os.path.join(self.directory, "gazetteer")
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_normalise(self):
+        """Case, spacing and stray commas don't matter"""
+        self.assertEqual(Geocoder.normalise("  New   York, "), "new york")
+        self.assertEqual(
+            Geocoder.get_cache_key("AMSTERDAM"), "Geocoding:amsterdam")
+
+    def test_resolve(self):
+        """Google is only asked once about each place"""
+        with mock.patch("requests.get") as get:
+            get.return_value.json.return_value = {"results": [
+                {"geometry": {"location": {"lat": 52.37, "lng": 4.89}}}]}
+            self.assertEqual(Geocoder.resolve("Amsterdam"), (52.37, 4.89))
+            self.assertEqual(Geocoder.resolve(" amsterdam "), (52.37, 4.89))
+            self.assertEqual(get.call_count, 1)
+
+            get.return_value.json.return_value = {"results": []}
+            with self.assertRaises(RipeAtlasToolsException):
+                Geocoder.resolve("Nowhere")
+
+            get.side_effect = requests.ConnectionError
+            with self.assertRaises(RipeAtlasToolsException):
+                Geocoder.resolve("Nowhere")
+
+    def test_import_csv(self):
+        path = self._write(
+            u"# Some places\n"
+            u"\n"
+            u"Amsterdam,52.37,4.89\n"
+            u'"Washington, DC",38.9,-77.04\n'
+            u"Zürich,47.37,8.54\n"
+        )
+        self.assertEqual(Geocoder.import_gazetteer(path), 3)
+        with mock.patch("requests.get") as get:
+            self.assertEqual(Geocoder.resolve("amsterdam"), (52.37, 4.89))
+            self.assertEqual(
+                Geocoder.resolve("washington,  dc"), (38.9, -77.04))
+            self.assertEqual(Geocoder.resolve(u"Zürich"), (47.37, 8.54))
+            self.assertEqual(get.call_count, 0)
+
+    def test_import_geonames(self):
+        """Both names are imported, and the bigger place wins a clash"""
+        line = u"\t".join([u"{}"] * 19) + u"\n"
+        path = self._write(
+            line.format(
+                2759794, u"Amsterdam", u"Amsterdam", u"", 52.37, 4.89, u"P",
+                u"PPLC", u"NL", u"", u"07", u"", u"", u"", 741636, u"", 13,
+                u"Europe/Amsterdam", u"2016-11-17"
+            ) +
+            line.format(
+                5107152, u"Amsterdam", u"Amsterdam", u"", 42.94, -74.19,
+                u"P", u"PPL", u"US", u"", u"NY", u"", u"", u"", 5766, u"", 0,
+                u"America/New_York", u"2006-01-17"
+            ) +
+            line.format(
+                2657896, u"Zürich", u"Zurich", u"", 47.37, 8.55, u"P",
+                u"PPLA", u"CH", u"", u"ZH", u"", u"", u"", 341730, u"", 0,
+                u"Europe/Zurich", u"2016-12-18"
+            )
+        )
+        self.assertEqual(Geocoder.import_gazetteer(path), 3)
+        self.assertEqual(Geocoder.resolve("Amsterdam"), (52.37, 4.89))
+        self.assertEqual(Geocoder.resolve("zurich"), (47.37, 8.55))
+        self.assertEqual(Geocoder.resolve(u"zürich"), (47.37, 8.55))
+
+    def test_import_broken(self):
+        with self.assertRaises(RipeAtlasToolsException):
+            Geocoder.import_gazetteer(self._write(u"Amsterdam\n"))
+        with self.assertRaises(RipeAtlasToolsException):
+            Geocoder.import_gazetteer(self._write(u"Amsterdam,north,west\n"))
@@ -0,0 +1,139 @@
+import gzip
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from ripe.atlas.tools.commands.ipdb import Command
+from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.ipdb import PrefixDatabase
+from ripe.atlas.tools.ipdetails import IP
+from ripe.atlas.tools.renderers.dst_asn import Renderer as DstAsnRenderer
+
+from .base import capture_sys_output
+
+
+class TestPrefixDatabase(unittest.TestCase):
+
+    TABLE = [
+        "# A comment",
+        "193.0.0.0\t16\t1",
+        "193.0.0.0\t21\t3333",
+        "193.0.6.0\t24\t4",
+        "10.0.0.0\t8\t5_6",
+        "2001:db8::/32 AS7",
+        "TABLE_DUMP2|1445025600|B|192.0.2.1|1|8.8.8.0/24|1 2 {15169}|IGP",
+        "This isn't a prefix",
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ipdb")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        mock.patch.stopall()
+
+    def test_parse(self):
+        self.assertEqual(list(PrefixDatabase.parse(self.TABLE)), [
+            ("193.0.0.0/16", 1),
+            ("193.0.0.0/21", 3333),
+            ("193.0.6.0/24", 4),
+            ("10.0.0.0/8", 5),
+            ("2001:db8::/32", 7),
+            ("8.8.8.0/24", 15169),
+        ])
+
+    def test_lookup(self):
+        """Nested prefixes resolve to the most specific match"""
+        count = PrefixDatabase.build(
+            PrefixDatabase.parse(self.TABLE), path=self.path)
+        self.assertEqual(count, 6)
+
+        database = PrefixDatabase(path=self.path)
+        for address, expected in (
+            ("193.0.6.1", ("193.0.6.0/24", 4)),
+            ("193.0.7.255", ("193.0.0.0/21", 3333)),
+            ("193.0.0.0", ("193.0.0.0/21", 3333)),
+            ("193.0.22.1", ("193.0.0.0/16", 1)),
+            ("193.0.255.255", ("193.0.0.0/16", 1)),
+            ("193.1.0.0", None),
+            ("10.200.0.1", ("10.0.0.0/8", 5)),
+            ("8.8.8.8", ("8.8.8.0/24", 15169)),
+            ("1.1.1.1", None),
+            ("255.255.255.255", None),
+            ("2001:db8::1", ("2001:db8::/32", 7)),
+            ("2001:db9::1", None),
+        ):
+            self.assertEqual(database.lookup(address), expected, address)
+        database.close()
+
+    def test_build_empty(self):
+        """An empty table doesn't clobber an existing one"""
+        self.assertEqual(PrefixDatabase.build([], path=self.path), 0)
+        self.assertFalse(PrefixDatabase.exists(path=self.path))
+
+    def test_not_a_database(self):
+        with open(self.path, "wb") as f:
+            f.write(b"Not a database, but long enough to have a header")
+        with self.assertRaises(ValueError):
+            PrefixDatabase(path=self.path)
+
+    def test_ip_details(self):
+        """IP consults the table before asking RIPEstat"""
+        PrefixDatabase.build(PrefixDatabase.parse(self.TABLE), path=self.path)
+
+        mock_cache = mock.patch("ripe.atlas.tools.ipdetails.cache").start()
+        mock_cache.get.return_value = None
+        mock_cache.keys.return_value = []
+        mock_get = mock.patch(
+            "ripe.atlas.tools.ipdetails.requests.get").start()
+        mock.patch.object(IP, "_prefixes", None).start()
+        mock.patch.object(
+            IP, "_database", PrefixDatabase(path=self.path)).start()
+
+        ip = IP("193.0.6.1")
+        self.assertEqual(ip.asn, "4")
+        self.assertEqual(ip.holder, "")
+        self.assertEqual(ip.prefix, "193.0.6.0/24")
+        self.assertEqual(mock_get.call_count, 0)
+        self.assertEqual(mock_cache.set.call_count, 0)
+
+        # Without a holder, there's nothing to show in brackets
+        renderer = DstAsnRenderer()
+        result = mock.Mock(destination_address="193.0.6.1")
+        renderer.on_result(result)
+        with capture_sys_output() as (stdout, stderr):
+            renderer.additional([result])
+        self.assertEqual(stdout.getvalue(), "AS4 100.00%\n")
+
+    def test_command_import(self):
+        """Import a gzipped table"""
+        source = os.path.join(self.directory, "table.pfx2as.gz")
+        with gzip.open(source, "wb") as f:
+            f.write("\n".join(self.TABLE).encode("utf-8"))
+
+        mock.patch.object(PrefixDatabase, "PATH", self.path).start()
+        with capture_sys_output() as (stdout, stderr):
+            cmd = Command()
+            cmd.init_args(["import", source])
+            cmd.run()
+            self.assertTrue("Imported 6 prefixes" in stdout.getvalue())
+
+        database = PrefixDatabase(path=self.path)
+        self.assertEqual(database.lookup("8.8.4.4"), None)
+        self.assertEqual(database.lookup("8.8.8.8"), ("8.8.8.0/24", 15169))
+        database.close()
+
+        with capture_sys_output():
+            cmd = Command()
+            cmd.init_args(["clear"])
+            cmd.run()
+        self.assertFalse(PrefixDatabase.exists(path=self.path))
+
+    def test_command_import_without_file(self):
+        cmd = Command()
+        cmd.init_args(["import"])
+        with self.assertRaises(RipeAtlasToolsException):
+            cmd.run()
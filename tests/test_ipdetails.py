@@ -45,8 +45,17 @@ class TestIPDetails(unittest.TestCase):
         def db_set(k, v, e):
             self.db[k] = v
 
-        def db_keys():
-            return self.db.keys()
+        def db_get_many(keys):
+            return dict([(k, self.db[k]) for k in keys if k in self.db])
+
+        def db_set_many(mapping, e):
+            self.db.update(mapping)
+
+        def db_keys(namespace=None):
+            if namespace is None:
+                return self.db.keys()
+            return [
+                k for k in self.db.keys() if k.startswith(namespace + ":")]
 
         self.mock_cache = mock.patch(
             "ripe.atlas.tools.ipdetails.cache"
@@ -54,6 +63,10 @@ class TestIPDetails(unittest.TestCase):
         self.mock_cache.get.side_effect = db_get
         self.mock_cache.set.side_effect = db_set
         self.mock_cache.keys.side_effect = db_keys
+        self.mock_cache.get_many.side_effect = db_get_many
+        self.mock_cache.set_many.side_effect = db_set_many
+        IP._prefixes = None
+        IP._database = False
         self.mock_get = mock.patch(
             'ripe.atlas.tools.ipdetails.requests.get'
         ).start()
@@ -139,8 +152,8 @@ class TestIPDetails(unittest.TestCase):
         self.assertEquals(det1.asn, self.ASN)
         self.assertEquals(det2.asn, det1.asn)
         self.assertEquals(self.mock_get.call_count, 2)
-        # access to cache get
-        self.assertEquals(self.mock_cache.get.call_count, 3)
+        # access to cache get, the non-matching prefix is never read
+        self.assertEquals(self.mock_cache.get.call_count, 2)
         # access to cache set
         self.assertEquals(self.mock_cache.set.call_count, 4)
 
@@ -283,6 +296,74 @@ class TestIPDetails(unittest.TestCase):
         self.assertFalse(ip.cached_prefix_found)
         self.assertEquals(ip.get_from_cached_prefix(), None)
 
+    def test_get_from_cache_prefix_most_specific(self):
+        """Test case where more than one cached prefix matches"""
+        self.mock_cache.set("IPDetailsPrefix:193.0.0.0/16", {
+            "ASN": "1", "Holder": "test", "Prefix": "193.0.0.0/16"}, 1)
+        self.mock_cache.set("IPDetailsPrefix:193.0.0.0/21", {
+            "ASN": "2", "Holder": "test", "Prefix": "193.0.0.0/21"}, 1)
+        self.mock_cache.set("IPDetailsPrefix:193.0.0.0/24", {
+            "ASN": "3", "Holder": "test", "Prefix": "193.0.0.0/24"}, 1)
+        ip = IP(self.IP)
+        self.assertTrue(ip.cached_prefix_found)
+        self.assertEquals(ip.asn, "2")
+        self.assertEquals(self.mock_get.call_count, 0)
+
+    def test_get_from_cache_prefix_expired(self):
+        """Test case where the most specific cached prefix has expired"""
+        self.mock_cache.set("IPDetailsPrefix:193.0.0.0/16", {
+            "ASN": "1", "Holder": "test", "Prefix": "193.0.0.0/16"}, 1)
+        self.mock_cache.set("IPDetailsPrefix:193.0.0.0/21", {
+            "ASN": "2", "Holder": "test", "Prefix": "193.0.0.0/21"}, 1)
+        IP.get_prefix_tree()
+        del self.db["IPDetailsPrefix:193.0.0.0/21"]
+        ip = IP(self.IP)
+        self.assertEquals(ip.asn, "1")
+        self.assertEquals(len(IP.get_prefix_tree()), 1)
+
+    def test_resolve_many(self):
+        """Test case where a batch of addresses is resolved at once"""
+        session = mock.Mock()
+        session.get.side_effect = lambda url: FakeResponse(
+            json_return=self.MOCK_RESULTS[url.split("=")[-1]])
+        self.mock_cache.set("IPDetails:193.0.6.1", {
+            "ASN": "3333", "Holder": "test", "Prefix": "193.0.0.0/21"}, 1)
+
+        with mock.patch.object(IP, "get_session", return_value=session):
+            ips = IP.resolve_many([
+                self.IP,
+                self.IP,
+                self.SAME_AS_DIFFERENT_PREFIX_IP,
+                self.SAME_AS_DIFFERENT_PREFIX_IP,
+                self.NOT_ANNOUNCED_IP,
+                "127.0.0.1",
+                "not an address",
+            ])
+
+        self.assertEquals(sorted(ips.keys()), sorted([
+            self.IP,
+            self.SAME_AS_DIFFERENT_PREFIX_IP,
+            self.NOT_ANNOUNCED_IP,
+            "127.0.0.1"
+        ]))
+        self.assertEquals(ips[self.IP].holder, "test")
+        self.assertEquals(ips[self.SAME_AS_DIFFERENT_PREFIX_IP].asn, "3333")
+        self.assertEquals(
+            ips[self.SAME_AS_DIFFERENT_PREFIX_IP].prefix, "193.0.22.0/23")
+        self.assertEquals(ips[self.NOT_ANNOUNCED_IP].asn, None)
+        self.assertEquals(ips["127.0.0.1"].asn, None)
+
+        # One query per unknown, querable address, none through requests.get
+        self.assertEquals(session.get.call_count, 2)
+        self.assertEquals(self.mock_get.call_count, 0)
+        self.assertTrue("IPDetailsPrefix:193.0.22.0/23" in self.db)
+        self.assertTrue("IPDetails:{}".format(
+            ips[self.SAME_AS_DIFFERENT_PREFIX_IP].address) in self.db)
+
+        # One read and one write for the whole batch
+        self.assertEquals(self.mock_cache.get_many.call_count, 1)
+        self.assertEquals(self.mock_cache.set_many.call_count, 1)
+
     def test_is_querable(self):
         """Test case where IP is quearable"""
         ip = IP(self.IP)
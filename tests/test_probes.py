@@ -0,0 +1,344 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from ripe.atlas.cousteau import Probe as CProbe
+from ripe.atlas.tools.cache import LocalCache
+from ripe.atlas.tools.exceptions import RipeAtlasToolsException
+from ripe.atlas.tools.probes import Probe, ProbeCatalogue, ProbeRecord
+from ripe.atlas.tools.probes.index import ProbeIndex
+from ripe.atlas.tools.probes.spatial import SpatialIndex, haversine
+
+
+class TestProbeRecord(unittest.TestCase):
+
+    META_DATA = {
+        "id": 1,
+        "asn_v4": 3333,
+        "asn_v6": None,
+        "prefix_v4": "193.0.0.0/21",
+        "prefix_v6": None,
+        "address_v4": "193.0.6.1",
+        "address_v6": None,
+        "country_code": "NL",
+        "status": {"id": 1, "name": "Connected"},
+        "geometry": {"type": "Point", "coordinates": [4.9, 52.3]},
+        "is_anchor": False,
+        "is_public": True,
+        "description": u"Caf\u00e9",
+        "tags": [{"name": "Home", "slug": "home"}],
+        "first_connected": 1288367583,
+    }
+
+    def test_from_probe(self):
+        """Only the fields we use are kept"""
+        record = ProbeRecord.from_probe(CProbe(id=1, meta_data=self.META_DATA))
+        self.assertEqual(record.id, 1)
+        self.assertEqual(record.asn_v4, 3333)
+        self.assertEqual(record.status, "Connected")
+        self.assertEqual(record.geometry["coordinates"], [4.9, 52.3])
+        self.assertFalse(hasattr(record, "tags"))
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_round_trip(self):
+        record = ProbeRecord.from_probe(CProbe(id=1, meta_data=self.META_DATA))
+        decoded = ProbeRecord.decode(record.encode())
+        self.assertEqual(decoded, record)
+        self.assertEqual(decoded.description, u"Caf\u00e9")
+
+    def test_decode_rejects_other_formats(self):
+        """Anything that isn't a current record decodes to None"""
+        record = ProbeRecord(id=1)
+        self.assertEqual(ProbeRecord.decode(None), None)
+        self.assertEqual(ProbeRecord.decode(()), None)
+        self.assertEqual(ProbeRecord.decode(record.to_list()), None)
+        self.assertEqual(ProbeRecord.decode((0,) + record.encode()[1:]), None)
+        self.assertEqual(ProbeRecord.decode(record.encode() + (1,)), None)
+        self.assertEqual(ProbeRecord.decode(CProbe(id=1, meta_data={})), None)
+
+
+class TestProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache(path=":memory:")
+        mock.patch("ripe.atlas.tools.probes.cache", self.cache).start()
+        self.get_fresh = mock.patch.object(
+            ProbeCatalogue, "get_fresh", return_value=None).start()
+        self.request = mock.patch(
+            "ripe.atlas.tools.probes.ProbeRequest").start()
+        self.request.side_effect = lambda **kwargs: iter([
+            CProbe(id=int(pk), meta_data={"id": int(pk), "asn_v4": 3333})
+            for pk in kwargs["id__in"]
+        ])
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_get_many(self):
+        """Probes are fetched once, and cached as records"""
+        probes = Probe.get_many([1, 2, 2, 3])
+        self.assertEqual([p.id for p in probes], [1, 2, 3])
+        self.assertEqual(self.request.call_count, 1)
+
+        self.cache.memory.clear()
+        probes = Probe.get_many([3, 2, 1, 4])
+        self.assertEqual(sorted([p.id for p in probes]), [1, 2, 3, 4])
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(self.request.call_args[1]["id__in"], ["4"])
+        self.assertTrue(all(isinstance(p, ProbeRecord) for p in probes))
+        self.assertEqual(probes[0].asn_v4, 3333)
+
+    def test_get_many_refetches_stale_formats(self):
+        """Whatever an older version cached is fetched again"""
+        self.cache.set("probe:1", CProbe(id=1, meta_data={"id": 1}))
+        probes = Probe.get_many([1])
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual(
+            ProbeRecord.decode(self.cache.get("probe:1")), probes[0])
+
+    def test_get_many_from_catalogue(self):
+        """A fresh catalogue answers first, the cache and API the rest"""
+        catalogue = mock.Mock()
+        catalogue.get_many.return_value = {1: ProbeRecord(id=1)}
+        self.get_fresh.return_value = catalogue
+        probes = Probe.get_many([1, 2])
+        self.assertEqual([p.id for p in probes], [1, 2])
+        self.assertEqual(self.request.call_args[1]["id__in"], ["2"])
+
+        catalogue.get_many.return_value = {1: ProbeRecord(id=1)}
+        self.assertEqual([p.id for p in Probe.get_many([1])], [1])
+        self.assertEqual(self.request.call_count, 1)
+
+
+class TestProbeCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "probes")
+        self.request = mock.patch(
+            "ripe.atlas.tools.probes.catalogue.ProbeRequest").start()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        mock.patch.stopall()
+
+    def _respond(self, *batches):
+        self.request.side_effect = [
+            iter([
+                CProbe(id=pk, meta_data={
+                    "id": pk,
+                    "status": {"name": status}
+                }) for pk, status in batch
+            ]) for batch in batches
+        ]
+
+    def test_sync(self):
+        """A full sync first, then incremental ones"""
+        self._respond([(2, "Connected"), (1, "Connected"), (3, "Connected")])
+        catalogue = ProbeCatalogue(path=self.path)
+        self.assertFalse(catalogue.is_fresh())
+        self.assertEqual(catalogue.sync(now=1000), (3, True))
+        self.assertEqual(self.request.call_args[1], {
+            "return_objects": True, "page_size": ProbeCatalogue.PAGE_SIZE})
+
+        catalogue = ProbeCatalogue(path=self.path)
+        self.assertTrue(catalogue.is_fresh(now=1000 + 60))
+        self.assertFalse(
+            catalogue.is_fresh(now=1000 + ProbeCatalogue.MAX_AGE + 1))
+        self.assertEqual([p.id for p in catalogue], [1, 2, 3])
+        self.assertEqual(catalogue.total_count, 3)
+
+        # Probe 4 is new and probe 2 has changed
+        self._respond([(4, "Connected")], [(2, "Disconnected")])
+        self.assertEqual(catalogue.sync(now=2000), (2, False))
+        self.assertEqual(self.request.call_args_list[1][1]["id__gt"], 3)
+        self.assertEqual(
+            self.request.call_args_list[2][1]["status_since__gte"], 1000)
+
+        catalogue = ProbeCatalogue(path=self.path)
+        self.assertEqual(catalogue.synced, 2000)
+        self.assertEqual(catalogue.full_synced, 1000)
+        self.assertEqual(catalogue.get(2).status, "Disconnected")
+        self.assertEqual(sorted(catalogue.get_many([1, 4, 5]).keys()), [1, 4])
+
+    def test_sync_full_when_old(self):
+        """Every so often, we download everything again"""
+        self._respond([(1, "Connected"), (2, "Connected")], [(2, "Connected")])
+        catalogue = ProbeCatalogue(path=self.path)
+        catalogue.sync(now=1000)
+        fetched, is_full = catalogue.sync(
+            now=1000 + ProbeCatalogue.FULL_SYNC_INTERVAL + 1)
+        self.assertTrue(is_full)
+        self.assertEqual([p.id for p in catalogue], [2])
+
+    def test_unreadable(self):
+        """A broken or out of date file is ignored"""
+        with open(self.path, "wb") as f:
+            f.write(b"Not a catalogue")
+        self.assertEqual(len(ProbeCatalogue(path=self.path)), 0)
+
+        self._respond([(1, "Connected")])
+        ProbeCatalogue(path=self.path).sync()
+        with mock.patch.object(ProbeRecord, "VERSION", 2):
+            self.assertFalse(ProbeCatalogue(path=self.path).is_fresh())
+
+
+class TestProbeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ProbeIndex([
+            ProbeRecord(
+                id=1, asn_v4=3333, country_code="NL",
+                prefix_v4="193.0.0.0/21", address_v4="193.0.6.1",
+                geometry={"type": "Point", "coordinates": [4.9, 52.37]}
+            ),
+            ProbeRecord(
+                id=2, asn_v4=3333, asn_v6=3333, country_code="NL",
+                prefix_v4="193.0.0.0/16", address_v4="193.0.20.1",
+                prefix_v6="2001:67c:2e8::/48",
+                geometry={"type": "Point", "coordinates": [4.48, 51.92]}
+            ),
+            ProbeRecord(
+                id=3, asn_v6=3320, country_code="de",
+                prefix_v6="2003::/19",
+                geometry={"type": "Point", "coordinates": [13.4, 52.52]}
+            ),
+            ProbeRecord(
+                id=4, asn_v4=3333, country_code="GR",
+                prefix_v4="193.0.0.0/16", address_v4="193.0.0.1",
+                geometry=None
+            ),
+        ])
+
+    def _ids(self, **filters):
+        return [p.id for p in self.index.filter(**filters)]
+
+    def test_asn(self):
+        self.assertEqual(self._ids(asn=3333), [1, 2, 4])
+        self.assertEqual(self._ids(asn_v6=3333), [2])
+        self.assertEqual(self._ids(asn=3320), [3])
+        self.assertEqual(self._ids(asn_v4=1), [])
+
+    def test_country(self):
+        """Country codes are case-insensitive"""
+        self.assertEqual(self._ids(country_code="nl"), [1, 2])
+        self.assertEqual(self._ids(country_code="DE"), [3])
+
+    def test_prefix(self):
+        """More specific prefixes, and addresses inside less specific ones"""
+        self.assertEqual(self._ids(prefix="193.0.0.0/16"), [1, 2, 4])
+        self.assertEqual(self._ids(prefix_v4="193.0.0.0/21"), [1, 4])
+        self.assertEqual(self._ids(prefix="193.0.6.0/24"), [1])
+        self.assertEqual(self._ids(prefix="2001:67c::/32"), [2])
+        self.assertEqual(self._ids(prefix="10.0.0.0/8"), [])
+
+    def test_radius(self):
+        self.assertEqual(self._ids(radius="52.1,4.7:100"), [1, 2])
+        self.assertEqual(self._ids(radius="52.1,4.7:10"), [])
+        self.assertEqual(self._ids(radius="52.1,4.7:1000"), [1, 2, 3])
+
+    def test_combined(self):
+        """Every filter has to match"""
+        self.assertEqual(
+            self._ids(asn_v4=3333, country_code="NL", prefix="193.0.0.0/21"),
+            [1]
+        )
+        self.assertEqual(self._ids(asn=3333, radius="52.5,13.4:50"), [])
+        self.assertEqual(self._ids(), [1, 2, 3, 4])
+        self.assertEqual(self.index.filter(asn=3333).total_count, 3)
+
+    def test_nearest(self):
+        """Nearest first, among the probes matching any filters"""
+        self.assertEqual(
+            [p.id for p in self.index.nearest(52.5, 13, 2)], [3, 1])
+        self.assertEqual(
+            [p.id for p in self.index.nearest(52.5, 13, 2, asn=3333)], [1, 2])
+        self.assertEqual(
+            [p.id for p in self.index.nearest(52.5, 13, 5, radius=100)], [3])
+        self.assertEqual(
+            [p.id for p in self.index.nearest(
+                52.5, 13, 2, accept=lambda p: p.country_code == "NL")],
+            [1, 2]
+        )
+
+    def test_lazy(self):
+        """Indexes are only built for the filters that are used"""
+        with mock.patch.object(ProbeIndex, "_index_prefixes") as prefixes:
+            with mock.patch.object(ProbeIndex, "_index_locations") as locations:
+                self.assertEqual(self._ids(asn=3333), [1, 2, 4])
+        self.assertFalse(prefixes.called)
+        self.assertFalse(locations.called)
+        self.assertEqual(sorted(self.index._indexes), ["asns"])
+
+    def test_add(self):
+        """Probes added later are in the indexes that have already been built"""
+        self.assertEqual(self._ids(prefix="10.0.0.0/8"), [])
+        self.index.add(ProbeRecord(
+            id=5, asn_v4=1, prefix_v4="10.0.0.0/24", address_v4="10.0.0.1"))
+        self.assertEqual(self._ids(prefix="10.0.0.0/8"), [5])
+        self.assertEqual(self._ids(asn_v4=1), [5])
+
+    def test_can_filter(self):
+        self.assertTrue(ProbeIndex.can_filter({"asn": 3333}))
+        self.assertTrue(ProbeIndex.can_filter({"radius": "1,2:3"}))
+        self.assertFalse(ProbeIndex.can_filter({"latitude": "1"}))
+        self.assertFalse(ProbeIndex.can_filter({"tags": "system-ipv4-works"}))
+
+    def test_unsupported(self):
+        with self.assertRaises(RipeAtlasToolsException):
+            self.index.filter(tags="system-ipv4-works")
+        with self.assertRaises(RipeAtlasToolsException):
+            self.index.filter(latitude="52.1", longitude="4.7")
+        with self.assertRaises(RipeAtlasToolsException):
+            self.index.filter(prefix="not a prefix")
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def test_haversine(self):
+        """Amsterdam to Berlin is about 577km"""
+        self.assertAlmostEqual(haversine(52.37, 4.9, 52.52, 13.4), 577, -1)
+        self.assertEqual(haversine(10, 10, 10, 10), 0)
+
+    def test_within(self):
+        """Nearest first, across the antimeridian and around the poles"""
+        index = SpatialIndex()
+        index.insert(52.37, 4.9, "Amsterdam")
+        index.insert(52.52, 13.4, "Berlin")
+        index.insert(-16.5, 179.9, "Fiji")
+        index.insert(-16.5, -179.9, "Also Fiji")
+        index.insert(89.9, 0, "North Pole")
+        index.insert(89.9, 180, "Also North Pole")
+
+        self.assertEqual(
+            [_[1] for _ in index.within(52.4, 6, 1000)],
+            ["Amsterdam", "Berlin"]
+        )
+        self.assertEqual(
+            sorted([_[1] for _ in index.within(-16.5, 179.95, 50)]),
+            ["Also Fiji", "Fiji"]
+        )
+        self.assertEqual(
+            sorted([_[1] for _ in index.within(89.5, 90, 100)]),
+            ["Also North Pole", "North Pole"]
+        )
+        self.assertEqual(len(index.within(0, 0, 30000)), 6)
+
+    def test_nearest(self):
+        """The closest points first, within a radius and a filter if given"""
+        index = SpatialIndex()
+        for i in range(10):
+            index.insert(52, 4 + i, i)
+        index.insert(-33.9, 151.2, "Sydney")
+
+        self.assertEqual([_[1] for _ in index.nearest(52, 6.1, 3)], [2, 3, 1])
+        self.assertEqual(
+            [_[1] for _ in index.nearest(52, 6.1, 3, radius=65)], [2, 3])
+        self.assertEqual(
+            [_[1] for _ in index.nearest(52, 6.1, 3, accept=lambda v: v != 2)],
+            [3, 1, 4]
+        )
+        self.assertEqual(index.nearest(-33, 150, 1)[0][1], "Sydney")
+        self.assertEqual(len(index.nearest(0, 0, 100)), 11)
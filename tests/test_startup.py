@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+
+class TestStartup(unittest.TestCase):
+    """
+    The command line tools should start quickly, so the simple commands mustn't
+    drag in the cache, the config file, or any of our heavier dependencies.
+    """
+
+    SCRIPT = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "scripts",
+        "ripe-atlas"
+    )
+
+    # Seconds, for the best of a few runs, interpreter startup included
+    BUDGET = 0.5
+
+    HEAVY = (
+        "OpenSSL",
+        "requests",
+        "ripe.atlas.cousteau",
+        "ripe.atlas.sagan",
+        "sqlite3",
+        "tzlocal",
+        "yaml",
+    )
+
+    # Runs the script in-process and reports which heavy modules it imported
+    INSPECT = (
+        "import runpy, sys\n"
+        "sys.argv = sys.argv[1:]\n"
+        "try:\n"
+        "    runpy.run_path(sys.argv[0], run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "sys.stderr.write('\\nLOADED:' + ','.join(sorted(\n"
+        "    m for m in {heavy!r} if m in sys.modules)) + '\\n')\n"
+    ).format(heavy=HEAVY)
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.environment = dict(os.environ, HOME=self.home, BROWSER="true")
+
+    def tearDown(self):
+        shutil.rmtree(self.home)
+
+    def _run(self, *args):
+        process = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.environment
+        )
+        stdout, stderr = process.communicate()
+        return stderr.decode("utf-8")
+
+    def _get_loaded(self, *args):
+        stderr = self._run(sys.executable, "-c", self.INSPECT, self.SCRIPT, *args)
+        loaded = stderr.rsplit("LOADED:", 1)[1].strip()
+        return [m for m in loaded.split(",") if m]
+
+    def _get_duration(self, *args):
+        durations = []
+        for _ in range(3):
+            start = time.time()
+            self._run(sys.executable, self.SCRIPT, *args)
+            durations.append(time.time() - start)
+        return min(durations)
+
+    def test_help(self):
+        """ripe-atlas --help"""
+        self.assertEqual(self._get_loaded("--help"), [])
+        self.assertLess(self._get_duration("--help"), self.BUDGET)
+
+    def test_go(self):
+        """ripe-atlas go 1"""
+        self.assertEqual(self._get_loaded("go", "1"), [])
+        self.assertLess(self._get_duration("go", "1"), self.BUDGET)
+
+    def test_measure_help(self):
+        """aping --help doesn't need Cousteau or Sagan"""
+        self.assertEqual(self._get_loaded("measure", "ping", "--help"), [])